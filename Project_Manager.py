@@ -1,8 +1,38 @@
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Command-line use (import, export, query...): answer without loading Tk
+    from portfolio.cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:], prog="Project_Manager.py"))
+
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-import csv
-
-STATUS_OPTIONS = ["Not Started", "Completed", "In Progress", "Aborted", "Paused"]
+import tkinter.font as tkfont
+import os
+import sqlite3
+from datetime import date, datetime
+
+from portfolio import STATUS_OPTIONS, PortfolioStore, BackgroundTask
+from portfolio.sqlite_backend import SQLiteBackend, open_database
+from portfolio.journal import Journal
+from portfolio.snapshot import read_snapshot, write_snapshot
+from portfolio.search import SearchIndex
+from portfolio.schedule import ScheduleIndex
+from portfolio.timeline import TimelineLayout
+from portfolio.workload import WorkloadEngine
+from portfolio.stats import PortfolioStats
+from portfolio.dates import normalize_date
+from portfolio.history import History
+from portfolio.perf import SLOW_MS, TRACE, span, timed
+from portfolio.merge import describe, merge_into, parse_files
+from portfolio.delta import ChangeTracker, DeltaFile, apply_delta, export_base, export_delta, read_base
+from portfolio.sorting import SORT_KEYS, SortedProjects
+
+MANUAL_ORDER = "Manual Order"
+
+# Exports may be CSV or JSON Lines, compressed or not (portfolio/streams.py)
+EXPORT_FILETYPES = [("CSV Files", "*.csv"), ("Compressed CSV", "*.csv.gz *.csv.xz"),
+                    ("JSON Lines", "*.jsonl *.jsonl.gz *.jsonl.xz"), ("All Files", "*.*")]
 
 COLORS = {
     'background': '#F0F4F8',   # Light blue-gray background
@@ -20,13 +50,40 @@ COLORS = {
 }
 
 class ProjectManagerApp:
-    def __init__(self, root):
+    AUTOSAVE_MS = 60000
+    AUTOSAVE_RETRY_MS = 2000
+
+    def __init__(self, root, store=None, journal=None):
         self.root = root
         self.root.title("Professional Project Manager")
         self.root.configure(bg=COLORS['background'])
-        self.global_personnel = set()
-        self.projects = []            # Active (non-completed) projects
-        self.completed_projects = []  # Completed projects
+        self.store = store if store is not None else PortfolioStore()
+        self.backend = None  # SQLiteBackend when working on a database file
+        self.search_index = SearchIndex(self.store)
+        self.schedule_index = ScheduleIndex(self.store)
+        self.stats = PortfolioStats(self.store)
+        self._stats_pending = False
+        self.history = History(self.store)
+        # Filtered views of the two lists while a search is active, else None
+        self.project_filter = None
+        self.completed_filter = None
+        # Both lists in a chosen order, or None for the store's own order
+        self.sorted = None
+        # While a batch runs: each view's selected project as it started
+        self._batch_current = None
+        # The export, import or merge running on a worker thread, if any
+        self.task = None
+        # Every edit is appended to the journal; the timer folds it into a snapshot
+        self.journal = journal
+        if self.journal is not None:
+            self.journal.attach(self.store)
+            self.root.after(self.AUTOSAVE_MS, self.autosave)
+        # What changed since the last export or import, for File > Export Changes.
+        # Its saved state only holds if the journal had nothing to replay.
+        self.changes = ChangeTracker(self.store)
+        if self.journal is not None and self.journal.records == 0:
+            self.changes.restore(self.changes_path(), self.journal.token)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
 
         # Setup style
         style = ttk.Style()
@@ -52,12 +109,50 @@ class ProjectManagerApp:
         filemenu = tk.Menu(menubar, tearoff=0, bg='white', fg=COLORS['text'])
         filemenu.add_command(label="Export CSV", command=self.export_csv)
         filemenu.add_command(label="Import CSV", command=self.import_csv)
+        filemenu.add_command(label="Merge CSV Files...", command=self.merge_csv)
+        filemenu.add_command(label="Export Changes...", command=self.export_changes)
+        filemenu.add_command(label="Apply Changes...", command=self.apply_changes)
+        filemenu.add_separator()
+        filemenu.add_command(label="Open Snapshot...", command=self.open_snapshot)
+        filemenu.add_command(label="Save Snapshot...", command=self.save_snapshot)
+        filemenu.add_separator()
+        filemenu.add_command(label="Open Database...", command=self.open_database)
+        filemenu.add_command(label="Save As Database...", command=self.save_database_as)
         filemenu.add_separator()
         filemenu.add_command(label="Manage Global Personnel", command=self.manage_global_personnel)
         filemenu.add_separator()
-        filemenu.add_command(label="Exit", command=root.quit)
+        filemenu.add_command(label="Exit", command=self.quit)
         menubar.add_cascade(label="File", menu=filemenu)
+        self.editmenu = tk.Menu(menubar, tearoff=0, bg='white', fg=COLORS['text'],
+                                postcommand=self.update_edit_menu)
+        self.editmenu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
+        self.editmenu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
+        menubar.add_cascade(label="Edit", menu=self.editmenu)
+        # Act on every project selected in the tab shown
+        projectsmenu = tk.Menu(menubar, tearoff=0, bg='white', fg=COLORS['text'])
+        projectsmenu.add_command(label="Select All", command=self.select_all_projects, accelerator="Ctrl+A")
+        projectsmenu.add_separator()
+        projectsmenu.add_command(label="Set Status...", command=self.set_status_of_selected)
+        projectsmenu.add_command(label="Mark Completed", command=self.mark_selected_completed)
+        projectsmenu.add_command(label="Assign Person...", command=self.assign_to_selected)
+        projectsmenu.add_command(label="Unassign Person...", command=self.unassign_from_selected)
+        projectsmenu.add_separator()
+        projectsmenu.add_command(label="Delete...", command=self.delete_project)
+        menubar.add_cascade(label="Projects", menu=projectsmenu)
+        schedulemenu = tk.Menu(menubar, tearoff=0, bg='white', fg=COLORS['text'])
+        schedulemenu.add_command(label="Active Between...", command=self.show_active_between)
+        schedulemenu.add_command(label="Overdue", command=self.show_overdue)
+        schedulemenu.add_separator()
+        schedulemenu.add_command(label="Timeline", command=self.show_timeline)
+        schedulemenu.add_command(label="Workload", command=self.show_workload)
+        menubar.add_cascade(label="Schedule", menu=schedulemenu)
+        toolsmenu = tk.Menu(menubar, tearoff=0, bg='white', fg=COLORS['text'])
+        toolsmenu.add_command(label="Performance...", command=self.show_performance)
+        menubar.add_cascade(label="Tools", menu=toolsmenu)
         root.config(menu=menubar)
+        root.bind("<Control-z>", lambda e: self.undo())
+        root.bind("<Control-y>", lambda e: self.redo())
+        root.bind("<Control-a>", self.on_select_all_key)
 
         main_frame = ttk.Frame(root, padding="20 20 20 20")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -65,9 +160,24 @@ class ProjectManagerApp:
         title_label = ttk.Label(main_frame, text="Project Management Dashboard", style="Title.TLabel")
         title_label.grid(row=0, column=0, columnspan=3, sticky=tk.W, pady=(0,20))
 
+        # Type-ahead search over names, sub-processes, personnel, roles and statuses
+        search_frame = ttk.Frame(main_frame)
+        search_frame.grid(row=1, column=0, columnspan=3, sticky=tk.EW, pady=(0,10))
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *args: self.apply_search())
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side=tk.LEFT, padx=(5, 0), fill=tk.X, expand=True)
+        self.sort_var = tk.StringVar(value=MANUAL_ORDER)
+        sort_combobox = ttk.Combobox(search_frame, textvariable=self.sort_var,
+                                     values=[MANUAL_ORDER] + list(SORT_KEYS), state='readonly', width=14)
+        sort_combobox.pack(side=tk.RIGHT, padx=(5, 0))
+        sort_combobox.bind("<<ComboboxSelected>>", lambda e: self.apply_sort())
+        ttk.Label(search_frame, text="Sort By:").pack(side=tk.RIGHT, padx=(10, 0))
+
         # Notebook for Active and Completed Projects
         self.notebook = ttk.Notebook(main_frame)
-        self.notebook.grid(row=1, column=0, columnspan=3, sticky=tk.NSEW)
+        self.notebook.grid(row=2, column=0, columnspan=3, sticky=tk.NSEW)
 
         # Frames for Active and Completed tabs
         self.active_frame = ttk.Frame(self.notebook)
@@ -75,6 +185,8 @@ class ProjectManagerApp:
 
         self.notebook.add(self.active_frame, text="Active Projects")
         self.notebook.add(self.completed_frame, text="Completed Projects")
+        # Completed projects are read (and loaded from the archive) only while shown
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.on_tab_changed())
 
         # ACTIVE PROJECTS TAB
         # Left side: Project list and details
@@ -93,17 +205,16 @@ class ProjectManagerApp:
         self.active_frame.rowconfigure(0, weight=1)
 
         ttk.Label(left_frame, text="Projects:").pack(anchor=tk.W)
-        self.project_listbox = tk.Listbox(
+        self.project_view = VirtualListView(
             left_frame,
+            lambda: self.shown_projects(False),
+            format_project_row,
             height=15,
             width=50,
-            bg='white',
-            fg=COLORS['text'],
-            selectbackground=COLORS['highlight'],
-            font=('Segoe UI', 10)
+            on_select=self.on_project_select,
+            on_drop=self.drop_project
         )
-        self.project_listbox.pack(pady=(5, 10), fill=tk.BOTH, expand=True)
-        self.project_listbox.bind("<<ListboxSelect>>", self.on_project_select)
+        self.project_view.frame.pack(pady=(5, 10), fill=tk.BOTH, expand=True)
 
         details_frame = ttk.LabelFrame(left_frame, text="Selected Project Details", padding="10 10 10 10")
         details_frame.pack(fill=tk.X)
@@ -118,6 +229,16 @@ class ProjectManagerApp:
         self.move_down_button = ttk.Button(middle_frame, text="▼", command=self.move_project_down, width=3)
         self.move_down_button.grid(row=1, column=0, pady=5, padx=5, sticky=tk.EW)
 
+        # Long moves in one step; projects can also be dragged in the list
+        self.move_top_button = ttk.Button(middle_frame, text="⇈", command=self.move_project_to_top, width=3)
+        self.move_top_button.grid(row=2, column=0, pady=(15, 5), padx=5, sticky=tk.EW)
+
+        self.move_bottom_button = ttk.Button(middle_frame, text="⇊", command=self.move_project_to_bottom, width=3)
+        self.move_bottom_button.grid(row=3, column=0, pady=5, padx=5, sticky=tk.EW)
+
+        self.move_to_button = ttk.Button(middle_frame, text="#", command=self.move_project_to, width=3)
+        self.move_to_button.grid(row=4, column=0, pady=5, padx=5, sticky=tk.EW)
+
         button_frame = ttk.Frame(right_frame)
         button_frame.pack(pady=10)
 
@@ -149,16 +270,15 @@ class ProjectManagerApp:
 
         ttk.Label(completed_main_frame, text="Completed Projects:").grid(row=0, column=0, columnspan=3, sticky=tk.W)
 
-        self.completed_listbox = tk.Listbox(
+        self.completed_view = VirtualListView(
             completed_main_frame,
+            lambda: self.shown_projects(True),
+            format_project_row,
             height=10,
-            width=50,
-            bg='white',
-            fg=COLORS['text'],
-            selectbackground=COLORS['highlight'],
-            font=('Segoe UI', 10)
+            width=50
         )
-        self.completed_listbox.grid(row=1, column=0, columnspan=3, pady=(5,10), sticky=tk.NSEW)
+        self.completed_view.shown = False
+        self.completed_view.frame.grid(row=1, column=0, columnspan=3, pady=(5,10), sticky=tk.NSEW)
 
         # Revert status with a dropdown
         ttk.Label(completed_main_frame, text="Revert Status To:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.E)
@@ -172,13 +292,40 @@ class ProjectManagerApp:
 
         self.completed_frame.rowconfigure(1, weight=1)
 
+        # Dashboard figures; PortfolioStats keeps them current, so showing them is cheap
+        stats_frame = ttk.LabelFrame(main_frame, text="Dashboard", padding="10 5 10 5")
+        stats_frame.grid(row=3, column=0, columnspan=3, sticky=tk.EW, pady=(10, 0))
+        self.stats_label = ttk.Label(stats_frame, text="", justify=tk.LEFT)
+        self.stats_label.pack(anchor=tk.W)
+
         # Configure main_frame's weight
-        main_frame.rowconfigure(1, weight=1)
+        main_frame.rowconfigure(2, weight=1)
         main_frame.columnconfigure(0, weight=1)
         main_frame.columnconfigure(2, weight=0)
 
         self.update_project_list()
         self.update_completed_list()
+        self.update_stats()
+        # Lists follow the store from here on, one row at a time
+        self.store.subscribe(self.on_store_changed)
+
+    # The store owns the data; these keep the view code readable.
+    @property
+    def projects(self):
+        return self.store.projects
+
+    @property
+    def completed_projects(self):
+        return self.store.completed_projects
+
+    def shown_projects(self, completed):
+        """The list a view shows: filtered, sorted or the store's own."""
+        shown = self.completed_filter if completed else self.project_filter
+        if shown is not None:
+            return shown
+        if self.sorted is not None:
+            return self.sorted.lists[completed]
+        return self.store.project_list(completed)
 
     def on_project_select(self, event):
         selected_index = self.get_selected_project_index(quiet=True)
@@ -186,11 +333,13 @@ class ProjectManagerApp:
             self.details_label.config(text="No project selected.")
             return
         project = self.projects[selected_index]
+        done, total = self.stats.completion(project)
         details_text = (
             f"Name: {project['name']}\n"
             f"Status: {project['status']}\n"
             f"Start Date: {project['start_date']}\n"
-            f"End Date: {project['end_date']}"
+            f"End Date: {project['end_date']}\n"
+            f"Sub-Processes Completed: {done} of {total}"
         )
         self.details_label.config(text=details_text)
 
@@ -199,20 +348,8 @@ class ProjectManagerApp:
         self.root.wait_window(dialog.top)
         if dialog.result is not None:
             name, status, start_date, end_date = dialog.result
-            project = {
-                "name": name,
-                "status": status,
-                "start_date": start_date,
-                "end_date": end_date,
-                "personnel": [],
-                "subprocesses": []
-            }
-            if status == "Completed":
-                self.completed_projects.append(project)
-                self.update_completed_list()
-            else:
-                self.projects.append(project)
-                self.update_project_list()
+            with span("Add Project"):
+                self.store.add_project(name, status, start_date, end_date)
 
     def edit_project(self):
         selected_index = self.get_selected_project_index()
@@ -232,42 +369,99 @@ class ProjectManagerApp:
         self.root.wait_window(dialog.top)
         if dialog.result is not None:
             _, new_status, new_start, new_end = dialog.result
-            project["status"] = new_status
-            project["start_date"] = new_start
-            project["end_date"] = new_end
-            # If now completed, move it to completed_projects
-            if new_status == "Completed":
-                self.completed_projects.append(project)
-                self.projects.pop(selected_index)
-                self.update_completed_list()
-            self.update_project_list()
+            # The store moves it to completed_projects if now completed
+            with span("Edit Project"):
+                self.store.update_project(project, status=new_status, start_date=new_start, end_date=new_end)
 
     def delete_project(self):
-        selected_index = self.get_selected_project_index()
-        if selected_index is None:
+        projects = self.selected_projects()
+        if not projects:
             return
-        project = self.projects[selected_index]
-        if messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete the project '{project['name']}'?", parent=self.root):
-            self.projects.pop(selected_index)
-            self.update_project_list()
+        if len(projects) == 1:
+            question = f"Are you sure you want to delete the project '{projects[0]['name']}'?"
+        else:
+            question = f"Are you sure you want to delete the {len(projects)} selected projects?"
+        if messagebox.askyesno("Confirm Deletion", question, parent=self.root):
+            with span("Delete Projects", projects=len(projects)):
+                self.store.delete_projects(projects)
+
+    # ---------------- Several projects at once ----------------
+    # Each is one store batch: one undo step, and the lists refresh once at
+    # its end (see on_store_changed).
+    def selected_projects(self):
+        """Every project selected in the tab shown."""
+        view = self.completed_view if self.completed_view.shown else self.project_view
+        projects = view.selected_items()
+        if not projects:
+            messagebox.showerror("Error", "No project selected.", parent=self.root)
+        return projects
+
+    def on_select_all_key(self, event):
+        # Typing in the search box or a dialog field keeps Tk's own Ctrl+A
+        if isinstance(event.widget, (tk.Entry, tk.Text)):
+            return None
+        self.select_all_projects()
+        return "break"
+
+    def select_all_projects(self):
+        (self.completed_view if self.completed_view.shown else self.project_view).select_all()
+
+    def set_status_of_selected(self, status=None):
+        projects = self.selected_projects()
+        if not projects:
+            return
+        if status is None:
+            dialog = StatusDialog(self.root, f"Set Status of {len(projects)} Project(s)")
+            self.root.wait_window(dialog.top)
+            status = dialog.result
+            if status is None:
+                return
+        with span("Set Status", projects=len(projects), status=status):
+            self.store.update_projects(projects, status=status, label="Set Status")
+
+    def mark_selected_completed(self):
+        self.set_status_of_selected("Completed")
+
+    def assign_to_selected(self):
+        projects = self.selected_projects()
+        if not projects:
+            return
+        dialog = AssignmentDialog(self.root, self.store.personnel)
+        self.root.wait_window(dialog.top)
+        if dialog.result is not None:
+            with span("Assign Person", projects=len(projects)):
+                self.store.assign_person(projects, *dialog.result)
+
+    def unassign_from_selected(self):
+        projects = self.selected_projects()
+        if not projects:
+            return
+        assigned = {person for project in projects for person, _ in project["personnel"]}
+        if not assigned:
+            messagebox.showinfo("Unassign Person", "Nobody is assigned to the selected projects.",
+                                parent=self.root)
+            return
+        dialog = AssignmentDialog(self.root, assigned, with_role=False)
+        self.root.wait_window(dialog.top)
+        if dialog.result is not None:
+            with span("Unassign Person", projects=len(projects)):
+                self.store.unassign_person(projects, dialog.result[0])
 
     def manage_subprocesses(self):
         selected_index = self.get_selected_project_index()
         if selected_index is None:
             return
         project = self.projects[selected_index]
-        dialog = ManageSubProcessesDialog(self.root, project["subprocesses"], self.global_personnel)
+        dialog = ManageSubProcessesDialog(self.root, self.store, project)
         self.root.wait_window(dialog.top)
-        self.projects[selected_index]["subprocesses"] = dialog.subprocesses
 
     def manage_project_personnel(self):
         selected_index = self.get_selected_project_index()
         if selected_index is None:
             return
         project = self.projects[selected_index]
-        dialog = ManageAssignmentsDialog(self.root, project["personnel"], self.global_personnel, "Project Personnel")
+        dialog = ManageAssignmentsDialog(self.root, self.store, project, title="Project Personnel")
         self.root.wait_window(dialog.top)
-        project["personnel"] = dialog.assignments
 
     def view_details(self):
         selected_index = self.get_selected_project_index()
@@ -276,6 +470,7 @@ class ProjectManagerApp:
         project = self.projects[selected_index]
         self.show_project_details_window(project)
 
+    @timed("Build Details Window")
     def show_project_details_window(self, project):
         # Create a new top-level window for project details
         details_window = tk.Toplevel(self.root)
@@ -315,7 +510,9 @@ class ProjectManagerApp:
         notebook.add(subprocess_frame, text="Sub-Processes")
 
         sp_columns = ("Name", "Status", "Start", "End")
-        sp_tree = ttk.Treeview(subprocess_frame, columns=sp_columns, show='headings', height=10)
+        # The tree column only holds the expand marker of sub-processes with personnel
+        sp_tree = ttk.Treeview(subprocess_frame, columns=sp_columns, show='tree headings', height=10)
+        sp_tree.column("#0", width=20, stretch=False)
         for col in sp_columns:
             sp_tree.heading(col, text=col)
             # Assign some reasonable widths
@@ -324,15 +521,20 @@ class ProjectManagerApp:
             else:
                 sp_tree.column(col, width=100)
 
+        sp_scrollbar = ttk.Scrollbar(subprocess_frame, orient=tk.VERTICAL, command=sp_tree.yview)
+        sp_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=5)
         sp_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        # Populate sub-process tree
-        for sp in project["subprocesses"]:
-            sp_id = sp_tree.insert("", tk.END, values=(sp['name'], sp['status'], sp['start_date'], sp['end_date']))
-            # If the sub-process has personnel, add them as child items
-            if sp["personnel"]:
-                for (pname, role) in sp["personnel"]:
-                    sp_tree.insert(sp_id, tk.END, values=(f"Personnel: {pname}", role, "", ""))
+        # Sub-processes are inserted as they are scrolled to, and their
+        # personnel when they are expanded
+        LazyTree(
+            sp_tree,
+            project["subprocesses"],
+            lambda sp: (sp['name'], sp['status'], sp['start_date'], sp['end_date']),
+            sp_scrollbar,
+            children=lambda sp: sp["personnel"],
+            child_values=lambda a: (f"Personnel: {a[0]}", a[1], "", "")
+        )
 
         # ---------------- Personnel Tab ----------------
         # Just project-level personnel here
@@ -345,190 +547,1389 @@ class ProjectManagerApp:
             p_tree.heading(col, text=col)
             p_tree.column(col, width=150)
 
+        p_scrollbar = ttk.Scrollbar(personnel_frame, orient=tk.VERTICAL, command=p_tree.yview)
+        p_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=5)
         p_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        # Populate personnel tree with project-level personnel
-        for (pname, role) in project["personnel"]:
-            p_tree.insert("", tk.END, values=(pname, role))
+        # Project-level personnel, inserted as they are scrolled to
+        LazyTree(p_tree, project["personnel"], tuple, p_scrollbar)
 
         # Make the details window slightly larger
         details_window.geometry("600x400")
 
     def revert_completed_project(self):
-        sel = self.completed_listbox.curselection()
-        if not sel:
+        projects = self.completed_view.selected_items()
+        if not projects:
             messagebox.showerror("Error", "No completed project selected.", parent=self.root)
             return
-        idx = sel[0]
-        project = self.completed_projects[idx]
         new_status = self.revert_status_var.get()
         # Validate
         if new_status not in STATUS_OPTIONS or new_status == "Completed":
             messagebox.showerror("Error", "Invalid status selected.", parent=self.root)
             return
 
-        project["status"] = new_status
-        # Move project back to active
-        self.projects.append(project)
-        self.completed_projects.pop(idx)
-        self.update_project_list()
-        self.update_completed_list()
+        # Move the projects back to active
+        with span("Revert Projects", projects=len(projects)):
+            self.store.revert_projects(projects, new_status)
 
+    @timed("Refresh Project List")
     def update_project_list(self):
-        self.project_listbox.delete(0, tk.END)
-        for project in self.projects:
-            self.project_listbox.insert(tk.END, f"{project['name']} ({project['status']})")
+        self.project_view.refresh()
         self.on_project_select(None)
 
+    @timed("Refresh Completed List")
     def update_completed_list(self):
-        self.completed_listbox.delete(0, tk.END)
-        for p in self.completed_projects:
-            self.completed_listbox.insert(tk.END, f"{p['name']} ({p['status']})")
+        self.completed_view.refresh()
+
+    def on_tab_changed(self):
+        shown = self.notebook.select() == str(self.completed_frame)
+        if shown != self.completed_view.shown:
+            self.completed_view.shown = shown
+            if shown:
+                self.update_completed_list()
+
+    def view_for(self, completed):
+        return self.completed_view if completed else self.project_view
+
+    def positions_in_view(self, completed, projects):
+        """{id(project): row} for those of projects in the list a view shows."""
+        shown = self.completed_filter if completed else self.project_filter
+        if shown is not None:
+            wanted = {id(p) for p in projects}
+            return {id(p): i for i, p in enumerate(shown) if id(p) in wanted}
+        if self.sorted is not None:
+            return self.sorted.positions(projects, completed)
+        return self.store.positions(projects, completed)
+
+    def reselect(self, current):
+        """Select current[completed] and the projects marked in each view
+        again, after their rows moved wholesale, in one pass per list."""
+        if self.project_filter is not None:
+            self.apply_search(current)
+            return
+        for completed in (False, True):
+            view = self.view_for(completed)
+            marked = view.selected_items()
+            if current[completed] is not None:
+                marked.append(current[completed])
+            view.select_items(current[completed], marked, self.positions_in_view(completed, marked))
+        self.on_project_select(None)
+
+    def current_projects(self):
+        return {completed: self.view_for(completed).selected_item() for completed in (False, True)}
+
+    def on_reset(self, previous):
+        """The store was reloaded with new records: select the ones with the
+        ids of those selected before."""
+        old_lists = {False: [], True: []}
+        for p in previous:
+            old_lists[p["status"] == "Completed"].append(p)
+        old_current = {}
+        for completed in (False, True):
+            view = self.view_for(completed)
+            shown = self.completed_filter if completed else self.project_filter
+            if shown is None:
+                # The sorted lists still hold the old records here
+                shown = self.sorted.lists[completed] if self.sorted is not None else old_lists[completed]
+            old_current[completed] = shown[view.selection] if view.selection is not None else None
+        ids = {p["id"] for view in (self.project_view, self.completed_view) for p in view.selected_items()}
+        ids.update(p["id"] for p in old_current.values() if p is not None)
+        found = self.store.projects_by_id(ids)
+        if self.sorted is not None:
+            self.sorted.rebuild()
+        current = {}
+        for completed in (False, True):
+            view = self.view_for(completed)
+            in_list = [found[p["id"]] for p in view.selected_items()
+                       if p["id"] in found and (found[p["id"]]["status"] == "Completed") == completed]
+            view.marked = {id(p): p for p in in_list}
+            old = old_current[completed]
+            project = found.get(old["id"]) if old is not None else None
+            if project is not None and (project["status"] == "Completed") != completed:
+                project = None
+            current[completed] = project
+        self.reselect(current)
+
+    def apply_sort(self):
+        """Show both lists in the order chosen under Sort By."""
+        key = self.sort_var.get()
+        current = self.current_projects()
+        with span("Sort Projects", key=key):
+            self.sorted = None if key == MANUAL_ORDER else SortedProjects(self.store, key)
+        self.reselect(current)
+
+    @timed("Search")
+    def apply_search(self, current=None):
+        """Filter both lists by the search box, keeping current (by default
+        each view's selected project) and the marked projects selected."""
+        if current is None:
+            current = self.current_projects()
+        matches = self.search_index.search(self.search_var.get())
+        for completed, attr in ((False, "project_filter"), (True, "completed_filter")):
+            view = self.view_for(completed)
+            setattr(self, attr, None)
+            items = self.shown_projects(completed)
+            setattr(self, attr, None if matches is None else [p for p in items if id(p) in matches])
+            marked = view.selected_items()
+            if current[completed] is not None:
+                marked.append(current[completed])
+            view.select_items(current[completed], marked, self.positions_in_view(completed, marked))
+        self.on_project_select(None)
+
+    def on_store_changed(self, event, details):
+        if not self._stats_pending:
+            self._stats_pending = True
+            self.root.after_idle(self.update_stats)
+        if event == "batch_started":
+            # The lists are brought up to date once, when the batch finishes
+            self._batch_current = self.current_projects()
+            return
+        if event == "batch_finished":
+            current, self._batch_current = self._batch_current, None
+            if current is not None:
+                with span("Refresh After Batch", label=details["label"]):
+                    self.reselect(current)
+            return
+        if event == "reset":
+            self.on_reset(details["previous"][1])
+            if self._batch_current is not None:
+                self._batch_current = self.current_projects()
+            return
+        steps = self.sorted.update(event, details) if self.sorted is not None else None
+        # Rows a batch adds or removes are found again by identity at its end
+        if event == "project_removed":
+            self.view_for(details["completed"]).unmark(details["project"])
+        elif event == "project_updated" and details["completed"] != details["old_completed"]:
+            self.view_for(details["old_completed"]).unmark(details["project"])
+        if self._batch_current is not None:
+            return
+        if self.project_filter is not None:
+            # Row positions in a filtered list don't follow the store's, so
+            # re-run the search; the index is already up to date.
+            if event.startswith("project_"):
+                self.apply_search()
+            return
+        if self.sorted is not None:
+            # Rows move to their sorted places instead
+            for completed, change, *indexes in steps:
+                view = self.view_for(completed)
+                if change == "inserted":
+                    view.row_inserted(*indexes)
+                elif change == "removed":
+                    view.row_removed(*indexes)
+                else:
+                    view.row_moved(*indexes)
+            if steps:
+                self.on_project_select(None)
+            return
+        # Translate store notifications into single-row list updates
+        if event == "project_added":
+            self.view_for(details["completed"]).row_inserted(details["index"])
+        elif event == "project_removed":
+            self.view_for(details["completed"]).row_removed(details["index"])
+        elif event == "project_moved":
+            self.view_for(details["completed"]).row_moved(details["old_index"], details["index"])
+        elif event == "project_updated":
+            if details["completed"] != details["old_completed"]:
+                self.view_for(details["old_completed"]).row_removed(details["old_index"])
+                self.view_for(details["completed"]).row_inserted(details["index"])
+            else:
+                self.view_for(details["completed"]).row_changed(details["index"])
+        else:
+            return
+        self.on_project_select(None)
+
+    @timed("Update Dashboard")
+    def update_stats(self):
+        self._stats_pending = False
+        stats = self.stats
+        project_counts = "   ".join(f"{s}: {stats.project_status[s]}" for s in STATUS_OPTIONS)
+        sp_counts = "   ".join(f"{s}: {stats.subprocess_status[s]}" for s in STATUS_OPTIONS)
+        done, total = stats.overall_completion()
+        ratio = f", {done / total:.0%}" if total else ""
+        people, most = stats.most_assigned()
+        if people:
+            busiest = ", ".join(people[:3]) + (f" and {len(people) - 3} more" if len(people) > 3 else "")
+            busiest = f"{busiest} ({most} assignment{'s' if most != 1 else ''})"
+        else:
+            busiest = "nobody"
+        self.stats_label.config(text=(
+            f"Projects  {project_counts}\n"
+            f"Sub-Processes  {sp_counts}   ({done} of {total} done{ratio})\n"
+            f"Overdue: {stats.overdue_count()}   Most assigned: {busiest}"
+        ))
 
     def get_selected_project_index(self, quiet=False):
-        selected_indices = self.project_listbox.curselection()
-        if not selected_indices:
+        """Index into self.projects of the selected project, filtered or not."""
+        project = self.project_view.selected_item()
+        if project is None:
             if not quiet:
                 messagebox.showerror("Error", "No project selected.")
             return None
-        return selected_indices[0]
+        if self.project_filter is None and self.sorted is None:
+            return self.project_view.selection
+        return self.store.locate(project)[1]
+
+    def show_active_between(self):
+        start = simpledialog.askstring("Active Between", "From date (YYYY-MM-DD):", parent=self.root)
+        if not start:
+            return
+        end = simpledialog.askstring("Active Between", "To date (YYYY-MM-DD):", parent=self.root)
+        if not end:
+            return
+        try:
+            with span("Active Between"):
+                items = self.schedule_index.active_between(start, end)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.show_schedule_results(f"Active {normalize_date(start)} to {normalize_date(end)}", items)
+
+    @timed("Overdue")
+    def show_overdue(self):
+        self.show_schedule_results("Overdue", self.schedule_index.overdue())
+
+    @timed("Open Timeline")
+    def show_timeline(self):
+        TimelineView(self.root, self.store, self.schedule_index)
+
+    @timed("Open Workload")
+    def show_workload(self):
+        WorkloadView(self.root, self.store)
+
+    def show_performance(self):
+        # Profiles go next to the autosave, or the working directory without one
+        folder = os.path.dirname(self.journal.base_path) if self.journal is not None else os.getcwd()
+        PerformanceView(self.root, TRACE, folder)
+
+    @timed("Build Schedule Results")
+    def show_schedule_results(self, title, items):
+        window = tk.Toplevel(self.root)
+        window.title(f"{title} ({len(items)})")
+        window.configure(bg=COLORS['background'])
+        window.transient(self.root)
+
+        frame = ttk.Frame(window, padding="10 10 10 10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("Project", "Sub-Process", "Status", "Start Date", "End Date")
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=15)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=130)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        for project, sp in items:
+            record = sp if sp is not None else project
+            tree.insert("", tk.END, values=(project["name"], sp["name"] if sp is not None else "",
+                                             record["status"], record["start_date"], record["end_date"]))
 
     def manage_global_personnel(self):
-        dialog = GlobalPersonnelDialog(self.root, self.global_personnel)
+        dialog = GlobalPersonnelDialog(self.root, self.store)
         self.root.wait_window(dialog.top)
         self.cleanup_deleted_personnel()
 
+    @timed("Clean Up Personnel")
     def cleanup_deleted_personnel(self):
-        def filter_assignments(assignments):
-            return [(p, r) for (p, r) in assignments if p in self.global_personnel]
-
-        for project in self.projects:
-            project["personnel"] = filter_assignments(project["personnel"])
-            for sp in project["subprocesses"]:
-                sp["personnel"] = filter_assignments(sp["personnel"])
-
-        for cproject in self.completed_projects:
-            cproject["personnel"] = filter_assignments(cproject["personnel"])
-            for sp in cproject["subprocesses"]:
-                sp["personnel"] = filter_assignments(sp["personnel"])
+        self.store.cleanup_deleted_personnel()
 
     def export_csv(self):
-        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
+        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=EXPORT_FILETYPES)
         if not filename:
             return
-
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Global personnel
-            for person_name in sorted(self.global_personnel):
-                writer.writerow(["PERSON", person_name])
-
-            # Active projects
-            for project in self.projects:
-                writer.writerow(["PROJECT", project["name"], project["status"], project["start_date"], project["end_date"]])
-                for (pname, role) in project["personnel"]:
-                    writer.writerow(["PPERSONNEL", project["name"], pname, role])
-                for sp in project["subprocesses"]:
-                    writer.writerow(["SUBPROCESS", project["name"], sp["name"], sp["status"], sp["start_date"], sp["end_date"]])
-                    for (pname, role) in sp["personnel"]:
-                        writer.writerow(["SPERSONNEL", project["name"], sp["name"], pname, role])
-
-            # Completed projects
-            for cproject in self.completed_projects:
-                writer.writerow(["PROJECT", cproject["name"], cproject["status"], cproject["start_date"], cproject["end_date"]])
-                for (pname, role) in cproject["personnel"]:
-                    writer.writerow(["PPERSONNEL", cproject["name"], pname, role])
-                for sp in cproject["subprocesses"]:
-                    writer.writerow(["SUBPROCESS", cproject["name"], sp["name"], sp["status"], sp["start_date"], sp["end_date"]])
-                    for (pname, role) in sp["personnel"]:
-                        writer.writerow(["SPERSONNEL", cproject["name"], sp["name"], pname, role])
-
-        messagebox.showinfo("Success", f"Projects exported to {filename}")
+        task = BackgroundTask(timed("Export CSV")(export_base), self.store, filename)
+        self.run_task("Exporting", task, "projects",
+                      lambda outcome: self.on_export_finished(filename, outcome))
+
+    def run_task(self, title, task, unit, on_finished):
+        self.task = task
+        ProgressDialog(self.root, title, task, unit, on_finished)
+
+    def on_export_finished(self, filename, outcome):
+        if outcome[0] == "done":
+            # Change files follow this export from now on
+            self.changes.clear(outcome[1])
+            messagebox.showinfo("Success", f"Projects exported to {filename}")
+        elif outcome[0] == "error":
+            messagebox.showerror("Error", f"Export failed: {outcome[1]}", parent=self.root)
 
     def import_csv(self):
-        filename = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+        filename = filedialog.askopenfilename(filetypes=EXPORT_FILETYPES)
         if not filename:
             return
+        # Parse on a worker thread; the current portfolio stays as it is
+        # until the new one is complete.
+        task = BackgroundTask(timed("Parse CSV")(read_base), filename)
+        self.run_task("Importing", task, "bytes",
+                      lambda outcome: self.on_import_finished(filename, outcome))
+
+    def on_import_finished(self, filename, outcome):
+        if outcome[0] == "done":
+            personnel, projects, base = outcome[1]
+            with span("Load Portfolio", projects=len(projects)):
+                self.store.load(personnel, projects)
+            self.changes.clear(base)
+            messagebox.showinfo("Success", f"Projects imported from {filename}")
+        elif outcome[0] == "error":
+            messagebox.showerror("Error", f"Import failed: {outcome[1]}", parent=self.root)
+
+    def merge_csv(self):
+        filenames = filedialog.askopenfilenames(filetypes=EXPORT_FILETYPES)
+        if not filenames:
+            return
+        dialog = MergeDialog(self.root, len(filenames))
+        self.root.wait_window(dialog.top)
+        if dialog.result is None:
+            return
+        # Files are parsed in parallel worker processes, then merged here in
+        # the order they were chosen
+        task = BackgroundTask(timed("Parse CSV Files")(parse_files), list(filenames))
+        self.run_task("Merging", task, "files",
+                      lambda outcome: self.on_merge_finished(dialog.result, outcome))
+
+    def on_merge_finished(self, policy, outcome):
+        if outcome[0] == "done":
+            with span("Merge Portfolio", files=len(outcome[1]), policy=policy):
+                counts = merge_into(self.store, outcome[1], policy)
+            messagebox.showinfo("Success", f"Merged projects: {describe(counts)}")
+        elif outcome[0] == "error":
+            messagebox.showerror("Error", f"Merge failed: {outcome[1]}", parent=self.root)
+
+    def export_changes(self):
+        if self.changes.empty:
+            messagebox.showinfo("Export Changes", "Nothing has changed since the last export or import.",
+                                parent=self.root)
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=EXPORT_FILETYPES)
+        if not filename:
+            return
+        whole = self.changes.reset
+        try:
+            with span("Export Changes"):
+                export_delta(self.store, self.changes, filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Export failed: {e}", parent=self.root)
+            return
+        if whole:
+            messagebox.showinfo("Success", f"There was no earlier export to compare with, so the "
+                                           f"whole portfolio was written to {filename}")
+        else:
+            messagebox.showinfo("Success", f"Changes exported to {filename}")
+
+    def apply_changes(self):
+        filename = filedialog.askopenfilename(filetypes=EXPORT_FILETYPES)
+        if not filename:
+            return
+        try:
+            delta = DeltaFile(filename)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not read changes: {e}", parent=self.root)
+            return
+        with delta:
+            if delta.base and delta.base != self.changes.base:
+                if not messagebox.askyesno(
+                        "Apply Changes", f"{os.path.basename(filename)} does not follow the last file "
+                                         "exported or imported here. Apply it anyway?", parent=self.root):
+                    return
+            try:
+                with span("Apply Changes") as details, self.changes.applying(delta):
+                    apply_delta(self.store, delta.rows())
+                    details["rows"] = delta.rows_read
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"Could not apply changes: {e}", parent=self.root)
+
+    def changes_path(self):
+        return self.journal.base_path + ".changes"
+
+    def open_snapshot(self):
+        filename = filedialog.askopenfilename(filetypes=[("Portfolio Snapshot", "*.pms")])
+        if not filename:
+            return
+        try:
+            with span("Read Snapshot"):
+                personnel, projects = read_snapshot(filename)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not open snapshot: {e}", parent=self.root)
+            return
+        with span("Load Portfolio", projects=len(projects)):
+            self.store.load(personnel, projects)
 
-        self.projects.clear()
-        self.completed_projects.clear()
-        self.global_personnel.clear()
+    def save_snapshot(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".pms", filetypes=[("Portfolio Snapshot", "*.pms")])
+        if not filename:
+            return
+        try:
+            with span("Save Snapshot"):
+                write_snapshot(self.store, filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save snapshot: {e}", parent=self.root)
+            return
+        messagebox.showinfo("Success", f"Snapshot saved to {filename}")
 
-        projects_dict = {}
+    def open_database(self):
+        filename = filedialog.askopenfilename(filetypes=[("Portfolio Database", "*.db"), ("All Files", "*.*")])
+        if not filename:
+            return
+        self.close_database()
+        try:
+            with span("Open Database"):
+                self.backend = open_database(filename, self.store)
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Could not open database: {e}", parent=self.root)
+            return
+        # Undoing past this point would write the old portfolio into the database
+        self.history.clear()
+        self.root.title(f"Professional Project Manager - {filename}")
 
-        with open(filename, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if not row:
-                    continue
-                rtype = row[0]
-                if rtype == "PERSON":
-                    _, pname = row
-                    self.global_personnel.add(pname)
-                elif rtype == "PROJECT":
-                    _, pname, status, sdate, edate = row
-                    projects_dict[pname] = {
-                        "name": pname,
-                        "status": status,
-                        "start_date": sdate,
-                        "end_date": edate,
-                        "personnel": [],
-                        "subprocesses": []
-                    }
-                elif rtype == "PPERSONNEL":
-                    _, pname, pername, perrole = row
-                    if pername not in self.global_personnel:
-                        self.global_personnel.add(pername)
-                    if pname in projects_dict:
-                        projects_dict[pname]["personnel"].append((pername, perrole))
-                elif rtype == "SUBPROCESS":
-                    _, pname, spname, spstatus, spsdate, spedate = row
-                    if pname in projects_dict:
-                        projects_dict[pname]["subprocesses"].append({
-                            "name": spname,
-                            "status": spstatus,
-                            "start_date": spsdate,
-                            "end_date": spedate,
-                            "personnel": []
-                        })
-                elif rtype == "SPERSONNEL":
-                    _, pname, spname, pername, perrole = row
-                    if pername not in self.global_personnel:
-                        self.global_personnel.add(pername)
-                    if pname in projects_dict:
-                        for sp in projects_dict[pname]["subprocesses"]:
-                            if sp["name"] == spname:
-                                sp["personnel"].append((pername, perrole))
-                                break
-
-        # Separate completed from active
-        for p in projects_dict.values():
-            if p["status"] == "Completed":
-                self.completed_projects.append(p)
+    def save_database_as(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("Portfolio Database", "*.db")])
+        if not filename:
+            return
+        self.close_database()
+        try:
+            with span("Save Database"):
+                backend = SQLiteBackend(filename)
+                backend.save_all(self.store)
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Could not save database: {e}", parent=self.root)
+            return
+        # From now on every edit is written straight to the database
+        backend.attach(self.store)
+        self.backend = backend
+        self.root.title(f"Professional Project Manager - {filename}")
+
+    def close_database(self):
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+            self.root.title("Professional Project Manager")
+
+    def update_edit_menu(self):
+        for index, action, label in ((0, "Undo", self.history.undo_label()),
+                                     (1, "Redo", self.history.redo_label())):
+            if label is None:
+                self.editmenu.entryconfig(index, label=action, state=tk.DISABLED)
             else:
-                self.projects.append(p)
+                self.editmenu.entryconfig(index, label=f"{action} {label}", state=tk.NORMAL)
+
+    def undo(self):
+        self._step_history("Undo", self.history.undo)
+
+    def redo(self):
+        self._step_history("Redo", self.history.redo)
+
+    def _step_history(self, name, step):
+        try:
+            with span(name) as details:
+                details["step"] = step()
+        except (ValueError, IndexError, KeyError) as e:
+            # History was cleared; the portfolio keeps whatever was applied
+            messagebox.showerror("Error", f"Could not undo or redo: {e}", parent=self.root)
+
+    def autosave(self):
+        if self.task is not None and self.task.running():
+            # An export may be reading the snapshot that compacting replaces
+            self.root.after(self.AUTOSAVE_RETRY_MS, self.autosave)
+            return
+        with span("Autosave"):
+            self.journal.compact_if_needed()
+        self.root.after(self.AUTOSAVE_MS, self.autosave)
+
+    def quit(self):
+        if self.task is not None and self.task.running():
+            self.task.cancel()
+            self.task.thread.join()
+        if self.journal is not None:
+            self.journal.compact()
+            self.changes.save(self.changes_path(), self.journal.token)
+            self.journal.close()
+        self.close_database()
+        self.root.quit()
+
+    def reorder_allowed(self):
+        if self.project_filter is not None:
+            messagebox.showerror("Error", "Clear the search to reorder projects.", parent=self.root)
+            return False
+        if self.sorted is not None:
+            messagebox.showerror("Error", f"Sort by {MANUAL_ORDER} to reorder projects.", parent=self.root)
+            return False
+        return True
+
+    def move_selected_project(self, index):
+        """Move the selected project straight to index, in one step."""
+        idx = self.get_selected_project_index()
+        if idx is None or not self.reorder_allowed():
+            return
+        with span("Move Project"):
+            self.store.move_project(self.projects[idx], index)
 
-        self.update_project_list()
-        self.update_completed_list()
-        messagebox.showinfo("Success", f"Projects imported from {filename}")
+    def move_project_to_top(self):
+        self.move_selected_project(0)
+
+    def move_project_to_bottom(self):
+        self.move_selected_project(len(self.projects) - 1)
+
+    def move_project_to(self):
+        if self.get_selected_project_index() is None or not self.reorder_allowed():
+            return
+        position = simpledialog.askinteger("Move Project", f"Move to position (1-{len(self.projects)}):",
+                                           parent=self.root, minvalue=1, maxvalue=len(self.projects))
+        if position is not None:
+            self.move_selected_project(position - 1)
+
+    def drop_project(self, from_index, to_index):
+        """A project dragged from one row of the list and dropped on another."""
+        if not self.reorder_allowed():
+            return
+        with span("Move Project"):
+            self.store.move_project(self.projects[from_index], to_index)
 
     def move_project_up(self):
         idx = self.get_selected_project_index()
-        if idx is None:
+        if idx is None or not self.reorder_allowed():
             return
         if idx > 0:
-            self.projects[idx], self.projects[idx-1] = self.projects[idx-1], self.projects[idx]
-            self.update_project_list()
-            self.project_listbox.selection_set(idx-1)
+            with span("Move Project"):
+                self.store.move_project(self.projects[idx], idx-1)
 
     def move_project_down(self):
         idx = self.get_selected_project_index()
-        if idx is None:
+        if idx is None or not self.reorder_allowed():
             return
         if idx < len(self.projects)-1:
-            self.projects[idx], self.projects[idx+1] = self.projects[idx+1], self.projects[idx]
-            self.update_project_list()
-            self.project_listbox.selection_set(idx+1)
+            with span("Move Project"):
+                self.store.move_project(self.projects[idx], idx+1)
+
+
+def format_project_row(project):
+    return f"{project['name']} ({project['status']})"
+
+
+class VirtualListView:
+    """A Listbox that only materializes the rows scrolled into view.
+
+    get_items returns the backing list, which may be replaced wholesale (on
+    import). Callers report changes with row_changed/row_inserted/row_removed/
+    row_moved so that an edit touches only the affected visible rows.
+
+    While shown is False (say, in a hidden tab) no rows are read at all;
+    set it back and refresh() to catch up.
+
+    Ctrl-click, Shift-click and Ctrl+A select several rows. marked holds
+    every selected item by identity, so it needs no fixing up as rows move;
+    selection is the current row, the one single-item actions work on.
+    """
+
+    WHEEL_STEP = 3
+    SHIFT, CONTROL = 0x1, 0x4  # event.state bits
+
+    def __init__(self, parent, get_items, format_row, height=15, width=50, on_select=None, on_drop=None):
+        self.get_items = get_items
+        self.format_row = format_row
+        self.on_select = on_select
+        self.on_drop = on_drop  # on_drop(from_index, to_index) when a row is dragged
+        self._drag_from = None
+        self._click = None      # (row, event.state) of the click being handled
+        self.first = 0          # Model index of the top visible row
+        self.visible = height   # Number of rows that fit in the listbox
+        self.selection = None   # Model index of the selected row
+        self.marked = {}        # id(item) -> item for every selected row
+        self.shown = True
+
+        self.frame = ttk.Frame(parent)
+        self.listbox = tk.Listbox(
+            self.frame,
+            height=height,
+            width=width,
+            bg='white',
+            fg=COLORS['text'],
+            selectbackground=COLORS['highlight'],
+            font=('Segoe UI', 10),
+            activestyle='none',
+            selectmode=tk.EXTENDED,
+            exportselection=False
+        )
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.row_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+        self.listbox.bind("<Configure>", self.on_configure)
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<MouseWheel>", self.on_mousewheel)
+        self.listbox.bind("<Button-4>", self.on_mousewheel)
+        self.listbox.bind("<Button-5>", self.on_mousewheel)
+        self.listbox.bind("<Up>", lambda e: self.step_selection(-1))
+        self.listbox.bind("<Down>", lambda e: self.step_selection(1))
+        self.listbox.bind("<Prior>", lambda e: self.step_selection(-self.visible))
+        self.listbox.bind("<Next>", lambda e: self.step_selection(self.visible))
+        self.listbox.bind("<Control-a>", lambda e: self.select_all())
+        self.listbox.bind("<ButtonPress-1>", self.on_press)
+        self.listbox.bind("<B1-Motion>", self.on_drag_motion)
+        if on_drop is not None:
+            self.listbox.bind("<ButtonRelease-1>", self.on_drag_end)
+
+    # ---------------- Rendering ----------------
+    def refresh(self):
+        """Rebuild the visible window, e.g. after the backing list was replaced."""
+        if self.selection is not None and self.selection >= len(self.get_items()):
+            self.selection = None
+        self.render()
+
+    def render(self):
+        items = self.get_items()
+        self.first = max(0, min(self.first, len(items) - self.visible))
+        if not self.shown:
+            return
+        self.listbox.delete(0, tk.END)
+        for item in items[self.first:self.first + self.visible]:
+            self.listbox.insert(tk.END, self.format_row(item))
+        self.show_selection()
+        self.update_scrollbar()
+
+    def is_visible(self, index):
+        return self.shown and self.first <= index < self.first + self.visible
+
+    def show_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        if not self.marked:
+            return
+        items = self.get_items()
+        for index in range(self.first, min(self.first + self.visible, len(items))):
+            if id(items[index]) in self.marked:
+                self.listbox.selection_set(index - self.first)
+
+    def update_scrollbar(self):
+        count = len(self.get_items())
+        if count <= self.visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first / count, (self.first + self.visible) / count)
+
+    # ---------------- Scrolling ----------------
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.get_items()) - self.visible))
+        if first != self.first:
+            self.first = first
+            self.render()
+
+    def see(self, index):
+        if index < self.first:
+            self.scroll_to(index)
+        elif index >= self.first + self.visible:
+            self.scroll_to(index - self.visible + 1)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.get_items())))
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll_to(self.first + int(amount) * step)
+
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - self.WHEEL_STEP)
+        else:
+            self.scroll_to(self.first + self.WHEEL_STEP)
+        return "break"
+
+    def on_configure(self, event):
+        visible = max(1, (event.height - 4) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    # ---------------- Selection ----------------
+    def selected_item(self):
+        if self.selection is None:
+            return None
+        return self.get_items()[self.selection]
+
+    def selected_items(self):
+        """Every selected item, the current one included."""
+        return list(self.marked.values())
+
+    def select(self, index):
+        self.selection = index
+        self.marked = {}
+        if index is not None:
+            item = self.get_items()[index]
+            self.marked[id(item)] = item
+            self.see(index)
+        self.show_selection()
+
+    def select_items(self, current, marked, positions):
+        """Select current and marked again after rows moved wholesale;
+        positions is {id(item): index} for those still listed."""
+        self.marked = {id(item): item for item in marked if id(item) in positions}
+        self.selection = positions.get(id(current)) if current is not None else None
+        self.render()
+
+    def select_all(self):
+        self.marked = {id(item): item for item in self.get_items()}
+        if self.selection is None and self.marked:
+            self.selection = self.first
+        self.show_selection()
+        if self.on_select is not None:
+            self.on_select(None)
+        return "break"
+
+    def unmark(self, item):
+        """item has left the list."""
+        self.marked.pop(id(item), None)
+
+    def on_press(self, event):
+        self._click = (self.row_at(event.y), event.state)
+        if self.on_drop is not None:
+            self._drag_from = self._click[0]
+
+    def on_listbox_select(self, event):
+        # Tk only knows the visible rows, so the click decides, not curselection()
+        row, state = self._click if self._click is not None else (None, 0)
+        self._click = None
+        if row is None:
+            sel = self.listbox.curselection()
+            if not sel:
+                return
+            row, state = self.first + sel[0], 0
+        items = self.get_items()
+        item = items[row]
+        if state & self.SHIFT and self.selection is not None:
+            # A range from the current row, which stays current
+            if not state & self.CONTROL:
+                self.marked = {}
+            lo, hi = sorted((self.selection, row))
+            self.marked.update((id(i), i) for i in items[lo:hi + 1])
+        elif state & self.CONTROL:
+            if id(item) in self.marked:
+                del self.marked[id(item)]
+                if self.selection == row:
+                    self.selection = None
+            else:
+                self.marked[id(item)] = item
+                self.selection = row
+        else:
+            self.selection = row
+            self.marked = {id(item): item}
+        self.show_selection()
+        if self.on_select is not None:
+            self.on_select(event)
+
+    def step_selection(self, step):
+        count = len(self.get_items())
+        if count:
+            current = self.selection if self.selection is not None else -1
+            self.select(max(0, min(current + step, count - 1)))
+            if self.on_select is not None:
+                self.on_select(None)
+        return "break"
+
+    # ---------------- Dragging ----------------
+    def row_at(self, y):
+        """Model index of the row at height y, or None past the last row."""
+        items = self.get_items()
+        if not items:
+            return None
+        return min(self.first + self.listbox.nearest(y), len(items) - 1)
+
+    def on_drag_motion(self, event):
+        # Never Tk's drag-to-select: its range would only cover visible rows
+        if self._drag_from is None:
+            return "break"
+        self.listbox.config(cursor="sb_v_double_arrow")
+        # Scroll while dragged past the top or bottom edge
+        if event.y < 0:
+            self.scroll_to(self.first - 1)
+        elif event.y > self.listbox.winfo_height():
+            self.scroll_to(self.first + 1)
+        # Keep the selection on the dragged row rather than the one under the pointer
+        return "break"
+
+    def on_drag_end(self, event):
+        from_index, self._drag_from = self._drag_from, None
+        self.listbox.config(cursor="")
+        to_index = self.row_at(event.y)
+        if from_index is not None and to_index is not None and to_index != from_index:
+            self.on_drop(from_index, to_index)
+
+    # ---------------- Change notifications ----------------
+    def row_changed(self, index):
+        if not self.is_visible(index):
+            return
+        row = index - self.first
+        item = self.get_items()[index]
+        self.listbox.delete(row)
+        self.listbox.insert(row, self.format_row(item))
+        if id(item) in self.marked:
+            self.listbox.selection_set(row)
+
+    def row_inserted(self, index):
+        if self.selection is not None and self.selection >= index:
+            self.selection += 1
+        if index < self.first:
+            self.first += 1
+        elif self.is_visible(index):
+            self.listbox.insert(index - self.first, self.format_row(self.get_items()[index]))
+            if self.listbox.size() > self.visible:
+                self.listbox.delete(self.visible)
+            self.show_selection()
+        self.update_scrollbar()
+
+    def row_removed(self, index):
+        if self.selection is not None:
+            if self.selection == index:
+                self.selection = None
+            elif self.selection > index:
+                self.selection -= 1
+        items = self.get_items()
+        if index < self.first:
+            self.first -= 1
+        elif self.is_visible(index):
+            self.listbox.delete(index - self.first)
+            if self.first > 0 and self.first + self.visible > len(items):
+                # Scrolled to the bottom: pull the row above into view
+                self.first -= 1
+                self.listbox.insert(0, self.format_row(items[self.first]))
+            elif self.first + self.visible <= len(items):
+                self.listbox.insert(tk.END, self.format_row(items[self.first + self.visible - 1]))
+            self.show_selection()
+        self.update_scrollbar()
+
+    def row_moved(self, old_index, new_index):
+        lo, hi = min(old_index, new_index), max(old_index, new_index)
+        if self.selection == old_index:
+            self.selection = new_index
+        elif self.selection is not None and lo <= self.selection <= hi:
+            self.selection += 1 if new_index < old_index else -1
+        # Only rows between the two positions changed
+        for index in range(max(lo, self.first), min(hi + 1, self.first + self.visible)):
+            self.row_changed(index)
+        self.show_selection()
+        if self.selection == new_index:
+            self.see(new_index)
+
+
+class LazyTree:
+    """Fills a Treeview as it is used rather than all at once.
+
+    Top-level rows for items are inserted a page at a time, the next page
+    whenever the view is scrolled near the last row inserted. An item with
+    children (a list from children(item)) gets a placeholder child so it can
+    be expanded; the real rows replace it the first time it is opened. The
+    window holding the tree opens at the same speed however long items is.
+    """
+
+    PAGE = 100
+    NEAR_END = 0.9  # Scrolled past this fraction of the rows: insert the next page
+
+    def __init__(self, tree, items, values, scrollbar=None, children=None, child_values=None):
+        self.tree = tree
+        self.items = items
+        self.values = values
+        self.scrollbar = scrollbar
+        self.children = children
+        self.child_values = child_values
+        self.inserted = 0     # Items with a row so far
+        self._unopened = {}   # iid -> item whose children are still a placeholder
+        self._pending = False
+        tree.configure(yscrollcommand=self.on_scroll)
+        tree.bind("<<TreeviewOpen>>", self.on_open)
+        self.insert_page()
+
+    def insert_page(self):
+        self._pending = False
+        stop = min(self.inserted + self.PAGE, len(self.items))
+        for item in self.items[self.inserted:stop]:
+            iid = self.tree.insert("", tk.END, values=self.values(item))
+            if self.children is not None and self.children(item):
+                self.tree.insert(iid, tk.END, values=("Loading...",))
+                self._unopened[iid] = item
+        self.inserted = stop
+
+    def on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if (float(last) >= self.NEAR_END and self.inserted < len(self.items)
+                and not self._pending and self.tree.winfo_viewable()):
+            # Not from inside the Treeview's own scroll callback. Unmapped
+            # (in a hidden tab) it reports every row as visible; wait for real sizes.
+            self._pending = True
+            self.tree.after_idle(self.insert_page)
+
+    def on_open(self, event):
+        iid = self.tree.focus()
+        item = self._unopened.pop(iid, None)
+        if item is None:
+            return
+        self.tree.delete(*self.tree.get_children(iid))
+        for child in self.children(item):
+            self.tree.insert(iid, tk.END, values=self.child_values(child))
+
+
+class TimelineView:
+    """Gantt chart of every project and sub-process, one row each.
+
+    Only rows and dates inside the viewport are drawn. Rows thinner than
+    MIN_STRIP_PX are drawn as merged strips from the TimelineLayout, and bars
+    closer than a pixel apart are merged, so the number of canvas items stays
+    bounded by the window size rather than the portfolio size.
+    """
+
+    HEADER_PX = 22
+    LABEL_WIDTH = 180
+    MIN_STRIP_PX = 4
+    MIN_LABEL_PX = 12
+    MIN_BAR_PX = 2
+    WHEEL_STEP = 3
+
+    def __init__(self, parent, store, schedule_index):
+        self.store = store
+        self.schedule = schedule_index
+        self.layout = TimelineLayout(store, schedule_index)
+        self.row_height = 18.0   # Pixels per row; below MIN_STRIP_PX rows are merged
+        self.first_row = 0.0     # Row at the top of the chart
+        self.day_width = 4.0     # Pixels per day
+        self.first_day = date.today().toordinal() - 30  # Day at the left edge
+        self._redraw_pending = False
+        self._fit_pending = False
+        self._drag = None
+
+        self.top = tk.Toplevel(parent)
+        self.top.title("Timeline")
+        self.top.configure(bg=COLORS['background'])
+        self.top.geometry("1000x600")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.top, padding="5 5 5 5")
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="Zoom In", command=lambda: self.zoom_time(2.0)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Zoom Out", command=lambda: self.zoom_time(0.5)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Taller Rows", command=lambda: self.zoom_rows(2.0)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Shorter Rows", command=lambda: self.zoom_rows(0.5)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Fit", command=self.fit).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Today", command=self.go_to_today).pack(side=tk.LEFT, padx=2)
+
+        frame = ttk.Frame(self.top)
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+        self.canvas = tk.Canvas(frame, bg='white', highlightthickness=0)
+        self.canvas.grid(row=0, column=0, sticky=tk.NSEW)
+        self.vscroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.on_vscroll)
+        self.vscroll.grid(row=0, column=1, sticky=tk.NS)
+        self.hscroll = ttk.Scrollbar(frame, orient=tk.HORIZONTAL, command=self.on_hscroll)
+        self.hscroll.grid(row=1, column=0, sticky=tk.EW)
+
+        self.canvas.bind("<Configure>", lambda e: self.schedule_redraw())
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Button-4>", self.on_mousewheel)
+        self.canvas.bind("<Button-5>", self.on_mousewheel)
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+
+        store.subscribe(self.on_store_changed)
+        self.fit()
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+        self.layout.close()
+        self.top.destroy()
+
+    def on_store_changed(self, event, details):
+        self.schedule_redraw()
+
+    # ---------------- Geometry ----------------
+    def chart_size(self):
+        width = max(1, self.canvas.winfo_width() - self.LABEL_WIDTH)
+        height = max(1, self.canvas.winfo_height() - self.HEADER_PX)
+        return width, height
+
+    def visible_days(self):
+        return self.chart_size()[0] / self.day_width
+
+    def visible_rows(self):
+        return self.chart_size()[1] / self.row_height
+
+    def level(self):
+        """Rows are drawn in strips of 2**level rows, at least MIN_STRIP_PX tall."""
+        level = 0
+        while self.row_height * (1 << level) < self.MIN_STRIP_PX:
+            level += 1
+        return level
+
+    def day_extent(self):
+        span = self.schedule.span()
+        if span is None:
+            today = date.today().toordinal()
+            return today - 30, today + 60
+        return span[0] - 7, span[1] + 7
+
+    def day_x(self, day):
+        return self.LABEL_WIDTH + (day - self.first_day) * self.day_width
+
+    # ---------------- Navigation ----------------
+    def clamp(self):
+        lo, hi = self.day_extent()
+        self.first_day = max(lo, min(self.first_day, hi - self.visible_days()))
+        self.first_row = max(0.0, min(self.first_row, len(self.layout) - self.visible_rows()))
+
+    def fit(self):
+        # Applied by the next redraw, once the canvas knows its size
+        self._fit_pending = True
+        self.schedule_redraw()
+
+    def apply_fit(self):
+        width, height = self.chart_size()
+        lo, hi = self.day_extent()
+        self.first_day = lo
+        self.day_width = width / max(1, hi - lo)
+        self.first_row = 0.0
+        self.row_height = min(18.0, height / max(1, len(self.layout)))
+
+    def go_to_today(self):
+        self.first_day = date.today().toordinal() - self.visible_days() / 2
+        self.schedule_redraw()
+
+    def zoom_time(self, factor, x=None):
+        width = self.chart_size()[0]
+        x = width / 2 if x is None else x - self.LABEL_WIDTH
+        anchor = self.first_day + x / self.day_width
+        self.day_width = max(1e-3, min(self.day_width * factor, 200.0))
+        self.first_day = anchor - x / self.day_width
+        self.schedule_redraw()
+
+    def zoom_rows(self, factor):
+        middle = self.first_row + self.visible_rows() / 2
+        fit_all = self.chart_size()[1] / max(1, len(self.layout))
+        self.row_height = max(min(fit_all, 18.0), min(self.row_height * factor, 40.0))
+        self.first_row = middle - self.visible_rows() / 2
+        self.schedule_redraw()
+
+    def on_vscroll(self, action, amount, unit=None):
+        rows = len(self.layout)
+        if action == "moveto":
+            self.first_row = float(amount) * rows
+        elif action == "scroll":
+            step = self.visible_rows() if unit == "pages" else (1 << self.level())
+            self.first_row += int(amount) * step
+        self.schedule_redraw()
+
+    def on_hscroll(self, action, amount, unit=None):
+        lo, hi = self.day_extent()
+        if action == "moveto":
+            self.first_day = lo + float(amount) * (hi - lo)
+        elif action == "scroll":
+            step = self.visible_days() * (0.9 if unit == "pages" else 0.1)
+            self.first_day += int(amount) * step
+        self.schedule_redraw()
+
+    def on_mousewheel(self, event):
+        up = event.num == 4 or event.delta > 0
+        if event.state & 0x4:  # Control: zoom the time axis around the pointer
+            self.zoom_time(1.25 if up else 0.8, event.x)
+        elif event.state & 0x1:  # Shift: scroll through time
+            self.first_day += self.visible_days() * (-0.1 if up else 0.1)
+        else:
+            step = self.WHEEL_STEP * (1 << self.level())
+            self.first_row += -step if up else step
+        self.schedule_redraw()
+        return "break"
+
+    def on_press(self, event):
+        self._drag = (event.x, event.y, self.first_day, self.first_row)
+
+    def on_drag(self, event):
+        if self._drag is None:
+            return
+        x, y, first_day, first_row = self._drag
+        self.first_day = first_day - (event.x - x) / self.day_width
+        self.first_row = first_row - (event.y - y) / self.row_height
+        self.schedule_redraw()
+
+    # ---------------- Drawing ----------------
+    def schedule_redraw(self):
+        # Coalesce bursts of scroll events and store notifications into one redraw
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.top.after_idle(self.redraw)
+
+    @timed("Draw Timeline")
+    def redraw(self):
+        self._redraw_pending = False
+        if self._fit_pending and self.canvas.winfo_width() > 1:
+            self._fit_pending = False
+            self.apply_fit()
+        self.clamp()
+        canvas = self.canvas
+        canvas.delete("all")
+        width, height = self.chart_size()
+        right = self.LABEL_WIDTH + width
+        bottom = self.HEADER_PX + height
+        start = max(1, int(self.first_day))
+        end = int(self.first_day + width / self.day_width) + 1
+
+        ticks = self.ticks(start, end, right)
+        for x, _ in ticks:
+            canvas.create_line(x, self.HEADER_PX, x, bottom, fill='#D5DBE1')
+
+        level = self.level()
+        strip_rows = 1 << level
+        strip_px = self.row_height * strip_rows
+        first_strip = int(self.first_row) >> level
+        last_strip = int(self.first_row + height / self.row_height) >> level
+        colors = COLORS['status_colors']
+
+        for strip, pieces in self.layout.visible(level, first_strip, last_strip, start, end):
+            y0 = self.HEADER_PX + (strip * strip_rows - self.first_row) * self.row_height
+            y1 = y0 + max(1.0, strip_px - 2)
+            bar_x0 = bar_x1 = bar_status = None
+            for s, e, status, count in pieces:
+                x0 = max(self.LABEL_WIDTH, self.day_x(s))
+                x1 = min(right, max(self.day_x(e + 1), x0 + self.MIN_BAR_PX))
+                if bar_x0 is not None and x0 <= bar_x1 + 1:
+                    # Closer than a pixel to the previous bar: draw them as one
+                    bar_x1 = max(bar_x1, x1)
+                    if status != bar_status:
+                        bar_status = None
+                    continue
+                if bar_x0 is not None:
+                    canvas.create_rectangle(bar_x0, y0, bar_x1, y1, width=0,
+                                            fill=colors.get(bar_status, COLORS['secondary']))
+                bar_x0, bar_x1, bar_status = x0, x1, status
+            if bar_x0 is not None:
+                canvas.create_rectangle(bar_x0, y0, bar_x1, y1, width=0,
+                                        fill=colors.get(bar_status, COLORS['secondary']))
+
+        today = self.day_x(date.today().toordinal())
+        if self.LABEL_WIDTH <= today <= right:
+            canvas.create_line(today, self.HEADER_PX, today, bottom, fill='#E74C3C', dash=(4, 2))
+
+        # Header and labels go on top of any bar that reaches under them
+        canvas.create_rectangle(0, 0, self.LABEL_WIDTH, bottom, fill=COLORS['background'], width=0)
+        canvas.create_rectangle(0, 0, right, self.HEADER_PX, fill=COLORS['background'], width=0)
+        for x, text in ticks:
+            canvas.create_text(x + 3, 4, text=text, anchor=tk.NW, fill=COLORS['text'], font=('Segoe UI', 8))
+        if level == 0 and self.row_height >= self.MIN_LABEL_PX:
+            self.draw_labels(height)
+        self.update_scrollbars()
+
+    def ticks(self, start, end, right):
+        """[(x, text)] for every week, month or year, whichever leaves room for the text."""
+        if self.day_width * 7 >= 60:
+            days = (d for d in range(start, end + 1) if date.fromordinal(d).weekday() == 0)
+            fmt = "%m-%d"
+        elif self.day_width * 30 >= 60:
+            days = (d for d in range(start, end + 1) if date.fromordinal(d).day == 1)
+            fmt = "%Y-%m"
+        else:
+            first_year = date.fromordinal(start).year
+            last_year = date.fromordinal(min(end, date.max.toordinal())).year
+            step = int(60 / (self.day_width * 365)) + 1
+            days = (date(y, 1, 1).toordinal() for y in range(first_year, last_year + 1, step))
+            fmt = "%Y"
+        ticks = []
+        for day in days:
+            x = self.day_x(day)
+            if self.LABEL_WIDTH <= x <= right:
+                ticks.append((x, date.fromordinal(day).strftime(fmt)))
+        return ticks
+
+    def draw_labels(self, height):
+        rows = self.layout.rows
+        first = int(self.first_row)
+        last = min(len(rows), first + int(height / self.row_height) + 2)
+        for row in range(first, last):
+            project, sp = rows[row]
+            y = self.HEADER_PX + (row - self.first_row + 0.5) * self.row_height
+            if y < self.HEADER_PX:
+                continue
+            if sp is None:
+                self.canvas.create_text(4, y, text=project["name"], anchor=tk.W,
+                                        fill=COLORS['primary'], font=('Segoe UI', 9, 'bold'))
+            else:
+                self.canvas.create_text(16, y, text=sp["name"], anchor=tk.W,
+                                        fill=COLORS['text'], font=('Segoe UI', 9))
+
+    def update_scrollbars(self):
+        rows = len(self.layout)
+        if rows <= self.visible_rows():
+            self.vscroll.set(0, 1)
+        else:
+            self.vscroll.set(self.first_row / rows, (self.first_row + self.visible_rows()) / rows)
+        lo, hi = self.day_extent()
+        total = hi - lo
+        self.hscroll.set(max(0.0, (self.first_day - lo) / total),
+                         min(1.0, (self.first_day + self.visible_days() - lo) / total))
+
+
+class WorkloadView:
+    """Per-person workload from sub-process bookings, most overbooked first.
+
+    Recomputed shortly after the portfolio changes; bursts of edits are
+    coalesced into one recomputation.
+    """
+
+    REFRESH_MS = 300
+
+    def __init__(self, parent, store):
+        self.store = store
+        self.engine = WorkloadEngine(store)
+        self._refresh_pending = False
+
+        self.top = tk.Toplevel(parent)
+        self.top.title("Workload")
+        self.top.configure(bg=COLORS['background'])
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = ttk.Frame(self.top, padding="10 10 10 10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = ttk.Frame(frame)
+        controls.pack(fill=tk.X)
+        ttk.Label(controls, text="Capacity (concurrent sub-processes):").pack(side=tk.LEFT)
+        self.capacity_var = tk.IntVar(value=1)
+        ttk.Spinbox(controls, from_=1, to=50, width=5, textvariable=self.capacity_var,
+                    command=self.refresh).pack(side=tk.LEFT, padx=5)
+        self.summary_label = ttk.Label(controls, text="")
+        self.summary_label.pack(side=tk.LEFT, padx=10)
+
+        columns = ("Person", "Peak", "Utilization", "Over-Allocated Days", "Over-Allocation Windows")
+        self.tree = ttk.Treeview(frame, columns=columns, show='headings', height=20)
+        for col, width in zip(columns, (150, 60, 90, 130, 320)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, pady=(10, 0))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=(10, 0))
+
+        store.subscribe(self.on_store_changed)
+        self.refresh()
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+        self.engine.close()
+        self.top.destroy()
+
+    def on_store_changed(self, event, details):
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.top.after(self.REFRESH_MS, self.refresh)
+
+    @timed("Compute Workload")
+    def refresh(self):
+        self._refresh_pending = False
+        try:
+            capacity = max(1, int(self.capacity_var.get()))
+        except (tk.TclError, ValueError):
+            capacity = 1
+        report = self.engine.report(capacity=capacity)
+        if report.days:
+            horizon = (f"{date.fromordinal(report.first_day)} to "
+                       f"{date.fromordinal(report.first_day + report.days - 1)}")
+        else:
+            horizon = "no dated sub-processes"
+        overbooked = sum(1 for d in report.over_days if d)
+        self.summary_label.config(text=f"{overbooked} of {len(report.people)} people over capacity, {horizon}")
+
+        self.tree.delete(*self.tree.get_children())
+        for person, peak, utilization, over_days, windows in report.rows():
+            shown = ", ".join(f"{date.fromordinal(s)} to {date.fromordinal(e)} ({load})"
+                              for s, e, load in windows[:3])
+            if len(windows) > 3:
+                shown += f", +{len(windows) - 3} more"
+            self.tree.insert("", tk.END, values=(person, peak, f"{utilization:.0%}", over_days, shown))
+
+
+class PerformanceView:
+    """Recent slow operations, and a switch for profiling what comes next."""
+
+    POLL_MS = 1000
+
+    def __init__(self, parent, trace, folder):
+        self.trace = trace
+        self.folder = folder
+        self._seen = None
+
+        self.top = tk.Toplevel(parent)
+        self.top.title("Performance")
+        self.top.configure(bg=COLORS['background'])
+
+        frame = ttk.Frame(self.top, padding="10 10 10 10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = ttk.Frame(frame)
+        controls.pack(fill=tk.X)
+        ttk.Label(controls, text="Slower than (ms):").pack(side=tk.LEFT)
+        self.threshold_var = tk.IntVar(value=SLOW_MS)
+        ttk.Spinbox(controls, from_=0, to=60000, increment=50, width=7, textvariable=self.threshold_var,
+                    command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+        self.profile_button = ttk.Button(controls, command=self.toggle_profile)
+        self.profile_button.pack(side=tk.RIGHT)
+        self.update_profile_button()
+
+        columns = ("Time", "Operation", "ms", "Details")
+        self.tree = ttk.Treeview(frame, columns=columns, show='headings', height=18)
+        for col, width in zip(columns, (80, 200, 80, 260)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor=tk.E if col == "ms" else tk.W)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, pady=(10, 0))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=(10, 0))
+
+        self.poll()
+
+    def poll(self):
+        # Spans may finish on worker threads, so look for new ones from here
+        if self.trace.count != self._seen:
+            self.refresh()
+        self.top.after(self.POLL_MS, self.poll)
+
+    def refresh(self):
+        self._seen = self.trace.count
+        try:
+            threshold = max(0, int(self.threshold_var.get()))
+        except (tk.TclError, ValueError):
+            threshold = SLOW_MS
+        self.tree.delete(*self.tree.get_children())
+        for record in self.trace.slow(threshold):
+            details = ", ".join(f"{k}={v}" for k, v in record.items()
+                                if k not in ("name", "start", "ms", "depth"))
+            self.tree.insert("", tk.END, values=(
+                datetime.fromtimestamp(record["start"]).strftime("%H:%M:%S"),
+                "  " * record["depth"] + record["name"], f"{record['ms']:.1f}", details))
+
+    def clear(self):
+        self.trace.clear()
+        self.refresh()
+
+    def update_profile_button(self):
+        self.profile_button.config(text="Stop Profiling" if self.trace.profiling else "Start Profiling")
+
+    def toggle_profile(self):
+        if not self.trace.profiling:
+            self.trace.start_profile()
+            self.update_profile_button()
+            return
+        filename = os.path.join(self.folder, datetime.now().strftime("profile-%Y%m%d-%H%M%S.prof"))
+        try:
+            text = self.trace.stop_profile(filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save profile: {e}", parent=self.top)
+            return
+        finally:
+            self.update_profile_button()
+        window = tk.Toplevel(self.top)
+        window.title(f"Profile: {filename}")
+        text_widget = tk.Text(window, wrap=tk.NONE, width=120, height=40, font=('Courier', 9))
+        text_widget.insert("1.0", text)
+        text_widget.config(state=tk.DISABLED)
+        text_widget.pack(fill=tk.BOTH, expand=True)
 
 
 class ProjectDialog:
@@ -591,20 +1992,26 @@ class ProjectDialog:
         if status not in STATUS_OPTIONS:
             messagebox.showerror("Error", "Invalid status.", parent=self.top)
             return
+        try:
+            start_date = normalize_date(start_date)
+            end_date = normalize_date(end_date)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.top)
+            return
 
         self.result = (name, status, start_date, end_date)
         self.top.destroy()
 
 
 class ManagePersonnelDialog:
-    def __init__(self, parent, personnel_set):
+    def __init__(self, parent, store):
         self.top = tk.Toplevel(parent)
         self.top.title("Global Personnel")
         self.top.configure(bg=COLORS['background'])
         self.top.transient(parent)
         self.top.grab_set()
 
-        self.personnel_set = personnel_set
+        self.store = store
 
         frame = ttk.Frame(self.top, padding="10 10 10 10")
         frame.pack(fill=tk.BOTH, expand=True)
@@ -624,12 +2031,15 @@ class ManagePersonnelDialog:
         remove_button = ttk.Button(frame, text="Remove", command=self.remove_personnel)
         remove_button.grid(row=2, column=2, sticky=tk.EW, padx=5, pady=5)
 
+        assignments_button = ttk.Button(frame, text="Assignments", command=self.show_assignments)
+        assignments_button.grid(row=3, column=0, sticky=tk.EW, padx=5, pady=5)
+
         close_button = ttk.Button(frame, text="Close", command=self.top.destroy)
         close_button.grid(row=3, column=1, sticky=tk.EW, padx=5, pady=5)
 
     def update_personnel_list(self):
         self.personnel_listbox.delete(0, tk.END)
-        for p in sorted(self.personnel_set):
+        for p in sorted(self.store.personnel):
             self.personnel_listbox.insert(tk.END, p)
 
     def get_selected_personnel(self):
@@ -643,11 +2053,12 @@ class ManagePersonnelDialog:
         name = simpledialog.askstring("Personnel Name", "Enter personnel name:", parent=self.top)
         if not name:
             return
-        if name in self.personnel_set:
+        if name in self.store.personnel:
             messagebox.showerror("Error", "A person with this name already exists.", parent=self.top)
             return
-        self.personnel_set.add(name)
-        self.update_personnel_list()
+        with span("Add Person"):
+            self.store.add_person(name)
+            self.update_personnel_list()
 
     def edit_personnel(self):
         old_name = self.get_selected_personnel()
@@ -656,55 +2067,62 @@ class ManagePersonnelDialog:
         new_name = simpledialog.askstring("Edit Personnel Name", f"Current: {old_name}\nEnter new name:", parent=self.top, initialvalue=old_name)
         if not new_name:
             return
-        if new_name != old_name and new_name in self.personnel_set:
+        if new_name != old_name and new_name in self.store.personnel:
             messagebox.showerror("Error", "A person with this name already exists.", parent=self.top)
             return
         if new_name == old_name:
             return
 
-        self.personnel_set.remove(old_name)
-        self.personnel_set.add(new_name)
-        # Rename globally
-        app = self.get_app()
-        for project in app.projects:
-            project["personnel"] = [(new_name if p == old_name else p, r) for (p, r) in project["personnel"]]
-            for sp in project["subprocesses"]:
-                sp["personnel"] = [(new_name if p == old_name else p, r) for (p, r) in sp["personnel"]]
-
-        for cproject in app.completed_projects:
-            cproject["personnel"] = [(new_name if p == old_name else p, r) for (p, r) in cproject["personnel"]]
-            for sp in cproject["subprocesses"]:
-                sp["personnel"] = [(new_name if p == old_name else p, r) for (p, r) in sp["personnel"]]
-
-        self.update_personnel_list()
+        # Renames the person in every assignment as well
+        with span("Rename Person"):
+            self.store.rename_person(old_name, new_name)
+            self.update_personnel_list()
 
     def remove_personnel(self):
         name = self.get_selected_personnel()
         if name is None:
             return
         if messagebox.askyesno("Confirm", f"Are you sure you want to delete {name}? They will be removed from all assignments.", parent=self.top):
-            self.personnel_set.remove(name)
-            app = self.get_app()
-            app.cleanup_deleted_personnel()
-            self.update_personnel_list()
+            with span("Remove Person"):
+                self.store.remove_person(name)
+                self.update_personnel_list()
+
+    @timed("Build Assignments Window")
+    def show_assignments(self):
+        name = self.get_selected_personnel()
+        if name is None:
+            return
+        window = tk.Toplevel(self.top)
+        window.title(f"Assignments: {name}")
+        window.configure(bg=COLORS['background'])
+        window.transient(self.top)
+
+        frame = ttk.Frame(window, padding="10 10 10 10")
+        frame.pack(fill=tk.BOTH, expand=True)
 
-    def get_app(self):
-        app = self.top.master.nametowidget(self.top.master.winfo_parent())
-        while not isinstance(app, ProjectManagerApp):
-            app = app.master
-        return app
+        columns = ("Project", "Sub-Process", "Role")
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=150)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # Straight from the store's reverse index; no portfolio scan
+        for project, sp, role in self.store.assignments_of(name):
+            tree.insert("", tk.END, values=(project["name"], sp["name"] if sp is not None else "", role))
 
 
 class ManageAssignmentsDialog:
-    def __init__(self, parent, assignments, global_personnel, title="Manage Assignments"):
+    def __init__(self, parent, store, project, subprocess=None, title="Manage Assignments"):
         self.top = tk.Toplevel(parent)
         self.top.title(title)
         self.top.configure(bg=COLORS['background'])
         self.top.transient(parent)
         self.top.grab_set()
 
-        self.assignments = assignments
-        self.global_personnel = global_personnel
+        self.store = store
+        self.project = project
+        self.subprocess = subprocess
 
         frame = ttk.Frame(self.top, padding="10 10 10 10")
         frame.pack(fill=tk.BOTH, expand=True)
@@ -727,6 +2145,11 @@ class ManageAssignmentsDialog:
         close_button = ttk.Button(frame, text="Close", command=self.top.destroy)
         close_button.grid(row=3, column=1, sticky=tk.EW, padx=5, pady=5)
 
+    @property
+    def assignments(self):
+        owner = self.subprocess if self.subprocess is not None else self.project
+        return owner["personnel"]
+
     def update_list(self):
         self.listbox.delete(0, tk.END)
         for (p, r) in self.assignments:
@@ -740,44 +2163,47 @@ class ManageAssignmentsDialog:
         return sel[0]
 
     def add_assignment(self):
-        if not self.global_personnel:
+        if not self.store.personnel:
             messagebox.showerror("Error", "No global personnel available. Add global personnel first.", parent=self.top)
             return
-        dialog = AssignmentDialog(self.top, self.global_personnel)
+        dialog = AssignmentDialog(self.top, self.store.personnel)
         self.top.wait_window(dialog.top)
         if dialog.result is not None:
             pname, role = dialog.result
-            self.assignments.append((pname, role))
-            self.update_list()
+            with span("Add Assignment"):
+                self.store.add_assignment(self.project, pname, role, subprocess=self.subprocess)
+                self.update_list()
 
     def edit_assignment(self):
         idx = self.get_selected_index()
         if idx is None:
             return
         (pname, role) = self.assignments[idx]
-        if not self.global_personnel:
+        if not self.store.personnel:
             messagebox.showerror("Error", "No global personnel available.", parent=self.top)
             return
-        dialog = AssignmentDialog(self.top, self.global_personnel, initial_person=pname, initial_role=role)
+        dialog = AssignmentDialog(self.top, self.store.personnel, initial_person=pname, initial_role=role)
         self.top.wait_window(dialog.top)
         if dialog.result is not None:
             new_pname, new_role = dialog.result
-            self.assignments[idx] = (new_pname, new_role)
-            self.update_list()
+            with span("Edit Assignment"):
+                self.store.update_assignment(self.project, idx, new_pname, new_role, subprocess=self.subprocess)
+                self.update_list()
 
     def remove_assignment(self):
         idx = self.get_selected_index()
         if idx is None:
             return
-        self.assignments.pop(idx)
-        self.update_list()
+        with span("Remove Assignment"):
+            self.store.remove_assignment(self.project, idx, subprocess=self.subprocess)
+            self.update_list()
 
 
 class AssignmentDialog:
-    def __init__(self, parent, global_personnel, initial_person=None, initial_role=""):
+    def __init__(self, parent, global_personnel, initial_person=None, initial_role="", with_role=True):
         self.result = None
         self.top = tk.Toplevel(parent)
-        self.top.title("Assign Personnel")
+        self.top.title("Assign Personnel" if with_role else "Unassign Personnel")
         self.top.configure(bg=COLORS['background'])
         self.top.transient(parent)
         self.top.grab_set()
@@ -794,10 +2220,11 @@ class AssignmentDialog:
         if initial_person:
             self.person_combobox.set(initial_person)
 
-        ttk.Label(frame, text="Role:").grid(row=1, column=0, padx=10, pady=5, sticky=tk.W)
         self.role_entry = ttk.Entry(frame)
-        self.role_entry.grid(row=1, column=1, padx=10, pady=5)
         self.role_entry.insert(0, initial_role)
+        if with_role:
+            ttk.Label(frame, text="Role:").grid(row=1, column=0, padx=10, pady=5, sticky=tk.W)
+            self.role_entry.grid(row=1, column=1, padx=10, pady=5)
 
         button_frame = ttk.Frame(frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=10)
@@ -815,16 +2242,82 @@ class AssignmentDialog:
         self.top.destroy()
 
 
+class StatusDialog:
+    def __init__(self, parent, title):
+        self.result = None
+        self.top = tk.Toplevel(parent)
+        self.top.title(title)
+        self.top.configure(bg=COLORS['background'])
+        self.top.transient(parent)
+        self.top.grab_set()
+
+        frame = ttk.Frame(self.top, padding="10 10 10 10")
+        frame.grid(row=0, column=0, sticky=tk.NSEW)
+
+        ttk.Label(frame, text="Status:").grid(row=0, column=0, padx=10, pady=5, sticky=tk.W)
+        self.status_var = tk.StringVar(value=STATUS_OPTIONS[0])
+        ttk.Combobox(frame, textvariable=self.status_var, values=STATUS_OPTIONS,
+                     state='readonly').grid(row=0, column=1, padx=10, pady=5)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=1, column=0, columnspan=2, pady=10)
+
+        ttk.Button(button_frame, text="OK", command=self.on_ok).grid(row=0, column=0, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.top.destroy).grid(row=0, column=1, padx=5)
+
+    def on_ok(self):
+        self.result = self.status_var.get()
+        self.top.destroy()
+
+
+class MergeDialog:
+    POLICIES = (
+        ("merge", "Merge them: keep this portfolio's details, add missing sub-processes and personnel"),
+        ("replace", "Replace the existing project with the one from the file"),
+        ("keep", "Keep the existing project and skip the one from the file"),
+        ("rename", "Add the project from the file under a new name, e.g. \"Name (2)\""),
+    )
+
+    def __init__(self, parent, file_count):
+        self.result = None
+        self.top = tk.Toplevel(parent)
+        self.top.title("Merge CSV Files")
+        self.top.configure(bg=COLORS['background'])
+        self.top.transient(parent)
+        self.top.grab_set()
+
+        frame = ttk.Frame(self.top, padding="10 10 10 10")
+        frame.grid(row=0, column=0, sticky=tk.NSEW)
+
+        ttk.Label(frame, text=f"Merge {file_count} file{'s' if file_count != 1 else ''} into the current portfolio.\n"
+                              "When a project with the same name already exists:").grid(
+            row=0, column=0, padx=10, pady=5, sticky=tk.W)
+        self.policy_var = tk.StringVar(value="merge")
+        for row, (policy, text) in enumerate(self.POLICIES, 1):
+            ttk.Radiobutton(frame, text=text, value=policy, variable=self.policy_var).grid(
+                row=row, column=0, padx=20, pady=2, sticky=tk.W)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=len(self.POLICIES) + 1, column=0, pady=10)
+        ttk.Button(button_frame, text="OK", command=self.on_ok).grid(row=0, column=0, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.top.destroy).grid(row=0, column=1, padx=5)
+
+    def on_ok(self):
+        self.result = self.policy_var.get()
+        self.top.destroy()
+
+
 class ManageSubProcessesDialog:
-    def __init__(self, parent, subprocesses, global_personnel):
+    def __init__(self, parent, store, project):
         self.top = tk.Toplevel(parent)
         self.top.title("Manage Sub-Processes")
         self.top.configure(bg=COLORS['background'])
         self.top.transient(parent)
         self.top.grab_set()
 
-        self.subprocesses = subprocesses
-        self.global_personnel = global_personnel
+        self.store = store
+        self.project = project
+        self.subprocesses = project["subprocesses"]
 
         frame = ttk.Frame(self.top, padding="10 10 10 10")
         frame.pack(fill=tk.BOTH, expand=True)
@@ -868,15 +2361,9 @@ class ManageSubProcessesDialog:
         self.top.wait_window(dialog.top)
         if dialog.result is not None:
             sp_name, sp_status, sp_start, sp_end = dialog.result
-            subprocess = {
-                "name": sp_name,
-                "status": sp_status,
-                "start_date": sp_start,
-                "end_date": sp_end,
-                "personnel": []
-            }
-            self.subprocesses.append(subprocess)
-            self.update_sp_list()
+            with span("Add Sub-Process"):
+                self.store.add_subprocess(self.project, sp_name, sp_status, sp_start, sp_end)
+                self.update_sp_list()
 
     def edit_sp(self):
         idx = self.get_selected_sp_index()
@@ -891,11 +2378,10 @@ class ManageSubProcessesDialog:
         self.top.wait_window(dialog.top)
         if dialog.result is not None:
             sp_name, sp_status, sp_start, sp_end = dialog.result
-            sp["name"] = sp_name
-            sp["status"] = sp_status
-            sp["start_date"] = sp_start
-            sp["end_date"] = sp_end
-            self.update_sp_list()
+            with span("Edit Sub-Process"):
+                self.store.update_subprocess(self.project, sp, name=sp_name, status=sp_status,
+                                             start_date=sp_start, end_date=sp_end)
+                self.update_sp_list()
 
     def remove_sp(self):
         idx = self.get_selected_sp_index()
@@ -903,17 +2389,17 @@ class ManageSubProcessesDialog:
             return
         sp = self.subprocesses[idx]
         if messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete the sub-process '{sp['name']}'?", parent=self.top):
-            self.subprocesses.pop(idx)
-            self.update_sp_list()
+            with span("Remove Sub-Process"):
+                self.store.remove_subprocess(self.project, sp)
+                self.update_sp_list()
 
     def manage_sp_personnel(self):
         idx = self.get_selected_sp_index()
         if idx is None:
             return
         sp = self.subprocesses[idx]
-        dialog = ManageAssignmentsDialog(self.top, sp["personnel"], self.global_personnel, "Sub-Process Personnel")
+        dialog = ManageAssignmentsDialog(self.top, self.store, self.project, subprocess=sp, title="Sub-Process Personnel")
         self.top.wait_window(dialog.top)
-        sp["personnel"] = dialog.assignments
         self.update_sp_list()
 
 
@@ -968,6 +2454,12 @@ class SubProcessDialog:
         if sp_status not in STATUS_OPTIONS:
             messagebox.showerror("Error", "Invalid status.", parent=self.top)
             return
+        try:
+            sp_start = normalize_date(sp_start)
+            sp_end = normalize_date(sp_end)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.top)
+            return
 
         self.result = (sp_name, sp_status, sp_start, sp_end)
         self.top.destroy()
@@ -977,10 +2469,66 @@ class GlobalPersonnelDialog(ManagePersonnelDialog):
     pass
 
 
+class ProgressDialog:
+    POLL_MS = 50
+
+    def __init__(self, parent, title, task, unit, on_finished):
+        self.task = task
+        self.unit = unit
+        self.on_finished = on_finished
+
+        self.top = tk.Toplevel(parent)
+        self.top.title(title)
+        self.top.configure(bg=COLORS['background'])
+        self.top.transient(parent)
+        self.top.grab_set()
+        self.top.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        frame = ttk.Frame(self.top, padding="10 10 10 10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.status_label = ttk.Label(frame, text="Starting...")
+        self.status_label.grid(row=0, column=0, padx=10, pady=5, sticky=tk.W)
+
+        self.progressbar = ttk.Progressbar(frame, length=300, mode='determinate', maximum=1)
+        self.progressbar.grid(row=1, column=0, padx=10, pady=5, sticky=tk.EW)
+
+        self.cancel_button = ttk.Button(frame, text="Cancel", command=self.cancel)
+        self.cancel_button.grid(row=2, column=0, pady=10)
+
+        self.task.start()
+        self.top.after(self.POLL_MS, self.poll)
+
+    def cancel(self):
+        self.task.cancel()
+        self.cancel_button.config(state='disabled')
+        self.status_label.config(text="Cancelling...")
+
+    def poll(self):
+        for message in self.task.poll():
+            if message[0] == "progress":
+                _, done, total = message
+                self.progressbar.config(maximum=max(total, 1), value=done)
+                self.status_label.config(text=f"{done:,} of {total:,} {self.unit}")
+            else:
+                # done, error or cancelled: the worker has finished
+                self.top.grab_release()
+                self.top.destroy()
+                self.on_finished(message)
+                return
+        self.top.after(self.POLL_MS, self.poll)
+
+
 def main():
     root = tk.Tk()
     root.geometry("1000x600")
-    app = ProjectManagerApp(root)
+    # Pick up where the last session left off, crash or not
+    store = PortfolioStore()
+    journal = Journal()
+    journal.recover(store)
+    # Timings of everything the user does, kept across sessions
+    TRACE.log_to(os.path.join(os.path.dirname(journal.base_path), "perf.log"))
+    app = ProjectManagerApp(root, store, journal)
     root.mainloop()
 
 
@@ -0,0 +1,116 @@
+"""Seeded generator of synthetic portfolios for benchmarks.
+
+The same arguments always give the same portfolio, so timings taken on
+different versions measure the same work:
+
+    python benchmarks/generate.py --projects 20000 -o big.csv
+
+Any format the command line understands can be written (.csv, .pms, .db).
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio import STATUS_OPTIONS, PortfolioStore, new_project, new_subprocess  # noqa: E402
+
+FIRST_NAMES = ("Ann", "Rob", "Maria", "Wei", "Tom", "Priya", "Jan", "Olga", "Sam", "Yuki",
+               "Lena", "Omar", "Eva", "Ravi", "Nina", "Paul", "Zoe", "Ivan", "Mia", "Kofi")
+LAST_NAMES = ("Smith", "Garcia", "Chen", "Novak", "Khan", "Berg", "Ito", "Silva", "Meyer",
+              "Okafor", "Rossi", "Dubois", "Kim", "Larsen", "Patel", "Moreau", "Costa", "Weber")
+ROLES = ("lead", "developer", "analyst", "designer", "tester", "reviewer", "sponsor")
+WORDS = ("Apollo", "Atlas", "Beacon", "Cedar", "Comet", "Delta", "Ember", "Falcon", "Harbor",
+         "Horizon", "Juniper", "Keystone", "Lumen", "Meridian", "Nimbus", "Orbit", "Pioneer",
+         "Quartz", "Summit", "Vertex")
+STEPS = ("Discovery", "Design", "Build", "Testing", "Rollout", "Training", "Review",
+         "Procurement", "Migration", "Handover")
+# Weights for STATUS_OPTIONS: mostly open work, a good share completed
+STATUS_WEIGHTS = (3, 3, 4, 1, 1)
+FIRST_DAY = date(2023, 1, 1).toordinal()
+
+
+def person_names(count, rng):
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if name in seen:
+            name = f"{name} {len(names)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _dates(rng):
+    if rng.random() < 0.1:
+        return "", ""
+    start = FIRST_DAY + rng.randrange(730)
+    end = start + rng.randrange(7, 180)
+    return date.fromordinal(start).isoformat(), date.fromordinal(end).isoformat()
+
+
+def _id(rng):
+    # Seeded like everything else, so the same sizes give the same files
+    return f"{rng.getrandbits(64):016x}"
+
+
+def _assign(record, people, count, rng):
+    for name in rng.sample(people, min(count, len(people))):
+        record["personnel"].append((name, rng.choice(ROLES)))
+
+
+def generate(projects=1000, subprocesses=5, personnel=200, assignments=2, seed=0):
+    """Return (personnel, projects) ready for PortfolioStore.load().
+
+    Every project has the given number of sub-processes, and every project
+    and sub-process the given number of assignments.
+    """
+    rng = random.Random(seed)
+    people = person_names(personnel, rng)
+    records = []
+    for i in range(projects):
+        project = new_project(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                              rng.choices(STATUS_OPTIONS, STATUS_WEIGHTS)[0], *_dates(rng), _id(rng))
+        _assign(project, people, assignments, rng)
+        for j in range(subprocesses):
+            sp = new_subprocess(f"{STEPS[j % len(STEPS)]} {j // len(STEPS) + 1}",
+                                rng.choices(STATUS_OPTIONS, STATUS_WEIGHTS)[0], *_dates(rng), _id(rng))
+            _assign(sp, people, assignments, rng)
+            project["subprocesses"].append(sp)
+        records.append(project)
+    return set(people), records
+
+
+def generate_store(**sizes):
+    store = PortfolioStore()
+    store.load(*generate(**sizes))
+    return store
+
+
+def add_size_options(parser):
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--subprocesses", type=int, default=5, help="per project")
+    parser.add_argument("--personnel", type=int, default=200)
+    parser.add_argument("--assignments", type=int, default=2, help="per project and sub-process")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def sizes_of(args):
+    return {"projects": args.projects, "subprocesses": args.subprocesses,
+            "personnel": args.personnel, "assignments": args.assignments, "seed": args.seed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic portfolio.")
+    add_size_options(parser)
+    parser.add_argument("-o", "--output", required=True, help=".csv, .pms or .db file, or - for CSV")
+    args = parser.parse_args(argv)
+    from portfolio.cli import write_file
+    write_file(generate_store(**sizes_of(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Time the hot paths on a synthetic portfolio and write the results as JSON.
+
+    python benchmarks/run.py --projects 5000 -o before.json
+    ... change something ...
+    python benchmarks/run.py --projects 5000 -o after.json --compare before.json
+
+Each case is prepared afresh (untimed) before every repetition, so cases that
+change the portfolio always start from the same one. Stores have the
+indexes the GUI keeps attached (search, schedule, statistics, undo), since
+those run on every change; --bare leaves them out. The list refresh case
+needs a display and is reported as skipped without one.
+
+With --compare, a case whose median is more than --threshold slower than in
+the baseline file counts as a regression and the exit status is 1.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generate import add_size_options, generate, sizes_of  # noqa: E402
+from portfolio import PortfolioStore, export_csv, import_csv  # noqa: E402
+
+SCHEMA = 1
+RENAMES = 20
+EDITED = 20
+REMOVED_FRACTION = 0.1
+
+
+class Skipped(Exception):
+    pass
+
+
+class Context:
+    def __init__(self, sizes, bare, workdir):
+        self.sizes = sizes
+        self.bare = bare
+        self.workdir = workdir
+        self._csv = None
+        self._autosave = None
+
+    def new_store(self):
+        store = PortfolioStore()
+        if not self.bare:
+            from portfolio.history import History
+            from portfolio.schedule import ScheduleIndex
+            from portfolio.search import SearchIndex
+            from portfolio.stats import PortfolioStats
+            # They subscribe themselves, and the store keeps them alive
+            for index in (SearchIndex, ScheduleIndex, PortfolioStats, History):
+                index(store)
+        return store
+
+    def loaded_store(self):
+        store = self.new_store()
+        store.load(*generate(**self.sizes))
+        return store
+
+    def csv_file(self):
+        if self._csv is None:
+            self._csv = os.path.join(self.workdir, "portfolio.csv")
+            store = PortfolioStore()
+            store.load(*generate(**self.sizes))
+            export_csv(store, self._csv)
+        return self._csv
+
+    def autosave(self):
+        """Base path of an autosave (snapshot and empty journal) of the portfolio."""
+        if self._autosave is None:
+            from portfolio.journal import Journal
+            self._autosave = os.path.join(self.workdir, "autosave")
+            journal = Journal(self._autosave)
+            journal.attach(self.loaded_store())
+            journal.close()
+        return self._autosave
+
+
+# ---------------- Cases ----------------
+# A case takes the Context and returns prepare(), which sets up one
+# repetition and returns (run, items): the callable to time and how many
+# things it handles.
+CASES = {}
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+@case("import_csv")
+def bench_import_csv(ctx):
+    filename = ctx.csv_file()
+
+    def prepare():
+        store = ctx.new_store()
+        return (lambda: import_csv(store, filename)), ctx.sizes["projects"]
+    return prepare
+
+
+@case("export_csv")
+def bench_export_csv(ctx):
+    filename = os.path.join(ctx.workdir, "export.csv")
+
+    def prepare():
+        store = ctx.loaded_store()
+        return (lambda: export_csv(store, filename)), ctx.sizes["projects"]
+    return prepare
+
+
+@case("export_csv_gz")
+def bench_export_csv_gz(ctx):
+    filename = os.path.join(ctx.workdir, "export.csv.gz")
+
+    def prepare():
+        store = ctx.loaded_store()
+        return (lambda: export_csv(store, filename)), ctx.sizes["projects"]
+    return prepare
+
+
+@case("import_csv_gz")
+def bench_import_csv_gz(ctx):
+    filename = os.path.join(ctx.workdir, "portfolio.csv.gz")
+    if not os.path.exists(filename):
+        store = PortfolioStore()
+        store.load(*generate(**ctx.sizes))
+        export_csv(store, filename)
+
+    def prepare():
+        store = ctx.new_store()
+        return (lambda: import_csv(store, filename)), ctx.sizes["projects"]
+    return prepare
+
+
+@case("export_changes")
+def bench_export_changes(ctx):
+    from portfolio.delta import ChangeTracker, export_delta
+    filename = os.path.join(ctx.workdir, "changes.csv")
+
+    def prepare():
+        store = ctx.loaded_store()
+        tracker = ChangeTracker(store)
+        tracker.clear("base")
+        projects = store.projects[:EDITED]
+        for project in projects:
+            store.update_project(project, end_date="2031-12-31")
+        return (lambda: export_delta(store, tracker, filename)), len(projects)
+    return prepare
+
+
+@case("recover_autosave")
+def bench_recover(ctx):
+    from portfolio.journal import Journal
+    base = ctx.autosave()
+
+    def prepare():
+        # Startup: completed projects stay in the snapshot until read
+        return (lambda: Journal(base).recover(ctx.new_store())), ctx.sizes["projects"]
+    return prepare
+
+
+@case("cleanup_deleted_personnel")
+def bench_cleanup(ctx):
+    def prepare():
+        store = ctx.loaded_store()
+        names = sorted(store.personnel)
+        # Gone from the global list but still assigned, as after the
+        # personnel dialog removes them without cleaning up
+        for name in names[:max(1, int(len(names) * REMOVED_FRACTION))]:
+            store.remove_person(name, unassign=False)
+        return store.cleanup_deleted_personnel, len(names)
+    return prepare
+
+
+@case("rename_person")
+def bench_rename(ctx):
+    def prepare():
+        store = ctx.loaded_store()
+        names = sorted(store.personnel)[:RENAMES]
+
+        def run():
+            for name in names:
+                store.rename_person(name, name + " (renamed)")
+        return run, len(names)
+    return prepare
+
+
+@case("sort_projects")
+def bench_sort_projects(ctx):
+    from portfolio.sorting import SortedProjects
+
+    def prepare():
+        store = ctx.loaded_store()
+        return (lambda: SortedProjects(store, "End Date")), len(store)
+    return prepare
+
+
+@case("resort_edits")
+def bench_resort_edits(ctx):
+    from portfolio.sorting import SortedProjects
+
+    def prepare():
+        store = ctx.loaded_store()
+        ordered = SortedProjects(store, "End Date")
+        store.subscribe(ordered.update)
+        projects = store.projects[:EDITED]
+
+        def run():
+            for project in projects:
+                store.update_project(project, end_date="2031-12-31")
+        return run, len(projects)
+    return prepare
+
+
+@case("set_status_selected")
+def bench_set_status_selected(ctx):
+    from portfolio.search import SearchIndex
+
+    def prepare():
+        store = ctx.loaded_store()
+        SearchIndex(store)
+        projects = store.projects[::5]
+
+        def run():
+            store.update_projects(projects, status="Paused", label="Set Status")
+        return run, len(projects)
+    return prepare
+
+
+@case("update_project_list")
+def bench_update_project_list(ctx):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:  # No tkinter, or no display
+        raise Skipped(f"no Tk display: {e}")
+    root.geometry("1000x600")
+    import Project_Manager
+    store = ctx.loaded_store()
+    app = Project_Manager.ProjectManagerApp(root, store)
+    root.update()
+
+    def prepare():
+        def run():
+            app.update_project_list()
+            app.update_completed_list()
+            root.update_idletasks()
+        return run, len(store.projects) + len(store.completed_projects)
+    return prepare
+
+
+# ---------------- Harness ----------------
+def time_case(prepare, repeat):
+    seconds = []
+    items = 0
+    for _ in range(repeat):
+        run, items = prepare()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return {"seconds": seconds, "min": min(seconds), "median": statistics.median(seconds),
+            "items": items}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_all(sizes, repeat=5, bare=False, only=None, log=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = Context(sizes, bare, workdir)
+        for name, make in CASES.items():
+            if only and name not in only:
+                continue
+            try:
+                results[name] = time_case(make(ctx), repeat)
+            except Skipped as e:
+                results[name] = {"skipped": str(e)}
+            if log:
+                log(name, results[name])
+    return {
+        "schema": SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "portfolio": sizes,
+        "listeners": not bare,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print current against baseline; return the names of regressed cases."""
+    regressed = []
+    if current["portfolio"] != baseline.get("portfolio"):
+        print("warning: the baseline used a different portfolio", file=sys.stderr)
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if "median" not in result or not old or "median" not in old:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<28} {old['median'] * 1000:10.2f} ms -> {result['median'] * 1000:10.2f} ms"
+              f"  x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressed
+
+
+def _report(name, result):
+    if "skipped" in result:
+        print(f"{name:<28} skipped ({result['skipped']})", file=sys.stderr)
+    else:
+        print(f"{name:<28} median {result['median'] * 1000:10.2f} ms   min {result['min'] * 1000:10.2f} ms",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the project manager's hot paths.")
+    add_size_options(parser)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bare", action="store_true", help="time the store without the GUI's indexes")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), metavar="CASE",
+                        help=f"cases to run: {', '.join(CASES)}")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="slowdown counted as a regression (default 0.15, i.e. 15%%)")
+    args = parser.parse_args(argv)
+
+    results = run_all(sizes_of(args), args.repeat, args.bare, args.only, log=_report)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
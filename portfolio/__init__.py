@@ -0,0 +1,16 @@
+"""GUI-independent core of the project manager."""
+from .store import STATUS_OPTIONS, PortfolioStore, new_project, new_subprocess
+from .csvio import export_csv, import_csv, read_portfolio
+from .tasks import BackgroundTask, OperationCancelled
+
+__all__ = [
+    "STATUS_OPTIONS",
+    "PortfolioStore",
+    "new_project",
+    "new_subprocess",
+    "export_csv",
+    "import_csv",
+    "read_portfolio",
+    "BackgroundTask",
+    "OperationCancelled",
+]
@@ -0,0 +1,8 @@
+"""python -m portfolio: the command-line interface, see portfolio.cli."""
+import sys
+
+from .cli import main
+
+# Guarded: process pool workers import the main module too
+if __name__ == "__main__":
+    sys.exit(main(prog="python -m portfolio"))
@@ -0,0 +1,209 @@
+"""Completed projects left in the autosave snapshot until they are needed.
+
+The snapshot stores completed projects after the active ones, so at startup
+only the active projects are built; the completed ones stay in the memory
+mapped file as an Archive. An Archive is the store's completed_projects list:
+reading a project builds the page of PAGE_SIZE projects around it, so
+scrolling the Completed tab builds only the pages scrolled past, and
+reverting one project builds only its page. Everything else (search,
+schedule queries, renaming a person) asks for exactly what it needs, through
+load_all(), load_assigning(), load_named() or load_ids().
+
+Each slot holds either a project or the index of its record in the snapshot.
+Inserted, moved and reverted projects are ordinary list operations on the
+slots, so the Archive keeps the store's list semantics throughout.
+"""
+
+PAGE_SIZE = 200
+
+
+def _runs(indexes):
+    """Split sorted snapshot indexes into (start, stop) runs of consecutive ones."""
+    runs = []
+    for i in indexes:
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return runs
+
+
+class Archive:
+    def __init__(self, reader, first):
+        self._reader = reader
+        self._slots = list(range(first, len(reader)))
+        self._unloaded = len(self._slots)
+        self.on_load = None  # Called with each list of newly built projects
+        if not self._unloaded:
+            self.close()
+
+    @property
+    def filename(self):
+        """The snapshot still holding unloaded projects, or None."""
+        return self._reader.filename if self._reader is not None else None
+
+    @property
+    def unloaded(self):
+        return self._unloaded
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def rebase(self, reader, first):
+        """Read unloaded projects from reader from now on, where this list is
+        stored from index first (e.g. a snapshot just written)."""
+        if len(reader) - first != len(self._slots):
+            reader.close()
+            raise ValueError("The snapshot does not hold this archive")
+        self.close()
+        self._reader = reader
+        for k, slot in enumerate(self._slots):
+            if type(slot) is int:
+                self._slots[k] = first + k
+        if not self._unloaded:
+            self.close()
+
+    # ---------------- Loading ----------------
+    def _build(self, indexes):
+        """{snapshot index: project} for sorted indexes."""
+        built = {}
+        for start, stop in _runs(indexes):
+            built.update(zip(range(start, stop), self._reader.projects(start, stop)))
+        return built
+
+    def _load_positions(self, positions):
+        slots = self._slots
+        wanted = sorted((slots[k], k) for k in positions if type(slots[k]) is int)
+        if not wanted:
+            return
+        built = self._build([slot for slot, _ in wanted])
+        for slot, k in wanted:
+            slots[k] = built[slot]
+        self._unloaded -= len(wanted)
+        if not self._unloaded:
+            self.close()
+        if self.on_load is not None:
+            self.on_load([built[slot] for slot, _ in wanted])
+
+    def _load_pages(self, lo, hi):
+        """Load the pages holding positions lo to hi."""
+        lo, hi = max(lo, 0), min(hi, len(self._slots))
+        if self._unloaded and lo < hi:
+            start = lo // PAGE_SIZE * PAGE_SIZE
+            stop = ((hi - 1) // PAGE_SIZE + 1) * PAGE_SIZE
+            self._load_positions(range(start, min(stop, len(self._slots))))
+
+    def load_all(self):
+        if self._unloaded:
+            self._load_positions(range(len(self._slots)))
+
+    def load_assigning(self, names):
+        """Load the projects assigning anyone in names, and nothing else."""
+        if not self._unloaded:
+            return
+        found = set()
+        for start, stop in self.unloaded_runs():
+            found |= self._reader.assigning(names, start, stop)
+        self._load_found(found)
+
+    def load_named(self, names):
+        """Load the projects called any of names, and nothing else."""
+        if not self._unloaded:
+            return
+        found = set()
+        for start, stop in self.unloaded_runs():
+            found |= self._reader.named(names, start, stop)
+        self._load_found(found)
+
+    def load_ids(self, ids):
+        """Load the projects with any of ids as their own or a sub-process's id."""
+        if not self._unloaded or not ids:
+            return
+        found = set()
+        for start, stop in self.unloaded_runs():
+            found |= self._reader.with_ids(ids, start, stop)
+        self._load_found(found)
+
+    def _load_found(self, found):
+        if found:
+            self._load_positions([k for k, slot in enumerate(self._slots)
+                                  if type(slot) is int and slot in found])
+
+    def unloaded_runs(self):
+        """(start, stop) snapshot index ranges of the projects not loaded."""
+        return _runs(sorted(slot for slot in self._slots if type(slot) is int))
+
+    def tally(self):
+        """reader.tally() summed over the projects not loaded."""
+        total = None
+        for start, stop in self.unloaded_runs():
+            counts = self._reader.tally(start, stop)
+            if total is None:
+                total = counts
+            else:
+                for mine, more in zip(total, counts):
+                    mine.update(more)
+        return total
+
+    def assigned_people(self):
+        """Everyone assigned in the projects not loaded."""
+        people = set()
+        for start, stop in self.unloaded_runs():
+            people |= self._reader.assigned_people(start, stop)
+        return people
+
+    def loaded(self):
+        """The projects built so far, in list order."""
+        return [slot for slot in self._slots if type(slot) is not int]
+
+    def scan(self):
+        """Every project in order, building the unloaded ones a page at a time
+        for this pass only: they are neither kept nor reported to on_load."""
+        for lo in range(0, len(self._slots), PAGE_SIZE):
+            page = self._slots[lo:lo + PAGE_SIZE]
+            built = self._build(sorted(slot for slot in page if type(slot) is int))
+            for slot in page:
+                yield built[slot] if type(slot) is int else slot
+
+    # ---------------- List interface ----------------
+    def __len__(self):
+        return len(self._slots)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lo, hi, _ = index.indices(len(self._slots))
+            self._load_pages(lo, hi)
+            return self._slots[index]
+        k = index + len(self._slots) if index < 0 else index
+        self._load_pages(k, k + 1)
+        return self._slots[index]
+
+    def __iter__(self):
+        self.load_all()
+        return iter(self._slots)
+
+    def positions(self, projects):
+        """{id(project): index} for those of projects in the archive, looking
+        only at loaded slots."""
+        wanted = {id(p) for p in projects}
+        return {id(slot): k for k, slot in enumerate(self._slots) if id(slot) in wanted}
+
+    def find(self, project):
+        """Position of project, looking only at loaded slots."""
+        for k, slot in enumerate(self._slots):
+            if slot is project:
+                return k
+        raise ValueError(f"{project.get('name')!r} is not in this portfolio")
+
+    def insert(self, index, project):
+        self._slots.insert(index, project)
+
+    def append(self, project):
+        self._slots.append(project)
+
+    def pop(self, index=-1):
+        project = self[index]
+        del self._slots[index]
+        return project
@@ -0,0 +1,363 @@
+"""Command-line interface: the same import, export and queries as the GUI, without Tk.
+
+    python Project_Manager.py import projects.csv
+    python Project_Manager.py export backup.pms
+    python Project_Manager.py convert projects.csv projects.db
+    python Project_Manager.py merge team-a.csv team-b.csv --policy rename
+    python Project_Manager.py import base.csv --changes monday.csv tuesday.csv
+    python Project_Manager.py query --overdue -p projects.csv
+    python Project_Manager.py report workload --capacity 2
+
+python -m portfolio takes the same commands and starts faster still, since
+Python then never reads the GUI's source.
+
+Files are read and written by extension: .csv or .jsonl exports, which may
+be compressed (.csv.gz, .jsonl.xz, ...), .pms (snapshot) or .db (SQLite).
+"-" is CSV on stdin or stdout. Without -p, commands work on the
+autosaved portfolio the GUI opens at startup.
+
+Modules are imported by the command that needs them, so a run only pays for
+what it uses; nothing here imports tkinter.
+"""
+import argparse
+import csv
+import os
+import sys
+
+from .csvio import PortfolioBuilder, read_portfolio, write_rows
+from .store import MERGE_POLICIES, STATUS_OPTIONS, PortfolioStore
+from .streams import FORMATS as ROW_FORMATS, iter_rows, split_name
+
+# Besides the export formats in streams.FORMATS, all of them "rows"
+FORMATS = {".pms": "snapshot", ".db": "sqlite", ".sqlite": "sqlite"}
+
+
+class CommandError(Exception):
+    pass
+
+
+def file_format(filename):
+    if filename == "-":
+        return "rows"
+    ext, compression = split_name(filename)
+    if ext in ROW_FORMATS:
+        return "rows"
+    fmt = FORMATS.get(ext)
+    if fmt is None or compression is not None:
+        raise CommandError(f"{filename}: unknown file type (use .csv, .jsonl, .pms or .db; "
+                           f"add .gz or .xz to compress .csv and .jsonl)")
+    return fmt
+
+
+def read_file(filename):
+    """(personnel, projects) from a portfolio file of any supported format."""
+    fmt = file_format(filename)
+    if filename == "-":
+        return PortfolioBuilder().feed(iter_rows(sys.stdin)).result()
+    if fmt == "rows":
+        return read_portfolio(filename)
+    if fmt == "snapshot":
+        from .snapshot import read_snapshot
+        return read_snapshot(filename)
+    if not os.path.exists(filename):
+        # Connecting would create an empty database
+        raise CommandError(f"{filename}: no such file")
+    import sqlite3
+    from .sqlite_backend import SQLiteBackend
+    try:
+        backend = SQLiteBackend(filename)
+        try:
+            personnel, projects, archive = backend.load()
+            projects.extend(archive)
+            return personnel, projects
+        finally:
+            backend.close()
+    except sqlite3.Error as e:
+        raise CommandError(f"{filename}: {e}")
+
+
+def write_file(store, filename):
+    fmt = file_format(filename)
+    if filename == "-":
+        # Same bytes as an exported file
+        write_rows(csv.writer(sys.stdout), store)
+    elif fmt == "rows":
+        from .csvio import export_csv
+        export_csv(store, filename)
+    elif fmt == "snapshot":
+        from .snapshot import write_snapshot
+        write_snapshot(store, filename)
+    else:
+        import sqlite3
+        from .sqlite_backend import SQLiteBackend
+        try:
+            backend = SQLiteBackend(filename)
+            try:
+                backend.save_all(store)
+            finally:
+                backend.close()
+        except sqlite3.Error as e:
+            raise CommandError(f"{filename}: {e}")
+
+
+def load_store(filename=None):
+    """A store holding filename, or the autosaved portfolio if it is None."""
+    store = PortfolioStore()
+    if filename is None:
+        from .journal import Journal
+        Journal().recover(store)
+    else:
+        store.load(*read_file(filename))
+    return store
+
+
+# ---------------- Commands ----------------
+def change_autosave(change):
+    """Call change(store) on the autosaved portfolio, journaling what it does."""
+    from .journal import Journal
+    store = PortfolioStore()
+    journal = Journal()
+    journal.recover(store)
+    journal.attach(store)
+    try:
+        return change(store)
+    finally:
+        journal.close()
+
+
+def cmd_import(args):
+    """Replace the autosaved portfolio with the contents of a file."""
+    if args.changes:
+        if args.source == "-" or file_format(args.source) != "rows":
+            raise CommandError("change files go on top of an export (.csv or .jsonl)")
+        from .delta import read_chain
+        portfolio = read_chain(args.source, args.changes)
+    else:
+        portfolio = read_file(args.source)
+
+    def replace(store):
+        # Loading snapshots the new portfolio and starts an empty journal
+        store.load(*portfolio)
+        return _count(store)
+    print(f"Imported {change_autosave(replace)} from {args.source}", file=sys.stderr)
+
+
+def cmd_merge(args):
+    from .merge import describe, merge_into, parse_files
+    for filename in args.sources:
+        if filename == "-" or file_format(filename) != "rows":
+            raise CommandError(f"{filename}: only exports (.csv or .jsonl) can be merged")
+    parsed = parse_files(args.sources, workers=args.workers)
+    if args.portfolio is None:
+        counts = change_autosave(lambda store: merge_into(store, parsed, args.policy))
+    else:
+        store = load_store(args.portfolio)
+        counts = merge_into(store, parsed, args.policy)
+        write_file(store, args.portfolio)
+    print(f"Merged {len(parsed)} file{'s' if len(parsed) != 1 else ''}: {describe(counts)}",
+          file=sys.stderr)
+
+
+def cmd_apply(args):
+    from .delta import DeltaFile, apply_delta, file_id
+    # Check the whole chain before applying any of it; only the first row of
+    # each file is read here
+    for k, filename in enumerate(args.deltas):
+        with DeltaFile(filename) as delta:
+            base = delta.base
+        if k and base and base != file_id(args.deltas[k - 1]):
+            raise CommandError(f"{filename} does not follow {args.deltas[k - 1]}")
+    deltas = args.deltas
+
+    def apply(store):
+        for filename in deltas:
+            with DeltaFile(filename) as delta:
+                apply_delta(store, delta.rows())
+    if args.portfolio is None:
+        change_autosave(apply)
+    else:
+        store = load_store(args.portfolio)
+        apply(store)
+        write_file(store, args.portfolio)
+    print(f"Applied {len(deltas)} change file{'s' if len(deltas) != 1 else ''}", file=sys.stderr)
+
+
+def cmd_export(args):
+    write_file(load_store(args.portfolio), args.target)
+
+
+def cmd_convert(args):
+    store = PortfolioStore()
+    store.load(*read_file(args.source))
+    write_file(store, args.target)
+
+
+def cmd_query(args):
+    store = load_store(args.portfolio)
+    if args.active or args.overdue:
+        from .schedule import ScheduleIndex
+        schedule = ScheduleIndex(store)
+        if args.active:
+            items = schedule.active_between(*args.active)
+        else:
+            items = schedule.overdue(args.today)
+    else:
+        items = [(project, sp) for project in store.iter_projects()
+                 for sp in [None] + ([] if args.projects_only else project["subprocesses"])]
+    if args.search:
+        from .search import SearchIndex
+        matches = SearchIndex(store).search(args.search)
+        if matches is not None:
+            items = [item for item in items if id(item[0]) in matches]
+    if args.projects_only:
+        items = [item for item in items if item[1] is None]
+    if args.status:
+        items = [item for item in items if _record(item)["status"] in args.status]
+    if args.person:
+        items = [item for item in items
+                 if any(p == args.person for p, _ in _record(item)["personnel"])]
+
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(["Project", "Sub-Process", "Status", "Start Date", "End Date", "Personnel"])
+    for project, sp in items:
+        record = _record((project, sp))
+        writer.writerow([project["name"], sp["name"] if sp is not None else "", record["status"],
+                         record["start_date"], record["end_date"],
+                         "; ".join(f"{p} ({r})" if r else p for p, r in record["personnel"])])
+
+
+def cmd_report(args):
+    store = load_store(args.portfolio)
+    if args.kind == "summary":
+        from .stats import PortfolioStats
+        stats = PortfolioStats(store)
+        done, total = stats.overall_completion()
+        people, most = stats.most_assigned()
+        print(f"Projects: {sum(stats.project_status.values())}")
+        for status in STATUS_OPTIONS:
+            print(f"  {status}: {stats.project_status[status]}")
+        print(f"Sub-Processes: {total} ({done} completed)")
+        for status in STATUS_OPTIONS:
+            print(f"  {status}: {stats.subprocess_status[status]}")
+        print(f"Overdue: {stats.overdue_count(args.today)}")
+        print(f"Most assigned: {', '.join(people) or 'nobody'}"
+              + (f" ({most})" if people else ""))
+    else:
+        from datetime import date
+        from .workload import compute_workload
+        report = compute_workload(store, capacity=args.capacity, today=args.today)
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(["Person", "Peak", "Utilization", "Over-Allocated Days", "Over-Allocation Windows"])
+        for person, peak, utilization, over_days, windows in report.rows():
+            writer.writerow([person, peak, f"{utilization:.0%}", over_days,
+                             "; ".join(f"{date.fromordinal(s)} to {date.fromordinal(e)} ({load})"
+                                       for s, e, load in windows)])
+
+
+def _record(item):
+    project, sp = item
+    return sp if sp is not None else project
+
+
+def _count(store):
+    projects = len(store.projects) + len(store.completed_projects)
+    return f"{projects} project{'s' if projects != 1 else ''}"
+
+
+# ---------------- Entry point ----------------
+def _date_arg(text):
+    from .dates import parse_date
+    try:
+        return parse_date(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Manage a project portfolio from the command line.")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    def portfolio_option(command):
+        command.add_argument("-p", "--portfolio", metavar="FILE",
+                             help="work on FILE instead of the autosaved portfolio")
+
+    command = commands.add_parser("import", help="replace the autosaved portfolio with a file",
+                                  description="Replace the autosaved portfolio with a file. "
+                                              "Run it while the GUI is closed.")
+    command.add_argument("source", help=".csv, .jsonl, .pms or .db file (.csv and .jsonl may "
+                                           "end in .gz or .xz), or - for CSV on stdin")
+    command.add_argument("--changes", nargs="+", metavar="CHANGES",
+                         help="change files (File > Export Changes) to apply on top of an export "
+                              "source, in order")
+    command.set_defaults(func=cmd_import)
+
+    command = commands.add_parser("apply", help="apply change files to the portfolio",
+                                  description="Apply change files written by File > Export "
+                                              "Changes, in order.")
+    command.add_argument("deltas", nargs="+", metavar="CHANGES", help="change files")
+    command.add_argument("-p", "--portfolio", metavar="FILE",
+                         help="apply to FILE (any format) instead of the autosaved portfolio")
+    command.set_defaults(func=cmd_apply)
+
+    command = commands.add_parser("merge", help="merge exports into the portfolio",
+                                  description="Merge exports (.csv or .jsonl, compressed or not) "
+                                              "into the portfolio, parsing them in parallel.")
+    command.add_argument("sources", nargs="+", metavar="SOURCE", help="export files")
+    command.add_argument("-p", "--portfolio", metavar="FILE",
+                         help="merge into FILE (any format) instead of the autosaved portfolio")
+    command.add_argument("--policy", choices=MERGE_POLICIES, default="merge",
+                         help="for projects whose name is taken (default merge): combine them, "
+                              "replace the existing one, keep it, or rename the new one")
+    command.add_argument("--workers", type=int, help="parsing processes (default: one per CPU)")
+    command.set_defaults(func=cmd_merge)
+
+    command = commands.add_parser("export", help="write the portfolio to a file")
+    command.add_argument("target", help=".csv, .jsonl, .pms or .db file (.csv and .jsonl may "
+                                           "end in .gz or .xz), or - for CSV on stdout")
+    portfolio_option(command)
+    command.set_defaults(func=cmd_export)
+
+    command = commands.add_parser("convert", help="convert a portfolio file to another format")
+    command.add_argument("source")
+    command.add_argument("target")
+    command.set_defaults(func=cmd_convert)
+
+    command = commands.add_parser("query", help="list projects and sub-processes as CSV",
+                                  description="List projects and sub-processes matching every "
+                                              "option given, as CSV.")
+    portfolio_option(command)
+    command.add_argument("-s", "--search", metavar="TEXT",
+                         help="projects matching every word of TEXT, as in the search box")
+    command.add_argument("--status", action="append", choices=STATUS_OPTIONS,
+                         help="only this status (repeatable)")
+    command.add_argument("--person", metavar="NAME", help="only records assigning NAME")
+    command.add_argument("--projects-only", action="store_true", help="leave out sub-processes")
+    when = command.add_mutually_exclusive_group()
+    when.add_argument("--active", nargs=2, type=_date_arg, metavar=("FROM", "TO"),
+                      help="active at any point between two dates")
+    when.add_argument("--overdue", action="store_true", help="open and past their end date")
+    command.add_argument("--today", type=_date_arg, help="date to count as today for --overdue")
+    command.set_defaults(func=cmd_query)
+
+    command = commands.add_parser("report", help="print portfolio statistics or workload")
+    command.add_argument("kind", choices=("summary", "workload"))
+    portfolio_option(command)
+    command.add_argument("--capacity", type=int, default=1,
+                         help="concurrent sub-processes per person, for workload (default 1)")
+    command.add_argument("--today", type=_date_arg, help="date to count as today")
+    command.set_defaults(func=cmd_report)
+    return parser
+
+
+def main(argv=None, prog=None):
+    args = build_parser(prog).parse_args(argv)
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # Output piped into head and the like; silence the flush at exit
+        sys.stdout = None
+    except (CommandError, OSError, ValueError) as e:
+        print(f"{prog or 'portfolio'}: error: {e}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,180 @@
+"""Export format.
+
+One record per row, the first column naming the record type:
+
+    PERSON,<name>
+    PROJECT,<project>,<status>,<start>,<end>,<id>
+    PPERSONNEL,<project>,<person>,<role>,<project id>
+    SUBPROCESS,<project>,<sub-process>,<status>,<start>,<end>,<project id>,<id>
+    SPERSONNEL,<project>,<sub-process>,<person>,<role>,<project id>,<sub-process id>
+
+Rows are linked by id, so projects that share a name stay apart. Files
+written before records had ids lack the id columns; their rows are linked by
+name, a repeated project name replacing the earlier project, and the records
+get new ids.
+
+Files are CSV unless their name asks for another format or compression
+(streams.py): export_csv(store, "projects.jsonl.gz") streams the same rows
+as gzip-compressed JSON Lines, and read_portfolio() reads it back.
+"""
+import os
+
+from .dates import normalize_date
+from .store import new_project, new_subprocess
+from .streams import DECOMPRESS_ERRORS, open_rows
+from .tasks import PROGRESS_EVERY, check_cancel
+
+
+def write_rows(writer, store, progress=None, cancel=None):
+    for person_name in sorted(store.personnel):
+        writer.writerow(["PERSON", person_name])
+
+    total = len(store)
+    # Active projects first, then completed ones
+    for n, project in enumerate(store.iter_projects(load=False), 1):
+        if n % PROGRESS_EVERY == 0:
+            check_cancel(cancel)
+            if progress is not None:
+                progress(n, total)
+        write_project_header(writer, project)
+        for sp in project["subprocesses"]:
+            write_subprocess(writer, project, sp)
+    if progress is not None:
+        progress(total, total)
+
+
+def write_project_header(writer, project):
+    """The PROJECT row and its PPERSONNEL rows."""
+    writer.writerow(["PROJECT", project["name"], project["status"], project["start_date"], project["end_date"],
+                     project["id"]])
+    for (pname, role) in project["personnel"]:
+        writer.writerow(["PPERSONNEL", project["name"], pname, role, project["id"]])
+
+
+def write_subprocess(writer, project, sp):
+    """The SUBPROCESS row and its SPERSONNEL rows."""
+    writer.writerow(["SUBPROCESS", project["name"], sp["name"], sp["status"], sp["start_date"], sp["end_date"],
+                     project["id"], sp["id"]])
+    for (pname, role) in sp["personnel"]:
+        writer.writerow(["SPERSONNEL", project["name"], sp["name"], pname, role, project["id"], sp["id"]])
+
+
+def export_csv(store, filename, progress=None, cancel=None):
+    # Write beside the target and swap it in, so a cancelled or failed export
+    # never leaves a truncated file behind.
+    tmp_name = filename + ".part"
+    try:
+        with open_rows(tmp_name, "w", filename) as f:
+            write_rows(f.writer(), store, progress, cancel)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+class PortfolioBuilder:
+    """Builds (personnel, projects) from a stream of export rows in one pass.
+
+    Projects and sub-processes are found through indexes keyed by id, or by
+    name in files without ids, so each row costs O(1) instead of a scan.
+    """
+
+    def __init__(self):
+        self.personnel = set()
+        self.projects = []
+        self._projects = {}      # project id (or name) -> project
+        self._positions = {}
+        self._subprocesses = {}  # (project key, sub-process id or name) -> sub-process
+        self._handlers = {
+            "PERSON": self._person,
+            "PROJECT": self._project,
+            "PPERSONNEL": self._project_personnel,
+            "SUBPROCESS": self._subprocess,
+            "SPERSONNEL": self._subprocess_personnel,
+        }
+
+    def feed(self, rows):
+        for row_num, row in enumerate(rows, 1):
+            handler = self._handlers.get(row[0])
+            if handler is None:
+                continue
+            try:
+                handler(*row[1:])
+            except TypeError:
+                raise ValueError(f"Row {row_num}: wrong number of fields for {row[0]}") from None
+        return self
+
+    def result(self):
+        return self.personnel, self.projects
+
+    def _person(self, pname):
+        self.personnel.add(pname)
+
+    def _project(self, pname, status, sdate, edate, pid=""):
+        key = pid or pname
+        project = new_project(pname, status, normalize_date(sdate, strict=False),
+                              normalize_date(edate, strict=False), pid or None)
+        if key in self._projects:
+            # A repeated key replaces the earlier record but keeps its position
+            for sp in self._projects[key]["subprocesses"]:
+                self._subprocesses.pop((key, sp["id"]), None)
+                self._subprocesses.pop((key, sp["name"]), None)
+            self.projects[self._positions[key]] = project
+        else:
+            self._positions[key] = len(self.projects)
+            self.projects.append(project)
+        self._projects[key] = project
+
+    def _project_personnel(self, pname, pername, perrole, pid=""):
+        self.personnel.add(pername)
+        project = self._projects.get(pid or pname)
+        if project is not None:
+            project["personnel"].append((pername, perrole))
+
+    def _subprocess(self, pname, spname, spstatus, spsdate, spedate, pid="", sid=""):
+        key = pid or pname
+        project = self._projects.get(key)
+        if project is not None:
+            sp = new_subprocess(spname, spstatus, normalize_date(spsdate, strict=False),
+                                normalize_date(spedate, strict=False), sid or None)
+            project["subprocesses"].append(sp)
+            # Personnel rows go to the first sub-process with a given id or name
+            self._subprocesses.setdefault((key, sid or spname), sp)
+
+    def _subprocess_personnel(self, pname, spname, pername, perrole, pid="", sid=""):
+        self.personnel.add(pername)
+        sp = self._subprocesses.get((pid or pname, sid or spname))
+        if sp is not None:
+            sp["personnel"].append((pername, perrole))
+
+
+def _watch(rows, f, total, progress, cancel):
+    # Pass rows through, reporting bytes read and honouring cancel requests
+    for n, row in enumerate(rows, 1):
+        if n % PROGRESS_EVERY == 0:
+            check_cancel(cancel)
+            if progress is not None:
+                progress(f.tell(), total)
+        yield row
+    if progress is not None:
+        progress(total, total)
+
+
+def read_portfolio(filename, progress=None, cancel=None):
+    """Parse an export into (personnel, projects) without touching any store.
+
+    Raises OperationCancelled if cancel (a threading.Event) gets set.
+    """
+    total = os.path.getsize(filename)
+    with open_rows(filename) as f:
+        rows = _watch(f.rows(), f, total, progress, cancel)
+        try:
+            return PortfolioBuilder().feed(rows).result()
+        except DECOMPRESS_ERRORS as e:
+            raise ValueError(f"Damaged or incomplete compressed file: {e}") from None
+
+
+def import_csv(store, filename):
+    personnel, projects = read_portfolio(filename)
+    store.load(personnel, projects)
@@ -0,0 +1,61 @@
+"""Date parsing for project and sub-process start/end dates.
+
+Dates are stored as ISO strings (YYYY-MM-DD), so they stay readable in every
+file format and sort chronologically as plain strings. normalize_date() turns
+what a user types or an older CSV holds into that form once, when it enters
+the store. An empty string means "no date".
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+# Tried in order after ISO. Slashes are read month first, dots day first.
+_FORMATS = ("%Y/%m/%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%d-%m-%Y",
+            "%b %d %Y", "%b %d, %Y", "%B %d %Y", "%B %d, %Y",
+            "%d %b %Y", "%d %B %Y")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Return a datetime.date for text, None for an empty string.
+
+    Raises ValueError if text is not a recognised date.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    text = " ".join(text.split())
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {text!r} (use YYYY-MM-DD)")
+
+
+def normalize_date(text, strict=True):
+    """Return text as YYYY-MM-DD, or "" if empty.
+
+    Unrecognised text raises ValueError, or is returned unchanged when strict
+    is False (used on import, so that nothing in an old file is lost).
+    """
+    try:
+        parsed = parse_date(text)
+    except ValueError:
+        if strict:
+            raise
+        return text
+    return parsed.isoformat() if parsed is not None else ""
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text):
+    """Proleptic Gregorian ordinal of a stored date, or None if it has none."""
+    try:
+        parsed = parse_date(text)
+    except ValueError:
+        return None
+    return parsed.toordinal() if parsed is not None else None
@@ -0,0 +1,577 @@
+"""Change files: only what changed since the last export.
+
+A ChangeTracker listens to the store and notes, by id, the projects and
+sub-processes changed since the portfolio was last exported or imported, and
+the people by name. export_delta() writes just those as export rows (see
+csvio.py), in any format streams.py knows, with a few more record types:
+
+    DELTA,<base>                    first row: id of the file this follows
+    RESET                           the rows after it are a whole portfolio
+    DELPERSON,<name>
+    DELPROJECT,<project>,<id>
+    DELSUBPROCESS,<project>,<sub-process>,<project id>,<id>
+    CLEAR,<project>,<project id>    drop the project's sub-processes; the
+                                    SUBPROCESS rows after it are all of them
+    MOVE,<project>,<after>,<project id>,<after id>
+                                    put the project right after <after> in
+                                    its list, or first if <after> is empty
+
+A PROJECT row updates the project with its id, or appends it if there is
+none, and its PPERSONNEL rows replace the project's personnel. SUBPROCESS and
+SPERSONNEL rows do the same for a sub-process. PERSON rows add to the global
+personnel. Change files written before records had ids name them instead,
+and are applied by name.
+
+A file's id is a hash of its bytes, so each change file names the export or
+change file it goes on top of, and a chain of them is checked link by link.
+DeltaFile reads a change file a row at a time, hashing it as it goes.
+apply_delta() makes the changes through the store's methods, as one undo step.
+"""
+import hashlib
+import io
+import json
+import os
+from contextlib import contextmanager
+from itertools import chain
+
+from .csvio import (PortfolioBuilder, export_csv, read_portfolio, write_project_header,
+                    write_rows, write_subprocess)
+from .dates import normalize_date
+from .store import PortfolioStore, new_project, new_subprocess
+from .streams import DECOMPRESS_ERRORS, RowStream, open_rows
+from .tasks import check_cancel
+
+
+def file_id(filename):
+    """Id of an export or change file: a hash of its contents."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+STATE_VERSION = 2  # Of ChangeTracker.save() files; 1 kept names rather than ids
+
+
+class ChangeTracker:
+    """What changed since the file with id base, by project and sub-process id.
+
+    Until clear() says which file the store matches, the next change file
+    holds the whole portfolio (RESET).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.base = None
+        self._applying = False
+        self._clear(reset=True)
+        store.subscribe(self.on_store_changed)
+
+    def _clear(self, reset):
+        self.reset = reset
+        self.people_added = set()
+        self.people_removed = set()
+        self.removed_projects = {}         # project id -> name
+        self.whole = set()                 # Projects to write in full
+        self.headers = set()               # Projects whose fields or personnel changed
+        self.subprocesses = {}             # project id -> sub-process ids changed or appended
+        self.removed_subprocesses = {}     # project id -> {sub-process id: name} removed
+        self.moved = set()
+
+    def clear(self, base):
+        """The store now matches the file with id base."""
+        self.base = base
+        self._clear(reset=False)
+
+    @property
+    def empty(self):
+        return not (self.reset or self.people_added or self.people_removed
+                    or self.removed_projects or self.whole or self.headers
+                    or self.subprocesses or self.removed_subprocesses or self.moved)
+
+    @contextmanager
+    def applying(self, delta):
+        """Changes made in the with block come from delta, a DeltaFile read to
+        the end in it: they are not tracked, and delta becomes the base."""
+        self._applying = True
+        try:
+            yield
+        except BaseException:
+            # Some of the file may have been applied; only a full file is safe
+            self.reset = True
+            raise
+        finally:
+            self._applying = False
+        self.base = delta.id
+
+    # ---------------- Listening ----------------
+    def on_store_changed(self, event, d):
+        if event in ("batch_started", "batch_finished", "archive_loaded"):
+            return
+        if self._applying:
+            if event == "reset":
+                # A RESET file: the store is exactly that file now
+                self._clear(reset=False)
+            return
+        if event == "reset":
+            self._clear(reset=True)
+        elif event == "person_added":
+            self._person(d["name"], True)
+        elif event == "person_removed":
+            self._person(d["name"], False)
+        elif event == "person_renamed":
+            self._person(d["old_name"], False)
+            self._person(d["name"], True)
+        elif event == "project_added":
+            pid = d["project"]["id"]
+            self.removed_projects.pop(pid, None)
+            self.whole.add(pid)
+            if d["index"] != len(self.store.project_list(d["completed"])) - 1:
+                self.moved.add(pid)
+        elif event == "project_removed":
+            pid = d["project"]["id"]
+            self.removed_projects[pid] = d["project"]["name"]
+            self._forget(pid)
+        elif event == "project_updated":
+            self.headers.add(d["project"]["id"])
+            if d["completed"] != d["old_completed"]:
+                # It went to the end of the other list
+                self.moved.add(d["project"]["id"])
+        elif event == "project_moved":
+            self.moved.add(d["project"]["id"])
+        elif event.startswith("subprocess_"):
+            self._subprocess(event, d)
+        elif event.startswith("assignment_"):
+            pid = d["project"]["id"]
+            if d["subprocess"] is None:
+                self.headers.add(pid)
+            elif pid not in self.whole:
+                self.subprocesses.setdefault(pid, set()).add(d["subprocess"]["id"])
+
+    def _person(self, name, added):
+        (self.people_removed if added else self.people_added).discard(name)
+        (self.people_added if added else self.people_removed).add(name)
+
+    def _forget(self, pid):
+        self.whole.discard(pid)
+        self.headers.discard(pid)
+        self.subprocesses.pop(pid, None)
+        self.removed_subprocesses.pop(pid, None)
+        self.moved.discard(pid)
+
+    def _subprocess(self, event, d):
+        project, sp = d["project"], d["subprocess"]
+        pid = project["id"]
+        if pid in self.whole:
+            return
+        if event == "subprocess_removed":
+            self.subprocesses.get(pid, set()).discard(sp["id"])
+            self.removed_subprocesses.setdefault(pid, {})[sp["id"]] = sp["name"]
+        elif event == "subprocess_updated" or d["index"] == len(project["subprocesses"]) - 1:
+            self.removed_subprocesses.get(pid, {}).pop(sp["id"], None)
+            self.subprocesses.setdefault(pid, set()).add(sp["id"])
+        else:
+            # Inserted mid-list: the rows only say where by rewriting the list
+            self.whole.add(pid)
+
+    # ---------------- Saving ----------------
+    def save(self, filename, token):
+        """Write the state to filename, valid while the autosave has token."""
+        state = {"version": STATE_VERSION, "token": token, "base": self.base, "reset": self.reset,
+                 "people_added": sorted(self.people_added),
+                 "people_removed": sorted(self.people_removed),
+                 "removed_projects": self.removed_projects,
+                 "whole": sorted(self.whole), "headers": sorted(self.headers),
+                 "subprocesses": {k: sorted(v) for k, v in self.subprocesses.items()},
+                 "removed_subprocesses": self.removed_subprocesses,
+                 "moved": sorted(self.moved)}
+        tmp_name = filename + ".part"
+        with open(tmp_name, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_name, filename)
+
+    def restore(self, filename, token):
+        """Take up the state save()d with token; return whether there was one.
+
+        Any other token means the autosave changed without this tracker
+        (a crash, or a command-line import), so the next file is a full one.
+        """
+        try:
+            with open(filename, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if token is None or state.get("token") != token or state.get("version") != STATE_VERSION:
+            return False
+        self.base = state["base"]
+        self.reset = state["reset"]
+        self.people_added = set(state["people_added"])
+        self.people_removed = set(state["people_removed"])
+        self.removed_projects = dict(state["removed_projects"])
+        self.whole = set(state["whole"])
+        self.headers = set(state["headers"])
+        self.subprocesses = {k: set(v) for k, v in state["subprocesses"].items()}
+        self.removed_subprocesses = {k: dict(v) for k, v in state["removed_subprocesses"].items()}
+        self.moved = set(state["moved"])
+        return True
+
+
+# ---------------- Writing ----------------
+def write_delta(writer, store, tracker):
+    if tracker.reset:
+        writer.writerow(["DELTA", ""])
+        writer.writerow(["RESET"])
+        write_rows(writer, store)
+        return
+    writer.writerow(["DELTA", tracker.base])
+    for name in sorted(tracker.people_removed):
+        writer.writerow(["DELPERSON", name])
+    for name in sorted(tracker.people_added):
+        if name in store.personnel:
+            writer.writerow(["PERSON", name])
+    for pid, name in sorted(tracker.removed_projects.items()):
+        writer.writerow(["DELPROJECT", name, pid])
+
+    changed = (tracker.whole | tracker.headers | set(tracker.subprocesses)
+               | set(tracker.removed_subprocesses) | tracker.moved)
+    # Only the archived projects holding changes are loaded
+    found = store.projects_by_id(changed)
+    # Upserts in list order, so projects new to the receiver append in order
+    for project in store.loaded_projects():
+        pid = project["id"]
+        if found.get(pid) is not project:
+            continue
+        if pid in tracker.whole or pid in tracker.headers:
+            write_project_header(writer, project)
+        if pid in tracker.whole:
+            writer.writerow(["CLEAR", project["name"], pid])
+            for sp in project["subprocesses"]:
+                write_subprocess(writer, project, sp)
+            continue
+        for sid, sp_name in sorted(tracker.removed_subprocesses.get(pid, {}).items()):
+            writer.writerow(["DELSUBPROCESS", project["name"], sp_name, pid, sid])
+        changed_sps = tracker.subprocesses.get(pid, ())
+        for sp in project["subprocesses"]:
+            if sp["id"] in changed_sps:
+                write_subprocess(writer, project, sp)
+
+    # In final list order, so each project lands after one already in place
+    for (completed, index), project in sorted((store.locate(found[pid]), found[pid])
+                                              for pid in tracker.moved if found.get(pid)):
+        after = store.project_list(completed)[index - 1] if index else None
+        writer.writerow(["MOVE", project["name"], after["name"] if after else "",
+                         project["id"], after["id"] if after else ""])
+
+
+def export_delta(store, tracker, filename):
+    """Write the changes since the last export to filename, which becomes the
+    new base. Returns its id."""
+    tmp_name = filename + ".part"
+    try:
+        with open_rows(tmp_name, "w", filename) as f:
+            write_delta(f.writer(), store, tracker)
+        os.replace(tmp_name, filename)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    delta_id = file_id(filename)
+    tracker.clear(delta_id)
+    return delta_id
+
+
+def export_base(store, filename, progress=None, cancel=None):
+    """export_csv(), returning the file's id for ChangeTracker.clear()."""
+    export_csv(store, filename, progress, cancel)
+    return file_id(filename)
+
+
+# ---------------- Reading ----------------
+def read_base(filename, progress=None, cancel=None):
+    """read_portfolio() plus the file's id: (personnel, projects, id)."""
+    personnel, projects = read_portfolio(filename, progress, cancel)
+    return personnel, projects, file_id(filename)
+
+
+class _HashingReader(io.RawIOBase):
+    # Hashes the bytes of a binary file as they are read
+    def __init__(self, raw):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.raw.readinto(b)
+        if n:
+            self.digest.update(memoryview(b)[:n])
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class DeltaFile:
+    """A change file, read a row at a time.
+
+    base, the id of the file it follows ("" for a RESET file), is known once
+    it is open; id, its own, once rows() has been read to the end.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.id = None
+        self.rows_read = 0
+        self._hashed = _HashingReader(open(filename, 'rb'))
+        self._buffer = io.BufferedReader(self._hashed)
+        self._stream = RowStream(self._buffer, "r", filename)
+        try:
+            self._rows = self._stream.rows()
+            with self._decompressing():
+                first = next(self._rows, None)
+            if first is None or first[0] != "DELTA" or len(first) != 2:
+                raise ValueError(f"{filename} is not a change file")
+            self.base = first[1]
+        except BaseException:
+            self.close()
+            raise
+
+    @contextmanager
+    def _decompressing(self):
+        try:
+            yield
+        except DECOMPRESS_ERRORS as e:
+            raise ValueError(f"{self.filename}: damaged or incomplete compressed file: {e}") from None
+
+    def rows(self):
+        """Yield the rows after the DELTA row."""
+        with self._decompressing():
+            for row in self._rows:
+                self.rows_read += 1
+                yield row
+            # Whatever the parser left, e.g. a compressed file's trailer
+            while self._buffer.read(1 << 20):
+                pass
+        self.id = self._hashed.digest.hexdigest()[:32]
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fields(status, sdate, edate):
+    return {"status": status, "start_date": normalize_date(sdate, strict=False),
+            "end_date": normalize_date(edate, strict=False)}
+
+
+class _Changes:
+    """The rows of a change file, grouped by project. Projects and
+    sub-processes are keyed by id, or by name in files without ids."""
+
+    def __init__(self):
+        self.people_added = []
+        self.people_removed = []
+        self.removed_projects = []
+        self.projects = {}  # key -> changes, in order of first mention
+        self.moves = []
+        self.names = set()  # Keys that are names, not ids
+        self._subprocess = None
+        self._handlers = {
+            "PERSON": self.people_added.append,
+            "DELPERSON": self.people_removed.append,
+            "DELPROJECT": lambda name, pid="": self.removed_projects.append(self._key(name, pid)),
+            "PROJECT": self._project,
+            "PPERSONNEL": self._project_personnel,
+            "CLEAR": self._clear,
+            "SUBPROCESS": self._add_subprocess,
+            "SPERSONNEL": self._subprocess_personnel,
+            "DELSUBPROCESS": self._remove_subprocess,
+            "MOVE": self._move,
+        }
+
+    def feed(self, rows):
+        # Row numbers count the DELTA row
+        for row_num, row in enumerate(rows, 2):
+            handler = self._handlers.get(row[0])
+            if handler is None:
+                continue
+            try:
+                handler(*row[1:])
+            except TypeError:
+                raise ValueError(f"Row {row_num}: wrong number of fields for {row[0]}") from None
+        return self
+
+    def _key(self, name, pid):
+        if pid:
+            return pid
+        self.names.add(name)
+        return name
+
+    def _changes(self, key):
+        changes = self.projects.get(key)
+        if changes is None:
+            changes = self.projects[key] = {"name": None, "id": None, "fields": None,
+                                            "personnel": None, "clear": False,
+                                            "removed": [], "subprocesses": []}
+        return changes
+
+    def _project(self, name, status, sdate, edate, pid=""):
+        changes = self._changes(self._key(name, pid))
+        changes["name"], changes["id"] = name, pid or None
+        changes["fields"] = _fields(status, sdate, edate)
+        changes["personnel"] = []
+
+    def _project_personnel(self, name, person, role, pid=""):
+        changes = self._changes(self._key(name, pid))
+        if changes["personnel"] is None:
+            changes["personnel"] = []
+        changes["personnel"].append((person, role))
+
+    def _clear(self, name, pid=""):
+        self._changes(self._key(name, pid))["clear"] = True
+
+    def _add_subprocess(self, name, sp_name, status, sdate, edate, pid="", sid=""):
+        self._subprocess = (self._key(name, pid), sid or sp_name, sp_name, sid or None,
+                            _fields(status, sdate, edate), [])
+        self._changes(pid or name)["subprocesses"].append(self._subprocess)
+
+    def _subprocess_personnel(self, name, sp_name, person, role, pid="", sid=""):
+        if self._subprocess is not None and self._subprocess[:2] == (pid or name, sid or sp_name):
+            self._subprocess[5].append((person, role))
+
+    def _remove_subprocess(self, name, sp_name, pid="", sid=""):
+        self._changes(self._key(name, pid))["removed"].append(sid or sp_name)
+
+    def _move(self, name, after, pid="", after_id=""):
+        self.moves.append((self._key(name, pid), after_id or (after and self._key(after, ""))))
+
+    def keys(self):
+        return (set(self.removed_projects) | set(self.projects)
+                | {key for move in self.moves for key in move if key})
+
+
+def _set_personnel(store, project, people, sp=None):
+    owner = sp if sp is not None else project
+    if owner["personnel"] == people:
+        return
+    for i in range(len(owner["personnel"]) - 1, -1, -1):
+        store.remove_assignment(project, i, subprocess=sp)
+    for person, role in people:
+        store.add_assignment(project, person, role, subprocess=sp)
+
+
+def _find_subprocess(project, key):
+    return next((sp for sp in project["subprocesses"] if key in (sp["id"], sp["name"])), None)
+
+
+def _new_subprocess(sp_changes):
+    _, _, sp_name, sid, fields, people = sp_changes
+    sp = new_subprocess(sp_name, id=sid, **fields)
+    sp["personnel"] = list(people)
+    return sp
+
+
+def _new_project(changes):
+    project = new_project(changes["name"], id=changes["id"], **changes["fields"])
+    project["personnel"] = list(changes["personnel"])
+    for sp_changes in changes["subprocesses"]:
+        project["subprocesses"].append(_new_subprocess(sp_changes))
+    return project
+
+
+def _find_projects(store, changes):
+    """{key: project} for the projects the changes name, by id or by name."""
+    # Only the archived projects named in the file are loaded
+    found = store.find_projects(changes.names)
+    found.update(store.projects_by_id(changes.keys() - changes.names))
+    return found
+
+
+def apply_delta(store, rows):
+    """Apply the rows of a change file after its DELTA row to store."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    if first[0] == "RESET":
+        store.load(*PortfolioBuilder().feed(rows).result())
+        return
+    changes = _Changes().feed(chain([first], rows))
+    found = _find_projects(store, changes)
+    with store.batch("Apply Changes"):
+        for name in changes.people_removed:
+            if name in store.personnel:
+                store.remove_person(name, unassign=False)
+        for name in changes.people_added:
+            if name not in store.personnel:
+                store.add_person(name)
+        for key in changes.removed_projects:
+            project = found.pop(key, None)
+            if project is not None:
+                store.delete_project(project)
+
+        for key, project_changes in changes.projects.items():
+            project = found.get(key)
+            if project is None:
+                if project_changes["fields"] is not None:
+                    found[key] = store.insert_project(_new_project(project_changes))
+                continue
+            if project_changes["fields"] is not None:
+                store.update_project(project, **project_changes["fields"])
+            if project_changes["personnel"] is not None:
+                _set_personnel(store, project, project_changes["personnel"])
+            if project_changes["clear"]:
+                for sp in list(reversed(project["subprocesses"])):
+                    store.remove_subprocess(project, sp)
+            for sp_key in project_changes["removed"]:
+                sp = _find_subprocess(project, sp_key)
+                if sp is not None:
+                    store.remove_subprocess(project, sp)
+            for sp_changes in project_changes["subprocesses"]:
+                sp = _find_subprocess(project, sp_changes[1])
+                if sp is None:
+                    store.insert_subprocess(project, _new_subprocess(sp_changes))
+                else:
+                    _, _, sp_name, _, fields, people = sp_changes
+                    store.update_subprocess(project, sp, name=sp_name, **fields)
+                    _set_personnel(store, project, people, sp)
+
+        for key, after in changes.moves:
+            project = found.get(key)
+            if project is None:
+                continue
+            completed, index = store.locate(project)
+            if not after:
+                store.move_project(project, 0)
+                continue
+            other = found.get(after)
+            if other is None or store.locate(other)[0] != completed:
+                continue
+            other_index = store.locate(other)[1]
+            store.move_project(project, other_index if index < other_index else other_index + 1)
+
+
+def read_chain(base, deltas, progress=None, cancel=None):
+    """(personnel, projects) of the export base with the change files deltas
+    applied in order. Raises ValueError where a file does not follow the one
+    before it."""
+    personnel, projects, previous = read_base(base, progress, cancel)
+    store = PortfolioStore()
+    store.load(personnel, projects)
+    previous_name = base
+    for filename in deltas:
+        check_cancel(cancel)
+        with DeltaFile(filename) as delta:
+            if delta.base and delta.base != previous:
+                raise ValueError(f"{filename} does not follow {previous_name}")
+            apply_delta(store, delta.rows())
+        previous, previous_name = delta.id, filename
+    return store.personnel, list(store.iter_projects())
@@ -0,0 +1,187 @@
+"""Undo and redo for every change made through a PortfolioStore.
+
+History listens to the store and turns each notification into a pair of
+calls: one that reverses the change and one that makes it again. The calls
+hold references to the records involved, never copies, so a step costs memory
+in proportion to what it changed: moving a project is a few references,
+deleting one keeps just that project alive. Even undoing an import only keeps
+the previous portfolio's records, which the store no longer uses.
+
+Steps are undone strictly newest first, so each reversing call finds the
+portfolio exactly as the change left it.
+"""
+from collections import deque
+
+MAX_STEPS = 500
+
+LABELS = {
+    "reset": "Load Portfolio",
+    "project_added": "Add Project",
+    "project_removed": "Delete Project",
+    "project_updated": "Edit Project",
+    "project_moved": "Move Project",
+    "subprocess_added": "Add Sub-Process",
+    "subprocess_removed": "Remove Sub-Process",
+    "subprocess_updated": "Edit Sub-Process",
+    "assignment_added": "Add Assignment",
+    "assignment_removed": "Remove Assignment",
+    "assignment_updated": "Edit Assignment",
+    "person_added": "Add Person",
+    "person_renamed": "Rename Person",
+    "person_removed": "Remove Person",
+}
+
+
+class History:
+    def __init__(self, store, limit=MAX_STEPS):
+        self.store = store
+        self._undo = deque(maxlen=limit)  # (label, [(undo, args, redo, args)])
+        self._redo = []
+        self._batch = None     # Changes of the batch in progress
+        self._applying = False  # Undoing or redoing: don't record
+        store.subscribe(self.on_store_changed)
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo_label(self):
+        return self._undo[-1][0] if self._undo else None
+
+    def redo_label(self):
+        return self._redo[-1][0] if self._redo else None
+
+    # ---------------- Recording ----------------
+    def on_store_changed(self, event, details):
+        if self._applying:
+            return
+        if event == "batch_started":
+            self._batch = []
+            return
+        if event == "batch_finished":
+            changes, self._batch = self._batch, None
+            if changes:
+                self._push(details["label"], changes)
+            return
+        change = self._change_for(event, details)
+        if change is None:
+            return
+        if self._batch is not None:
+            self._batch.append(change)
+        else:
+            self._push(LABELS[event], [change])
+
+    def _push(self, label, changes):
+        self._undo.append((label, changes))
+        self._redo.clear()
+
+    def _change_for(self, event, d):
+        """(undo, undo args, redo, redo args) for one notification."""
+        s = self.store
+        if event == "reset":
+            # The portfolio to redo is taken when the load is undone, so
+            # loading one doesn't read its whole archive
+            current = []
+            return self._unload, (d["previous"], current), self._reload, (current,)
+        if event == "project_added":
+            return s.delete_project, (d["project"],), s.insert_project, (d["project"], d["index"])
+        if event == "project_removed":
+            return s.insert_project, (d["project"], d["index"]), s.delete_project, (d["project"],)
+        if event == "project_updated":
+            project, old = d["project"], d["old"]
+            new = {key: project[key] for key in old}
+            return (self._set_project, (project, old, d["old_index"]),
+                    self._set_project, (project, new, d["index"]))
+        if event == "project_moved":
+            return (s.move_project, (d["project"], d["old_index"]),
+                    s.move_project, (d["project"], d["index"]))
+        if event == "subprocess_added":
+            return (s.remove_subprocess, (d["project"], d["subprocess"]),
+                    s.insert_subprocess, (d["project"], d["subprocess"], d["index"]))
+        if event == "subprocess_removed":
+            return (s.insert_subprocess, (d["project"], d["subprocess"], d["index"]),
+                    s.remove_subprocess, (d["project"], d["subprocess"]))
+        if event == "subprocess_updated":
+            sp, old = d["subprocess"], d["old"]
+            new = {key: sp[key] for key in old}
+            return (self._set_subprocess, (d["project"], sp, old),
+                    self._set_subprocess, (d["project"], sp, new))
+        if event == "assignment_added":
+            project, sp, index = d["project"], d["subprocess"], d["index"]
+            return (s.remove_assignment, (project, index, sp),
+                    s.add_assignment, (project, *d["assignment"], sp, index))
+        if event == "assignment_removed":
+            project, sp, index = d["project"], d["subprocess"], d["index"]
+            return (s.add_assignment, (project, *d["assignment"], sp, index),
+                    s.remove_assignment, (project, index, sp))
+        if event == "assignment_updated":
+            project, sp, index = d["project"], d["subprocess"], d["index"]
+            return (s.update_assignment, (project, index, *d["old"], sp),
+                    s.update_assignment, (project, index, *d["assignment"], sp))
+        # Assignment changes made by renaming or removing a person are
+        # recorded in the same batch, so only the set of names changes here.
+        # Assignments may name people outside the set; those stay untouched.
+        if event == "person_added":
+            return s.remove_person, (d["name"], False), s.add_person, (d["name"],)
+        if event == "person_renamed":
+            return (s.rename_person, (d["name"], d["old_name"], False),
+                    s.rename_person, (d["old_name"], d["name"], False))
+        if event == "person_removed":
+            return s.add_person, (d["name"],), s.remove_person, (d["name"], False)
+        return None
+
+    def _set_project(self, project, fields, index):
+        self.store.update_project(project, **fields)
+        # Crossing "Completed" appends the project; put it back where it was
+        self.store.move_project(project, index)
+
+    def _unload(self, previous, current):
+        s = self.store
+        current[:] = [(set(s.personnel), list(s.iter_projects(load=False)))]
+        s.load(*previous)
+
+    def _reload(self, current):
+        self.store.load(*current[0])
+
+    def _set_subprocess(self, project, sp, fields):
+        self.store.update_subprocess(project, sp, **fields)
+
+    # ---------------- Undo and redo ----------------
+    def undo(self):
+        """Reverse the newest step; return its label, or None if there is none."""
+        if not self._undo:
+            return None
+        label, changes = self._undo.pop()
+        self._apply(label, [(undo, args) for undo, args, _, _ in reversed(changes)])
+        self._redo.append((label, changes))
+        return label
+
+    def redo(self):
+        if not self._redo:
+            return None
+        label, changes = self._redo.pop()
+        self._apply(label, [(redo, args) for _, _, redo, args in changes])
+        self._undo.append((label, changes))
+        return label
+
+    def _apply(self, label, calls):
+        self._applying = True
+        try:
+            with self.store.batch(label):
+                for func, args in calls:
+                    func(*args)
+        except Exception:
+            # The portfolio no longer matches the recorded steps
+            self.clear()
+            raise
+        finally:
+            self._applying = False
@@ -0,0 +1,276 @@
+"""Append-only change journal with snapshot compaction.
+
+Every store notification is appended to <base>.journal as one compact JSON
+line, so an edit costs a few bytes on disk. compact() writes the whole
+portfolio to <base>.snapshot (a binary snapshot, see snapshot.py) and starts
+an empty journal; recover() loads the snapshot and replays the journal on top
+of it.
+
+Records address projects by (completed, index) and sub-processes and
+assignments by their index in their owner's list, as of the moment the change
+was made. Replaying them in order reproduces the same lists.
+
+Both files start with the same random token. If the process dies between
+writing a new snapshot and its new journal, the tokens differ and the stale
+journal, whose changes the snapshot already holds, is ignored.
+
+Completed projects are left in the snapshot as an Archive until something
+reads them, so recovery only builds the active ones.
+"""
+import json
+import os
+import uuid
+
+from .archive import Archive
+from .csvio import PortfolioBuilder
+from .snapshot import SnapshotReader, is_snapshot, write_snapshot
+from .store import new_project, new_subprocess
+from .streams import iter_rows
+
+COMPACT_EVERY = 20000  # journal records before compact_if_needed() snapshots
+
+
+def default_base_path():
+    return os.path.join(os.path.expanduser("~"), ".project_manager", "autosave")
+
+
+# Ids come last; journals written before records had ids leave them out
+def _dump_subprocess(sp):
+    return [sp["name"], sp["status"], sp["start_date"], sp["end_date"], sp["personnel"], sp["id"]]
+
+
+def _load_subprocess(data):
+    name, status, sdate, edate, personnel, *sid = data
+    sp = new_subprocess(name, status, sdate, edate, *sid)
+    sp["personnel"] = [tuple(a) for a in personnel]
+    return sp
+
+
+def _dump_project(project):
+    return [project["name"], project["status"], project["start_date"], project["end_date"],
+            project["personnel"], [_dump_subprocess(sp) for sp in project["subprocesses"]],
+            project["id"]]
+
+
+def _load_project(data):
+    name, status, sdate, edate, personnel, subprocesses, *pid = data
+    project = new_project(name, status, sdate, edate, *pid)
+    project["personnel"] = [tuple(a) for a in personnel]
+    project["subprocesses"] = [_load_subprocess(sp) for sp in subprocesses]
+    return project
+
+
+def _sp_index(project, sp):
+    if sp is None:
+        return None
+    for i, candidate in enumerate(project["subprocesses"]):
+        if candidate is sp:
+            return i
+    raise ValueError(f"Sub-process {sp['name']!r} not found")
+
+
+class Journal:
+    def __init__(self, base_path=None):
+        self.base_path = base_path or default_base_path()
+        self.snapshot_path = self.base_path + ".snapshot"
+        self.journal_path = self.base_path + ".journal"
+        self.store = None
+        self.records = 0
+        self.token = None  # Token of the snapshot the journal follows
+        self._file = None
+        self._recovered = False  # The journal on disk matches the store's state
+
+    # ---------------- Recovery ----------------
+    def recover(self, store):
+        """Load the last snapshot plus journal into store; return records replayed."""
+        token = None
+        personnel, projects, archive = set(), [], None
+        if os.path.exists(self.snapshot_path):
+            if is_snapshot(self.snapshot_path):
+                reader = SnapshotReader(self.snapshot_path)
+                token = reader.token.hex()
+                # The archive keeps the reader open while it has projects to read
+                first = reader.archive_start()
+                personnel, projects = reader.personnel(), reader.projects(0, first)
+                archive = Archive(reader, first)
+            else:
+                # Autosave written as CSV by an earlier version
+                with open(self.snapshot_path, 'r', newline='', encoding='utf-8') as f:
+                    rows = iter_rows(f)
+                    header = next(rows, None)
+                    if header and header[0] == "SNAPSHOT":
+                        token = header[1]
+                    personnel, projects = PortfolioBuilder().feed(rows).result()
+        store.load(personnel, projects, archive)
+
+        replayed = 0
+        if token is not None and os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                header = f.readline()
+                if header.strip() == json.dumps(["SNAPSHOT", token]):
+                    self._recovered = True
+                    for line in f:
+                        try:
+                            self._replay(store, json.loads(line))
+                        except (ValueError, LookupError, TypeError):
+                            # Torn final write from a crash, or a record that no
+                            # longer applies. Keep what replayed; attach() will
+                            # start a fresh snapshot from here.
+                            self._recovered = False
+                            break
+                        replayed += 1
+        self.records = replayed
+        self.token = token
+        return replayed
+
+    def _replay(self, store, record):
+        op, args = record[0], record[1:]
+        if op == "person+":
+            store.add_person(args[0])
+        elif op == "person~":
+            # Its assignment changes were journaled on their own, just before
+            store.rename_person(args[0], args[1], reassign=False)
+        elif op == "person-":
+            store.remove_person(args[0], unassign=False)
+        elif op == "project+":
+            completed, index, data = args
+            store.insert_project(_load_project(data), index)
+        elif op == "project~":
+            completed, index, fields = args
+            store.update_project(store.project_list(completed)[index], **fields)
+        elif op == "project-":
+            completed, index = args
+            store.delete_project(store.project_list(completed)[index])
+        elif op == "project>":
+            completed, index, new_index = args
+            store.move_project(store.project_list(completed)[index], new_index)
+        elif op == "sp+":
+            completed, index, sp_index, data = args
+            store.insert_subprocess(store.project_list(completed)[index], _load_subprocess(data), sp_index)
+        else:
+            completed, index, sp_index = args[0], args[1], args[2]
+            project = store.project_list(completed)[index]
+            sp = project["subprocesses"][sp_index] if sp_index is not None else None
+            rest = args[3:]
+            if op == "sp~":
+                store.update_subprocess(project, sp, **rest[0])
+            elif op == "sp-":
+                store.remove_subprocess(project, sp)
+            elif op == "a+":
+                a_index, person, role = rest
+                store.add_assignment(project, person, role, subprocess=sp, index=a_index)
+            elif op == "a~":
+                a_index, person, role = rest
+                store.update_assignment(project, a_index, person, role, subprocess=sp)
+            elif op == "a-":
+                store.remove_assignment(project, rest[0], subprocess=sp)
+            else:
+                raise ValueError(f"Unknown journal record {op!r}")
+
+    # ---------------- Recording ----------------
+    def attach(self, store):
+        self.store = store
+        if self._file is None:
+            if self._recovered:
+                self._file = open(self.journal_path, 'a', encoding='utf-8')
+            else:
+                self.compact()
+        store.subscribe(self.on_store_changed)
+
+    def detach(self):
+        if self.store is not None:
+            self.store.unsubscribe(self.on_store_changed)
+            self.store = None
+
+    def close(self):
+        self.detach()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self._file.flush()
+        self.records += 1
+
+    def on_store_changed(self, event, details):
+        if event == "reset":
+            # A whole new portfolio: cheaper to snapshot than to journal
+            self.compact()
+            return
+        if event in ("batch_started", "batch_finished", "archive_loaded"):
+            return
+        record = self._record_for(event, details)
+        if record is not None:
+            self.append(record)
+
+    def _record_for(self, event, d):
+        if event == "person_added":
+            return ["person+", d["name"]]
+        if event == "person_renamed":
+            return ["person~", d["old_name"], d["name"]]
+        if event == "person_removed":
+            return ["person-", d["name"]]
+        if event == "project_added":
+            return ["project+", d["completed"], d["index"], _dump_project(d["project"])]
+        if event == "project_updated":
+            fields = {key: d["project"][key] for key in d["old"]}
+            return ["project~", d["old_completed"], d["old_index"], fields]
+        if event == "project_removed":
+            return ["project-", d["completed"], d["index"]]
+        if event == "project_moved":
+            return ["project>", d["completed"], d["old_index"], d["index"]]
+
+        project = d["project"]
+        completed, index = self.store.locate(project)
+        if event == "subprocess_added":
+            return ["sp+", completed, index, d["index"], _dump_subprocess(d["subprocess"])]
+        if event == "subprocess_removed":
+            return ["sp-", completed, index, d["index"]]
+        sp_index = _sp_index(project, d["subprocess"])
+        if event == "subprocess_updated":
+            fields = {key: d["subprocess"][key] for key in d["old"]}
+            return ["sp~", completed, index, sp_index, fields]
+        if event == "assignment_added":
+            return ["a+", completed, index, sp_index, d["index"], *d["assignment"]]
+        if event == "assignment_updated":
+            return ["a~", completed, index, sp_index, d["index"], *d["assignment"]]
+        if event == "assignment_removed":
+            return ["a-", completed, index, sp_index, d["index"]]
+        return None
+
+    # ---------------- Compaction ----------------
+    def compact_if_needed(self):
+        if self.records >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """Snapshot the attached store and start an empty journal."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.base_path)), exist_ok=True)
+        token = uuid.uuid4().bytes
+
+        journal_tmp = self.journal_path + ".part"
+        with open(journal_tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(["SNAPSHOT", token.hex()]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._file is not None:
+            self._file.close()
+        # The snapshot lands first; until the new journal replaces the old
+        # one, their tokens differ and recovery ignores the old journal.
+        archive = self.store.completed_projects
+        if isinstance(archive, Archive) and archive.filename == self.snapshot_path:
+            # The archive reads from the snapshot being replaced (which
+            # Windows refuses while it is mapped): move it to the new one
+            snapshot_tmp = self.snapshot_path + ".new"
+            write_snapshot(self.store, snapshot_tmp, token)
+            archive.close()
+            os.replace(snapshot_tmp, self.snapshot_path)
+            archive.rebase(SnapshotReader(self.snapshot_path), len(self.store.projects))
+        else:
+            write_snapshot(self.store, self.snapshot_path, token)
+        os.replace(journal_tmp, self.journal_path)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self.records = 0
+        self.token = token.hex()
@@ -0,0 +1,175 @@
+"""Merge many CSV exports into the current portfolio.
+
+parse_files() parses the files in parallel on a process pool, one file per
+task; parsing is pure Python, so threads would only take turns. merge() then
+combines the results with the current portfolio in the order the files were
+given, so the outcome never depends on which worker finished first.
+
+An incoming project whose name is already taken is handled by policy:
+
+    "merge"    combine the two: the existing project's fields win unless
+               empty, sub-processes are matched by name and assignments are
+               united
+    "replace"  the incoming project takes the existing one's place
+    "keep"     the incoming project is dropped
+    "rename"   the incoming project is added as "Name (2)", "Name (3)", ...
+
+Personnel is the union of everyone in the portfolio and the files. Records
+already in the portfolio are never modified, so undo can put them back.
+"""
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .csvio import read_portfolio
+from .store import MERGE_POLICIES as POLICIES, new_id
+from .tasks import check_cancel
+
+CANCEL_POLL_S = 0.1
+
+
+def _read(filename):
+    try:
+        return read_portfolio(filename)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"{filename}: {e}") from None
+
+
+def _pool_context():
+    # Not plain fork: the GUI calls this from a worker thread, and forking a
+    # threaded process can copy a held lock into the child
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def parse_files(filenames, workers=None, progress=None, cancel=None):
+    """[(personnel, projects)] for each file, in the order given.
+
+    workers defaults to one per file, up to the number of CPUs; with one
+    worker the files are parsed in this process. Raises ValueError naming the
+    file that could not be read.
+    """
+    total = len(filenames)
+    if workers is None:
+        workers = min(total, os.cpu_count() or 1)
+    results = [None] * total
+    if workers <= 1:
+        for i, filename in enumerate(filenames):
+            check_cancel(cancel)
+            results[i] = _read(filename)
+            if progress is not None:
+                progress(i + 1, total)
+        return results
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+    try:
+        pending = {pool.submit(_read, filename): i for i, filename in enumerate(filenames)}
+        done = 0
+        while pending:
+            finished, _ = wait(pending, timeout=CANCEL_POLL_S, return_when=FIRST_COMPLETED)
+            check_cancel(cancel)
+            for future in finished:
+                results[pending.pop(future)] = future.result()
+                done += 1
+            if finished and progress is not None:
+                progress(done, total)
+    finally:
+        # On error or cancel, drop queued files; running ones finish unseen
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def _united(assignments, more):
+    seen = set(assignments)
+    united = list(assignments)
+    for assignment in more:
+        if assignment not in seen:
+            seen.add(assignment)
+            united.append(assignment)
+    return united
+
+
+def merge_projects(existing, incoming):
+    """A new project combining existing with incoming; neither is modified."""
+    merged = dict(existing, start_date=existing["start_date"] or incoming["start_date"],
+                  end_date=existing["end_date"] or incoming["end_date"],
+                  personnel=_united(existing["personnel"], incoming["personnel"]),
+                  subprocesses=[])
+    by_name = {}
+    for sp in existing["subprocesses"]:
+        sp = dict(sp, personnel=list(sp["personnel"]))
+        merged["subprocesses"].append(sp)
+        by_name.setdefault(sp["name"], sp)
+    for sp in incoming["subprocesses"]:
+        match = by_name.get(sp["name"])
+        if match is None:
+            sp = dict(sp, personnel=list(sp["personnel"]))
+            merged["subprocesses"].append(sp)
+            by_name[sp["name"]] = sp
+        else:
+            match["start_date"] = match["start_date"] or sp["start_date"]
+            match["end_date"] = match["end_date"] or sp["end_date"]
+            match["personnel"] = _united(match["personnel"], sp["personnel"])
+    return merged
+
+
+def _free_name(name, taken):
+    n = 2
+    while f"{name} ({n})" in taken:
+        n += 1
+    return f"{name} ({n})"
+
+
+def merge(personnel, projects, incoming, policy="merge"):
+    """Combine (personnel, projects) with each (personnel, projects) in incoming.
+
+    Returns (personnel, projects, counts), where counts tallies what happened
+    to the incoming projects: added, merged, replaced, kept or renamed.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy!r}")
+    personnel = set(personnel)
+    projects = list(projects)
+    position = {}
+    for i, project in enumerate(projects):
+        position.setdefault(project["name"], i)
+    counts = Counter()
+    for file_personnel, file_projects in incoming:
+        personnel.update(file_personnel)
+        for project in file_projects:
+            i = position.get(project["name"])
+            if i is None:
+                position[project["name"]] = len(projects)
+                projects.append(project)
+                counts["added"] += 1
+            elif policy == "merge":
+                projects[i] = merge_projects(projects[i], project)
+                counts["merged"] += 1
+            elif policy == "replace":
+                projects[i] = project
+                counts["replaced"] += 1
+            elif policy == "keep":
+                counts["kept"] += 1
+            else:
+                # A copy, not the same project: it gets an id of its own
+                project = dict(project, name=_free_name(project["name"], position), id=new_id())
+                position[project["name"]] = len(projects)
+                projects.append(project)
+                counts["renamed"] += 1
+    return personnel, projects, counts
+
+
+def merge_into(store, incoming, policy="merge"):
+    """Merge parsed files into store as one load (a single undo step)."""
+    personnel, projects, counts = merge(store.personnel, list(store.iter_projects()),
+                                        incoming, policy)
+    store.load(personnel, projects)
+    return counts
+
+
+def describe(counts):
+    """Summary of merge() counts, e.g. 12 added, 3 merged."""
+    parts = [f"{counts[key]} {key}" for key in ("added", "merged", "replaced", "kept", "renamed")
+             if counts[key]]
+    return ", ".join(parts) or "nothing to merge"
@@ -0,0 +1,132 @@
+"""Timing spans for user-level operations, and on-demand profiling.
+
+    with span("Import CSV", file=filename):
+        ...
+
+    @timed("Refresh Project List")
+    def update_project_list(self):
+        ...
+
+Each finished span is a dict: name, start (epoch seconds), ms, depth (how
+many spans it runs inside, on its thread) and any details given. The most
+recent ones are kept in memory for the performance window; after log_to()
+they are also written as JSON lines to a rotating log file. A span costs two
+perf_counter() calls and an append, so spans can stay in place for good.
+
+start_profile() and stop_profile() wrap cProfile for a closer look at
+whatever the user does in between.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+RECENT = 1000
+SLOW_MS = 100
+LOG_BYTES = 1_000_000
+LOG_BACKUPS = 3
+
+
+class PerfLog:
+    def __init__(self, capacity=RECENT):
+        self.spans = deque(maxlen=capacity)
+        self.count = 0  # Spans finished so far; tells a viewer when to refresh
+        self._local = threading.local()
+        self._logger = None
+        self._profiler = None
+
+    # ---------------- Spans ----------------
+    @contextmanager
+    def span(self, name, **details):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield details  # Callers may add details, e.g. a row count
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self._local.depth = depth
+            self._finish(dict(details, name=name, start=wall, ms=ms, depth=depth))
+
+    def timed(self, name):
+        """Decorator: run every call of the function inside span(name)."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _finish(self, record):
+        self.spans.append(record)
+        self.count += 1
+        if self._logger is not None:
+            self._logger.info(json.dumps(record, default=str))
+
+    def slow(self, min_ms=SLOW_MS):
+        """Recent spans that took at least min_ms, newest first."""
+        return [s for s in reversed(self.spans) if s["ms"] >= min_ms]
+
+    def clear(self):
+        self.spans.clear()
+
+    # ---------------- Log file ----------------
+    def log_to(self, filename, max_bytes=LOG_BYTES, backups=LOG_BACKUPS):
+        """Append every span to filename as a JSON line, rotating it at max_bytes."""
+        self.close_log()
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger(f"{__name__}.{id(self)}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        self._logger = logger
+
+    def close_log(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            self._logger = None
+
+    # ---------------- Profiling ----------------
+    @property
+    def profiling(self):
+        return self._profiler is not None
+
+    def start_profile(self):
+        """Profile the calling thread (the GUI's) until stop_profile()."""
+        if self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop_profile(self, filename=None, top=30):
+        """Stop profiling; save the stats to filename if given (for snakeviz,
+        pstats and the like) and return the top functions by cumulative time."""
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return ""
+        profiler.disable()
+        if filename:
+            profiler.dump_stats(filename)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
+
+
+# The application's log; span() and timed() record into it
+TRACE = PerfLog()
+span = TRACE.span
+timed = TRACE.timed
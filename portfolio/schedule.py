@@ -0,0 +1,330 @@
+"""Interval index over project and sub-process dates.
+
+Answers "what is active between these two dates" and "what is overdue"
+without re-parsing date strings across the whole portfolio. Dates are parsed
+once, when a record is indexed, and the index follows the store's
+notifications, so an edit re-indexes only the record it touched.
+
+Intervals with an end date are kept sorted by start date in blocks of up to
+2 * BLOCK entries, with a segment tree over each block's largest end date. A
+query bisects to the last block starting inside the window, and the tree
+hands it just the blocks before that which reach into the window; within a
+block it stops at the first start past the window. Open-ended records, which
+reach into every window after their start, are a list of their own sorted by
+start, so they take one bisect. A query thus costs a few logarithms plus the
+blocks holding what it finds.
+
+End dates are also kept in one sorted list, for the overall span, and those of
+records neither completed nor aborted in another, so finding what is overdue
+is a single bisect plus the records found.
+
+Archived projects are indexed as they are loaded, and the queries load the
+rest first.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from heapq import merge
+
+from .dates import date_ordinal, parse_date
+from .store import CLOSED_STATUSES
+
+BLOCK = 64
+REBUILD_AT = 512  # Projects loaded at once from the archive that warrant a rebuild
+OPEN_END = date.max.toordinal()  # Started, with no end date yet
+
+
+def _ordinal(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, date):
+        return value.toordinal()
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError("A date is required")
+    return parsed.toordinal()
+
+
+def record_interval(record):
+    """(start, end) ordinals for a project or sub-process, or None if undated.
+
+    A record with only an end date is a single day; one with only a start date
+    runs open-ended.
+    """
+    start = date_ordinal(record["start_date"])
+    end = date_ordinal(record["end_date"])
+    if start is None and end is None:
+        return None
+    if start is None:
+        start = end
+    if end is None:
+        end = OPEN_END
+    return start, max(start, end)
+
+
+class _MaxTree:
+    """The largest of a list of numbers over any stretch of it, as a segment
+    tree: positions holding at least some value are found without visiting
+    the others."""
+
+    def __init__(self, values=()):
+        self.reset(values)
+
+    def reset(self, values):
+        values = list(values)
+        size = 1
+        while size < len(values):
+            size *= 2
+        tree = [-1] * (2 * size)  # Below any ordinal
+        tree[size:size + len(values)] = values
+        for i in range(size - 1, 0, -1):
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+        self._size, self._tree = size, tree
+
+    def set(self, i, value):
+        tree = self._tree
+        i += self._size
+        tree[i] = value
+        i //= 2
+        while i:
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+            i //= 2
+
+    def at_least(self, value, stop):
+        """Yield, in order, every position before stop holding value or more."""
+        tree, size = self._tree, self._size
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= stop or tree[node] < value:
+                continue
+            if node >= size:
+                yield lo
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+
+
+class ScheduleIndex:
+    def __init__(self, store):
+        self.store = store
+        # Records with an end date
+        self._blocks = []    # lists of (start, end, key), sorted, concatenated in order
+        self._firsts = []    # first entry of each block
+        self._max_ends = []  # largest end in each block
+        self._tree = _MaxTree()  # over _max_ends
+        self._open = []      # sorted (start, OPEN_END, key) for open-ended records
+        self._ends = []      # sorted (end, key) for records with an end date
+        self._due = {}       # key -> end, for open records with an end date
+        self._due_ends = []  # sorted (end, key) of _due
+        self._entries = {}   # key -> (start, end, key)
+        self._records = {}   # key -> (project, subprocess-or-None)
+        store.subscribe(self.on_store_changed)
+        self.rebuild()
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self):
+        self._entries = {}
+        self._records = {}
+        for project in self.store.loaded_projects():
+            self._remember(project, None)
+            for sp in project["subprocesses"]:
+                self._remember(project, sp)
+        entries = sorted(self._entries.values())
+        self._open = [e for e in entries if e[1] == OPEN_END]
+        closed = [e for e in entries if e[1] != OPEN_END]
+        self._blocks = [closed[i:i + BLOCK] for i in range(0, len(closed), BLOCK)]
+        self._firsts = [block[0] for block in self._blocks]
+        self._max_ends = [max(e[1] for e in block) for block in self._blocks]
+        self._tree.reset(self._max_ends)
+        self._ends = sorted((e[1], e[2]) for e in closed)
+        self._due = {}
+        for start, end, key in entries:
+            project, sp = self._records[key]
+            record = sp if sp is not None else project
+            if end != OPEN_END and record["status"] not in CLOSED_STATUSES:
+                self._due[key] = end
+        self._due_ends = sorted((end, key) for key, end in self._due.items())
+
+    # ---------------- Maintenance ----------------
+    def _remember(self, project, sp):
+        record = sp if sp is not None else project
+        interval = record_interval(record)
+        if interval is None:
+            return None
+        key = id(record)
+        entry = self._entries[key] = (interval[0], interval[1], key)
+        self._records[key] = (project, sp)
+        return entry
+
+    def _track_due(self, record):
+        self._untrack_due(record)
+        entry = self._entries.get(id(record))
+        if entry is not None and entry[1] != OPEN_END and record["status"] not in CLOSED_STATUSES:
+            self._due[entry[2]] = entry[1]
+            insort(self._due_ends, (entry[1], entry[2]))
+
+    def _untrack_due(self, record):
+        key = id(record)
+        end = self._due.pop(key, None)
+        if end is not None:
+            del self._due_ends[bisect_left(self._due_ends, (end, key))]
+
+    def _block_for(self, entry):
+        return max(bisect_right(self._firsts, entry) - 1, 0)
+
+    def add(self, project, sp=None):
+        entry = self._remember(project, sp)
+        if entry is None:
+            return
+        self._track_due(sp if sp is not None else project)
+        if entry[1] == OPEN_END:
+            insort(self._open, entry)
+            return
+        insort(self._ends, (entry[1], entry[2]))
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._firsts.append(entry)
+            self._max_ends.append(entry[1])
+            self._tree.reset(self._max_ends)
+            return
+        i = self._block_for(entry)
+        block = self._blocks[i]
+        insort(block, entry)
+        self._firsts[i] = block[0]
+        if entry[1] > self._max_ends[i]:
+            self._max_ends[i] = entry[1]
+            self._tree.set(i, entry[1])
+        if len(block) > 2 * BLOCK:
+            tail = block[BLOCK:]
+            del block[BLOCK:]
+            self._blocks.insert(i + 1, tail)
+            self._firsts.insert(i + 1, tail[0])
+            self._max_ends[i] = max(e[1] for e in block)
+            self._max_ends.insert(i + 1, max(e[1] for e in tail))
+            self._tree.reset(self._max_ends)
+
+    def remove(self, record):
+        key = id(record)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        del self._records[key]
+        self._untrack_due(record)
+        if entry[1] == OPEN_END:
+            del self._open[bisect_left(self._open, entry)]
+            return
+        del self._ends[bisect_left(self._ends, (entry[1], key))]
+        i = self._block_for(entry)
+        block = self._blocks[i]
+        del block[bisect_left(block, entry)]
+        if not block:
+            del self._blocks[i], self._firsts[i], self._max_ends[i]
+            self._tree.reset(self._max_ends)
+            return
+        self._firsts[i] = block[0]
+        if entry[1] == self._max_ends[i]:
+            self._max_ends[i] = max(e[1] for e in block)
+            self._tree.set(i, self._max_ends[i])
+
+    def update(self, project, sp=None):
+        self.remove(sp if sp is not None else project)
+        self.add(project, sp)
+
+    def add_project(self, project):
+        self.add(project)
+        for sp in project["subprocesses"]:
+            self.add(project, sp)
+
+    def remove_project(self, project):
+        self.remove(project)
+        for sp in project["subprocesses"]:
+            self.remove(sp)
+
+    def on_store_changed(self, event, details):
+        if event == "reset":
+            self.rebuild()
+        elif event == "archive_loaded":
+            projects = details["projects"]
+            if len(projects) > REBUILD_AT:
+                self.rebuild()  # Cheaper than inserting them one at a time
+            else:
+                for project in projects:
+                    self.add_project(project)
+        elif event == "project_added":
+            self.add_project(details["project"])
+        elif event == "project_removed":
+            self.remove_project(details["project"])
+        elif event == "project_updated":
+            if "start_date" in details["old"] or "end_date" in details["old"]:
+                self.update(details["project"])
+            elif "status" in details["old"]:
+                self._track_due(details["project"])
+        elif event == "subprocess_added":
+            self.add(details["project"], details["subprocess"])
+        elif event == "subprocess_updated":
+            if "start_date" in details["old"] or "end_date" in details["old"]:
+                self.update(details["project"], details["subprocess"])
+            elif "status" in details["old"]:
+                self._track_due(details["subprocess"])
+        elif event == "subprocess_removed":
+            self.remove(details["subprocess"])
+
+    # ---------------- Queries ----------------
+    def interval(self, record):
+        """(start, end) ordinals of an indexed record, or None."""
+        entry = self._entries.get(id(record))
+        return entry[:2] if entry is not None else None
+
+    def span(self):
+        """(earliest start, latest end) over everything dated, or None.
+
+        Open-ended records count up to their start.
+        """
+        self.store.load_archive()
+        if not self._entries:
+            return None
+        earliest = min(first[0] for first in (self._firsts[:1] + self._open[:1]))
+        # Records with an end date never end before they start
+        latest = max(last[0] for last in (self._ends[-1:] + self._open[-1:]))
+        return earliest, latest
+
+    def iter_overlapping(self, start, end):
+        """Yield (start, end, project, subprocess-or-None) for every record whose
+        dates intersect [start, end], in start-date order. Bounds are ordinals."""
+        self.store.load_archive()
+        records = self._records
+        # Every open-ended record starting by the end of the window is in it
+        started = self._open[:bisect_right(self._open, (end, OPEN_END + 1))]
+        for s, e, key in merge(self._iter_closed(start, end), started):
+            project, sp = records[key]
+            yield s, e, project, sp
+
+    def _iter_closed(self, start, end):
+        stop = bisect_right(self._firsts, (end, OPEN_END))
+        for i in self._tree.at_least(start, stop):
+            for entry in self._blocks[i]:
+                if entry[0] > end:
+                    break
+                if entry[1] >= start:
+                    yield entry
+
+    def active_between(self, start, end):
+        """[(project, subprocess-or-None)] active at any point from start to end.
+
+        Bounds are dates, ISO strings or ordinals, both inclusive.
+        """
+        return [(project, sp) for _, _, project, sp in
+                self.iter_overlapping(_ordinal(start), _ordinal(end))]
+
+    def overdue(self, today=None):
+        """[(project, subprocess-or-None)] past their end date and neither
+        completed nor aborted, latest end first."""
+        self.store.load_archive()
+        i = bisect_left(self._due_ends, (_ordinal(today or date.today()),))
+        return [self._records[key] for _, key in reversed(self._due_ends[:i])]
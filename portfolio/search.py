@@ -0,0 +1,161 @@
+"""Incrementally maintained full-text index over the portfolio.
+
+Each project is indexed as one document made of its name and status, its
+sub-processes' names and statuses, and the names and roles of everyone
+assigned to it or to its sub-processes. A change to a project re-indexes that
+project only; the index is never rebuilt from scratch except on a store
+reset. Inside a batch, each changed project is re-indexed once, when the
+batch finishes, however many changes it had.
+
+Archived projects are indexed as they are loaded; a search loads the rest
+first, so it always covers the whole portfolio.
+"""
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def project_terms(project):
+    terms = Counter()
+    terms.update(tokenize(project["name"]))
+    terms.update(tokenize(project["status"]))
+    for person, role in project["personnel"]:
+        terms.update(tokenize(person))
+        terms.update(tokenize(role))
+    for sp in project["subprocesses"]:
+        terms.update(tokenize(sp["name"]))
+        terms.update(tokenize(sp["status"]))
+        for person, role in sp["personnel"]:
+            terms.update(tokenize(person))
+            terms.update(tokenize(role))
+    return terms
+
+
+class SearchIndex:
+    """Token -> projects postings plus a sorted vocabulary for prefix lookups."""
+
+    def __init__(self, store):
+        self.store = store
+        self._postings = {}   # token -> {id(project): project}
+        self._terms = {}      # id(project) -> set of tokens it is posted under
+        self._vocabulary = []  # sorted tokens, for prefix matching
+        self._pending = None   # id(project) -> project to re-index when the batch finishes
+        store.subscribe(self.on_store_changed)
+        self.rebuild()
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    def rebuild(self):
+        self._postings = {}
+        self._terms = {}
+        self._vocabulary = None  # Sorted once at the end instead of per insert
+        for project in self.store.loaded_projects():
+            self._add_terms(project, set(project_terms(project)))
+        self._vocabulary = sorted(self._postings)
+
+    def add_projects(self, projects):
+        self._vocabulary = None
+        for project in projects:
+            self._add_terms(project, set(project_terms(project)))
+        self._vocabulary = sorted(self._postings)
+
+    # ---------------- Maintenance ----------------
+    def _add_terms(self, project, tokens):
+        key = id(project)
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                if self._vocabulary is not None:
+                    insort(self._vocabulary, token)
+            posting[key] = project
+        self._terms.setdefault(key, set()).update(tokens)
+
+    def _remove_terms(self, project, tokens):
+        key = id(project)
+        for token in tokens:
+            posting = self._postings[token]
+            del posting[key]
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+        if key in self._terms:
+            self._terms[key] -= tokens
+
+    def reindex(self, project):
+        new = set(project_terms(project))
+        old = self._terms.get(id(project), set())
+        stale, added = old - new, new - old
+        self._remove_terms(project, stale)
+        self._add_terms(project, added)
+
+    def remove(self, project):
+        self._remove_terms(project, set(self._terms.get(id(project), ())))
+        self._terms.pop(id(project), None)
+
+    def on_store_changed(self, event, details):
+        if event == "batch_started":
+            self._pending = {}
+        elif event == "batch_finished":
+            pending, self._pending = self._pending or {}, None
+            for project in pending.values():
+                self.reindex(project)
+        elif event == "reset":
+            self.rebuild()
+            if self._pending is not None:
+                self._pending = {}
+        elif event == "archive_loaded":
+            self.add_projects(details["projects"])
+        elif event == "project_moved":
+            return
+        elif event == "project_removed":
+            if self._pending is not None:
+                self._pending.pop(id(details["project"]), None)
+            self.remove(details["project"])
+        elif "project" in details:
+            # Additions, field edits, sub-process and assignment changes
+            if self._pending is not None:
+                self._pending[id(details["project"])] = details["project"]
+            else:
+                self.reindex(details["project"])
+
+    # ---------------- Queries ----------------
+    def _prefix_matches(self, prefix):
+        matches = {}
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            matches.update(self._postings[vocabulary[i]])
+            i += 1
+        return matches
+
+    def search(self, text):
+        """Return {id(project): project} matching every word of text as a prefix,
+        or None if text has no words (no filter)."""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        self.store.load_archive()
+        # Most selective (longest) prefixes first keeps intersections small
+        tokens.sort(key=len, reverse=True)
+        result = self._prefix_matches(tokens[0])
+        for token in tokens[1:]:
+            if not result:
+                break
+            matches = self._prefix_matches(token)
+            result = {key: p for key, p in result.items() if key in matches}
+        return result
+
+    def filter(self, text, projects):
+        """The subset of projects matching text, in their original order."""
+        matches = self.search(text)
+        if matches is None:
+            return projects
+        return [p for p in projects if id(p) in matches]
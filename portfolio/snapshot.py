@@ -0,0 +1,414 @@
+"""Binary portfolio snapshots for fast local save/load.
+
+CSV stays the interchange format. A snapshot is a string table followed by
+fixed-width little-endian uint32 columns, so a reader can mmap the file and
+index straight into it:
+
+    header          magic, 16-byte token, section counts
+    string offsets  n_strings + 1 prefix offsets into the blob
+    string blob     UTF-8, each distinct string stored once, padded to 4 bytes
+    personnel       string ids
+    projects        name, status, start, end, id columns (string ids), then
+                    sub-process and assignment offset columns (n + 1 each)
+    sub-processes   name, status, start, end, id columns, assignment offsets
+    assignments     person, role columns for project-level assignments,
+                    then the same for sub-process assignments
+
+Projects are stored active first, then completed, in list order, so the
+completed ones form a trailing run that can be left on disk (see archive.py).
+
+Version 1 snapshots, which have no id columns, are still read; their records
+get new ids as they are built.
+"""
+import gc
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import chain
+
+from .store import new_project, new_subprocess
+
+MAGIC = b"PMSNAP02"
+MAGIC_V1 = b"PMSNAP01"
+FIELDS = ("name", "status", "start_date", "end_date", "id")
+_HEADER = struct.Struct("<8s16s7I")
+_SWAP = sys.byteorder != "little"
+FIND_LIMIT = 32  # Strings looked up by searching the blob rather than decoding it all
+
+
+def _pad4(n):
+    return (n + 3) & ~3
+
+
+def is_snapshot(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) in (MAGIC, MAGIC_V1)
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array('I', [0])
+        self.blob = bytearray()
+
+    def id(self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.ids)
+            self.blob += s.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return i
+
+
+def write_snapshot(store, filename, token=b""):
+    strings = _StringTable()
+    sid = strings.id
+
+    personnel = array('I', (sid(p) for p in sorted(store.personnel)))
+    p_cols = [array('I') for _ in FIELDS]
+    p_sp_offsets = array('I', [0])
+    p_asg_offsets = array('I', [0])
+    sp_cols = [array('I') for _ in FIELDS]
+    sp_asg_offsets = array('I', [0])
+    pa_person, pa_role = array('I'), array('I')
+    sa_person, sa_role = array('I'), array('I')
+
+    for project in store.iter_projects(load=False):
+        for col, key in zip(p_cols, FIELDS):
+            col.append(sid(project[key]))
+        for person, role in project["personnel"]:
+            pa_person.append(sid(person))
+            pa_role.append(sid(role))
+        p_asg_offsets.append(len(pa_person))
+        for sp in project["subprocesses"]:
+            for col, key in zip(sp_cols, FIELDS):
+                col.append(sid(sp[key]))
+            for person, role in sp["personnel"]:
+                sa_person.append(sid(person))
+                sa_role.append(sid(role))
+            sp_asg_offsets.append(len(sa_person))
+        p_sp_offsets.append(len(sp_cols[0]))
+
+    blob = bytes(strings.blob) + b"\0" * (_pad4(len(strings.blob)) - len(strings.blob))
+    sections = [strings.offsets, blob, personnel, *p_cols, p_sp_offsets, p_asg_offsets,
+                *sp_cols, sp_asg_offsets, pa_person, pa_role, sa_person, sa_role]
+    header = _HEADER.pack(MAGIC, token.ljust(16, b"\0")[:16], len(strings.ids), len(strings.blob),
+                          len(personnel), len(p_cols[0]), len(sp_cols[0]), len(pa_person), len(sa_person))
+
+    tmp_name = filename + ".part"
+    with open(tmp_name, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            if _SWAP and isinstance(section, array):
+                section = array('I', section)
+                section.byteswap()
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_name, filename)
+
+
+class SnapshotReader:
+    """Memory-mapped view of a snapshot.
+
+    Columns are uint32 views into the mapping, and strings are decoded on first
+    use. project(i) materializes a single project and projects(start, stop) a
+    range of them. load() builds the whole portfolio, decoding each distinct
+    string only once. tally() and assigning() answer from the columns alone.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        (magic, self.token, n_strings, blob_len, n_personnel, n_projects, n_subprocesses,
+         n_project_assignments, n_sp_assignments) = _HEADER.unpack_from(self._mm, 0)
+        if magic not in (MAGIC, MAGIC_V1):
+            self.close()
+            raise ValueError(f"{filename} is not a portfolio snapshot")
+        n_fields = len(FIELDS) if magic == MAGIC else len(FIELDS) - 1
+
+        self._data = self._track(memoryview(self._mm))
+        self._pos = _HEADER.size
+        self._string_offsets = self._column(n_strings + 1)
+        self._blob_span = (self._pos, self._pos + blob_len)
+        self._blob = self._track(self._data[self._pos:self._pos + blob_len])
+        self._pos += _pad4(blob_len)
+        self._personnel = self._column(n_personnel)
+        self._p_cols = [self._column(n_projects) for _ in range(n_fields)]
+        self._p_sp_offsets = self._column(n_projects + 1)
+        self._p_asg_offsets = self._column(n_projects + 1)
+        self._sp_cols = [self._column(n_subprocesses) for _ in range(n_fields)]
+        self._sp_asg_offsets = self._column(n_subprocesses + 1)
+        self._pa = [self._column(n_project_assignments) for _ in range(2)]
+        self._sa = [self._column(n_sp_assignments) for _ in range(2)]
+        self._strings = [None] * n_strings
+        self._decoded = False  # Every string in _strings
+        self._string_ids = None
+
+    def _track(self, view):
+        self._views.append(view)
+        return view
+
+    def _column(self, count):
+        raw = self._data[self._pos:self._pos + 4 * count]
+        self._pos += 4 * count
+        if _SWAP:
+            col = array('I', bytes(raw))
+            col.byteswap()
+            raw.release()
+            return col
+        self._track(raw)
+        return self._track(raw.cast('I'))
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._p_cols[0])
+
+    def string(self, i):
+        s = self._strings[i]
+        if s is None:
+            s = self._strings[i] = str(self._blob[self._string_offsets[i]:self._string_offsets[i + 1]], 'utf-8')
+        return s
+
+    def _all_strings(self):
+        if not self._decoded:
+            blob = bytes(self._blob)
+            offsets = self._string_offsets.tolist()
+            self._strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+                             for i in range(len(offsets) - 1)]
+            self._decoded = True
+        return self._strings
+
+    def _decode(self, ids):
+        """The string list, with at least the strings of ids decoded."""
+        strings = self._strings
+        if self._decoded:
+            return strings
+        missing = {i for i in ids if strings[i] is None}
+        if 2 * len(missing) > len(strings):
+            return self._all_strings()
+        blob, offsets = self._blob, self._string_offsets
+        for i in missing:
+            strings[i] = str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+        return strings
+
+    def _find_string(self, text):
+        """String id of text, or None, found by searching the blob for its
+        bytes instead of decoding the table."""
+        target = text.encode('utf-8')
+        offsets = self._string_offsets
+        if not target:
+            for i in range(len(offsets) - 1):
+                if offsets[i] == offsets[i + 1]:
+                    return i
+            return None
+        lo, hi = self._blob_span
+        pos = self._mm.find(target, lo, hi)
+        while pos != -1:
+            # A match counts only where a string starts and ends with it
+            i = bisect_left(offsets, pos - lo)
+            while i < len(offsets) - 1 and offsets[i] == pos - lo:
+                if offsets[i + 1] - offsets[i] == len(target):
+                    return i
+                i += 1
+            pos = self._mm.find(target, pos + 1, hi)
+        return None
+
+    def _ids_of(self, texts):
+        """String ids of whichever of texts are in the table."""
+        texts = set(texts)
+        if self._string_ids is None and len(texts) <= FIND_LIMIT:
+            return {i for i in map(self._find_string, texts) if i is not None}
+        if self._string_ids is None:
+            self._string_ids = {s: i for i, s in enumerate(self._all_strings())}
+        return {self._string_ids[s] for s in texts if s in self._string_ids}
+
+    def personnel(self):
+        return {self.string(i) for i in self._personnel}
+
+    def _ranges(self, start, stop):
+        """Sub-process, project assignment and sub-process assignment ranges
+        belonging to projects start to stop."""
+        sp_lo, sp_hi = self._p_sp_offsets[start], self._p_sp_offsets[stop]
+        return ((sp_lo, sp_hi), (self._p_asg_offsets[start], self._p_asg_offsets[stop]),
+                (self._sp_asg_offsets[sp_lo], self._sp_asg_offsets[sp_hi]))
+
+    def project(self, i):
+        s = self.string
+        project = new_project(*(s(col[i]) for col in self._p_cols))
+        persons, roles = self._pa
+        project["personnel"] = [(s(persons[a]), s(roles[a]))
+                                for a in range(self._p_asg_offsets[i], self._p_asg_offsets[i + 1])]
+        sp_persons, sp_roles = self._sa
+        sp_offsets = self._sp_asg_offsets
+        for j in range(self._p_sp_offsets[i], self._p_sp_offsets[i + 1]):
+            sp = new_subprocess(*(s(col[j]) for col in self._sp_cols))
+            sp["personnel"] = [(s(sp_persons[a]), s(sp_roles[a]))
+                               for a in range(sp_offsets[j], sp_offsets[j + 1])]
+            project["subprocesses"].append(sp)
+        return project
+
+    def load(self):
+        """Return (personnel, projects) for the whole snapshot."""
+        return self.personnel(), self.projects()
+
+    def projects(self, start=0, stop=None):
+        """Build projects start to stop.
+
+        Works column by column: each distinct string is decoded once, and
+        assignment and sub-process lists are sliced out of flat columns.
+        """
+        if stop is None:
+            stop = len(self)
+        # Nothing built here is cyclic; stop the collector from rescanning
+        # the growing heap on every few hundred allocations.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._build(start, stop)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _build(self, start, stop):
+        (sp_lo, sp_hi), (pa_lo, pa_hi), (sa_lo, sa_hi) = self._ranges(start, stop)
+        # Only the strings these projects use are decoded
+        sa_ids, sp_ids, pa_ids, p_ids = ([col[lo:hi].tolist() for col in cols] for cols, lo, hi in (
+            (self._sa, sa_lo, sa_hi), (self._sp_cols, sp_lo, sp_hi),
+            (self._pa, pa_lo, pa_hi), (self._p_cols, start, stop)))
+        strings = self._decode(chain.from_iterable(sa_ids + sp_ids + pa_ids + p_ids))
+
+        def texts(ids):
+            return [strings[i] for i in ids]
+
+        sp_assignments = list(zip(*(texts(ids) for ids in sa_ids)))
+        sa_offsets = [a - sa_lo for a in self._sp_asg_offsets[sp_lo:sp_hi + 1].tolist()]
+        subprocesses = []
+        for j, fields in enumerate(zip(*(texts(ids) for ids in sp_ids))):
+            sp = new_subprocess(*fields)
+            sp["personnel"] = sp_assignments[sa_offsets[j]:sa_offsets[j + 1]]
+            subprocesses.append(sp)
+
+        project_assignments = list(zip(*(texts(ids) for ids in pa_ids)))
+        pa_offsets = [a - pa_lo for a in self._p_asg_offsets[start:stop + 1].tolist()]
+        sp_offsets = [j - sp_lo for j in self._p_sp_offsets[start:stop + 1].tolist()]
+        projects = []
+        for i, fields in enumerate(zip(*(texts(ids) for ids in p_ids))):
+            project = new_project(*fields)
+            project["personnel"] = project_assignments[pa_offsets[i]:pa_offsets[i + 1]]
+            project["subprocesses"] = subprocesses[sp_offsets[i]:sp_offsets[i + 1]]
+            projects.append(project)
+        return projects
+
+    # ---------------- Column scans ----------------
+    def archive_start(self):
+        """Where the trailing run of completed projects begins (len(self) if
+        there is none)."""
+        completed = self._find_string("Completed")
+        if completed is None:
+            return len(self)
+        statuses = self._p_cols[1].tolist()
+        i = len(statuses)
+        while i and statuses[i - 1] == completed:
+            i -= 1
+        return i
+
+    def tally(self, start=0, stop=None):
+        """Counts over projects start to stop, without building them.
+
+        Returns Counters of project statuses, sub-process statuses and
+        assignments per person, and one of (status, end date) over the
+        projects and sub-processes together.
+        """
+        if stop is None:
+            stop = len(self)
+        s = self.string
+        (sp_lo, sp_hi), (pa_lo, pa_hi), (sa_lo, sa_hi) = self._ranges(start, stop)
+
+        def counts(ids):
+            return Counter({s(i): n for i, n in Counter(ids).items()})
+
+        p_status = self._p_cols[1][start:stop].tolist()
+        sp_status = self._sp_cols[1][sp_lo:sp_hi].tolist()
+        people = counts(self._pa[0][pa_lo:pa_hi].tolist() + self._sa[0][sa_lo:sa_hi].tolist())
+        ends = Counter(zip(p_status, self._p_cols[3][start:stop].tolist()))
+        ends.update(zip(sp_status, self._sp_cols[3][sp_lo:sp_hi].tolist()))
+        return (counts(p_status), counts(sp_status), people,
+                Counter({(s(status), s(end)): n for (status, end), n in ends.items()}))
+
+    def assigning(self, names, start=0, stop=None):
+        """Indexes of the projects from start to stop that assign anyone in
+        names, at project or sub-process level."""
+        if stop is None:
+            stop = len(self)
+        wanted = self._ids_of(names)
+        if not wanted:
+            return set()
+        _, (pa_lo, pa_hi), (sa_lo, sa_hi) = self._ranges(start, stop)
+        found = set()
+        for a, person in enumerate(self._pa[0][pa_lo:pa_hi].tolist(), pa_lo):
+            if person in wanted:
+                found.add(bisect_right(self._p_asg_offsets, a) - 1)
+        for a, person in enumerate(self._sa[0][sa_lo:sa_hi].tolist(), sa_lo):
+            if person in wanted:
+                sp = bisect_right(self._sp_asg_offsets, a) - 1
+                found.add(bisect_right(self._p_sp_offsets, sp) - 1)
+        return found
+
+    def named(self, names, start=0, stop=None):
+        """Indexes of the projects from start to stop called any of names."""
+        if stop is None:
+            stop = len(self)
+        wanted = self._ids_of(names)
+        if not wanted:
+            return set()
+        return {i for i, name in enumerate(self._p_cols[0][start:stop].tolist(), start)
+                if name in wanted}
+
+    def with_ids(self, ids, start=0, stop=None):
+        """Indexes of the projects from start to stop whose own id, or one of
+        whose sub-processes' ids, is in ids."""
+        if stop is None:
+            stop = len(self)
+        wanted = self._ids_of(ids) if len(self._p_cols) == len(FIELDS) else None
+        if not wanted:
+            return set()
+        (sp_lo, sp_hi), _, _ = self._ranges(start, stop)
+        found = {i for i, pid in enumerate(self._p_cols[4][start:stop].tolist(), start)
+                 if pid in wanted}
+        for j, sid in enumerate(self._sp_cols[4][sp_lo:sp_hi].tolist(), sp_lo):
+            if sid in wanted:
+                found.add(bisect_right(self._p_sp_offsets, j) - 1)
+        return found
+
+    def assigned_people(self, start=0, stop=None):
+        """Everyone assigned anywhere in projects start to stop."""
+        if stop is None:
+            stop = len(self)
+        _, (pa_lo, pa_hi), (sa_lo, sa_hi) = self._ranges(start, stop)
+        ids = set(self._pa[0][pa_lo:pa_hi].tolist())
+        ids.update(self._sa[0][sa_lo:sa_hi].tolist())
+        return {self.string(i) for i in ids}
+
+
+def read_snapshot(filename):
+    with SnapshotReader(filename) as reader:
+        return reader.load()
@@ -0,0 +1,113 @@
+"""The project lists in a chosen order, kept sorted as the store changes.
+
+SortedProjects holds the active and completed projects sorted by one of
+SORT_KEYS, leaving the store's own (manual) order alone. Each project's key
+is computed once and cached; an edit moves just that project to its new place
+by binary search, so nothing is re-sorted after the first time.
+
+update() is fed the store's notifications by its owner and returns where rows
+moved, so a list view can follow with single-row updates.
+"""
+from bisect import bisect_left
+
+# Workflow order, rather than STATUS_OPTIONS' order of appearance
+STATUS_ORDER = {status: i for i, status in enumerate(
+    ["Not Started", "In Progress", "Paused", "Aborted", "Completed"])}
+
+
+def _date_key(field):
+    # Undated projects go last
+    return lambda p: (p[field] == "", p[field])
+
+
+SORT_KEYS = {
+    "Name": lambda p: (),  # The tie-break on name is the whole order
+    "Status": lambda p: STATUS_ORDER.get(p["status"], len(STATUS_ORDER)),
+    "Start Date": _date_key("start_date"),
+    "End Date": _date_key("end_date"),
+}
+
+
+class SortedProjects:
+    """Both project lists of store in the order of SORT_KEYS[key]; ties go
+    by name, then id, so the order never depends on the manual one.
+
+    Sorting the completed list reads every archived project, once.
+    """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self._key_of = SORT_KEYS[key]
+        self.lists = {False: [], True: []}
+        self._keys = {False: [], True: []}  # Sort keys, parallel to lists
+        self._cached = {}                   # id(project) -> sort key
+        self.rebuild()
+
+    def _sort_key(self, project):
+        return (self._key_of(project), project["name"].casefold(), project["id"])
+
+    def rebuild(self):
+        self._cached = {}
+        for completed in (False, True):
+            keyed = sorted((self._cache(p), p) for p in self.store.project_list(completed))
+            self._keys[completed] = [k for k, _ in keyed]
+            self.lists[completed] = [p for _, p in keyed]
+
+    def _cache(self, project):
+        key = self._cached[id(project)] = self._sort_key(project)
+        return key
+
+    def index(self, project, completed):
+        """Position of project in the completed or active list."""
+        return bisect_left(self._keys[completed], self._cached[id(project)])
+
+    def positions(self, projects, completed):
+        """{id(project): index} for those of projects in the completed or
+        active list."""
+        keys, items = self._keys[completed], self.lists[completed]
+        found = {}
+        for project in projects:
+            key = self._cached.get(id(project))
+            if key is None:
+                continue
+            i = bisect_left(keys, key)
+            if i < len(items) and items[i] is project:
+                found[id(project)] = i
+        return found
+
+    def _insert(self, project, completed):
+        key = self._cache(project)
+        i = bisect_left(self._keys[completed], key)
+        self._keys[completed].insert(i, key)
+        self.lists[completed].insert(i, project)
+        return i
+
+    def _remove(self, project, completed):
+        i = self.index(project, completed)
+        del self._keys[completed][i]
+        del self.lists[completed][i]
+        del self._cached[id(project)]
+        return i
+
+    def update(self, event, d):
+        """Follow one store notification. Returns a list of (completed,
+        change, index...) steps for the list views: ("removed", i),
+        ("inserted", i) or ("moved", old, new); None after a reset, when
+        the lists were rebuilt."""
+        if event == "reset":
+            self.rebuild()
+            return None
+        if event == "project_added":
+            return [(d["completed"], "inserted", self._insert(d["project"], d["completed"]))]
+        if event == "project_removed":
+            return [(d["completed"], "removed", self._remove(d["project"], d["completed"]))]
+        if event == "project_updated":
+            project, old_completed, completed = d["project"], d["old_completed"], d["completed"]
+            old = self._remove(project, old_completed)
+            new = self._insert(project, completed)
+            if completed == old_completed:
+                return [(completed, "moved", old, new)]
+            return [(old_completed, "removed", old), (completed, "inserted", new)]
+        # Manual moves, sub-processes and assignments leave these keys alone
+        return []
@@ -0,0 +1,481 @@
+"""SQLite storage mode.
+
+A SQLiteBackend subscribed to a PortfolioStore turns every store notification
+into one small transaction, so an edit costs a few row writes instead of a
+full export. A batch of changes (see PortfolioStore.batch) is one transaction,
+committed when the batch finishes. The database uses WAL journaling and has
+one table per kind of record, indexed for the lookups the backend makes.
+
+Row ids are the database's own; the uid columns hold the records' "id".
+Databases made before records had ids gain the columns when opened, and
+their records get ids when next loaded.
+
+Loading builds the active projects only. The completed ones become an
+Archive (see archive.py) reading pages of them, in list order, through a
+second connection whose read transaction keeps the database as it was when
+loaded; the main connection goes on writing. In WAL mode that transaction
+holds back checkpoints, so the log grows until the archive is fully loaded.
+"""
+import sqlite3
+from collections import Counter
+
+from .archive import Archive
+from .store import new_id, new_project, new_subprocess
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS personnel (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    uid TEXT,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    position REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_by_position ON projects (completed, position);
+CREATE TABLE IF NOT EXISTS subprocesses (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    uid TEXT,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subprocesses_by_project ON subprocesses (project_id, position);
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    subprocess_id INTEGER REFERENCES subprocesses (id) ON DELETE CASCADE,
+    person TEXT NOT NULL,
+    role TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_by_owner ON assignments (project_id, subprocess_id, position);
+CREATE INDEX IF NOT EXISTS assignments_by_person ON assignments (person);
+"""
+
+FETCH_SIZE = 5000
+
+PROJECT_ROWS = ("SELECT id, uid, name, status, start_date, end_date, position FROM projects "
+                "WHERE completed = ?")
+LIST_ORDER = " ORDER BY position, id"
+MATCH_CHUNK = 400  # Values per IN (...) list, well under SQLite's variable limit
+
+
+def _rows(conn, sql, params=()):
+    cur = conn.execute(sql, params)
+    while True:
+        batch = cur.fetchmany(FETCH_SIZE)
+        if not batch:
+            return
+        yield from batch
+
+
+def _build_projects(conn, sql, params, row_ids, sort_keys):
+    """Build the projects sql selects (as PROJECT_ROWS columns, in list
+    order), with their sub-processes and assignments, noting row ids and
+    positions in row_ids and sort_keys."""
+    projects = []
+    by_id = {}
+    for pid, uid, name, status, sdate, edate, position in _rows(conn, sql, params):
+        project = new_project(name, status, sdate, edate, uid)
+        projects.append(project)
+        by_id[pid] = project
+        row_ids[id(project)] = pid
+        sort_keys[id(project)] = position
+    if not projects:
+        return projects
+    owners = f"SELECT id FROM ({sql})"
+
+    sp_by_id = {}
+    for spid, pid, uid, name, status, sdate, edate in _rows(conn,
+            "SELECT id, project_id, uid, name, status, start_date, end_date FROM subprocesses "
+            f"WHERE project_id IN ({owners}) ORDER BY project_id, position", params):
+        sp = new_subprocess(name, status, sdate, edate, uid)
+        by_id[pid]["subprocesses"].append(sp)
+        sp_by_id[spid] = sp
+        row_ids[id(sp)] = spid
+
+    for pid, spid, person, role in _rows(conn,
+            "SELECT project_id, subprocess_id, person, role FROM assignments "
+            f"WHERE project_id IN ({owners}) ORDER BY project_id, subprocess_id, position", params):
+        owner = sp_by_id[spid] if spid is not None else by_id[pid]
+        owner["personnel"].append((person, role))
+    return projects
+
+
+class _CompletedReader:
+    """The completed projects of a database as it was when loaded, read by
+    list index for an Archive.
+
+    Index ranges are pages of the (completed, position) index, found with
+    LIMIT/OFFSET, or from the end of the page before when reading on from it.
+    """
+
+    def __init__(self, backend):
+        self.filename = backend.filename
+        self._backend = backend
+        self.conn = sqlite3.connect(backend.filename, isolation_level=None)
+        self.conn.execute("BEGIN")
+        (self._count,) = self.conn.execute(
+            "SELECT count(*) FROM projects WHERE completed = 1").fetchone()
+        self._next = None  # (index, position, row id) just past the last page read
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _page(self, start, stop, sql=PROJECT_ROWS):
+        """(sql, params) selecting projects start to stop, in list order."""
+        if self._next is not None and self._next[0] == start:
+            return (sql + " AND (position, id) > (?, ?)" + LIST_ORDER + " LIMIT ?",
+                    (1, *self._next[1:], stop - start))
+        return sql + LIST_ORDER + " LIMIT ? OFFSET ?", (1, stop - start, start)
+
+    def _indexes(self, start, stop):
+        """{row id: index} for projects start to stop."""
+        sql, params = self._page(start, stop, "SELECT id, position FROM projects WHERE completed = ?")
+        return {pid: i for i, (pid, _) in enumerate(_rows(self.conn, sql, params), start)}
+
+    def projects(self, start=0, stop=None):
+        if stop is None:
+            stop = len(self)
+        sql, params = self._page(start, stop)
+        row_ids, sort_keys = self._backend._row_ids, self._backend._sort_keys
+        projects = _build_projects(self.conn, sql, params, row_ids, sort_keys)
+        if projects:
+            last = projects[-1]
+            self._next = (stop, sort_keys[id(last)], row_ids[id(last)])
+        return projects
+
+    def tally(self, start=0, stop=None):
+        """Counts over projects start to stop, as SnapshotReader.tally()."""
+        if stop is None:
+            stop = len(self)
+        sql, params = self._page(start, stop)
+        page = f"WITH page AS ({sql}) "
+        p_status, sp_status, people, ends = Counter(), Counter(), Counter(), Counter()
+        for status, end, n in self.conn.execute(
+                page + "SELECT status, end_date, count(*) FROM page GROUP BY status, end_date", params):
+            p_status[status] += n
+            ends[status, end] += n
+        for status, end, n in self.conn.execute(
+                page + "SELECT s.status, s.end_date, count(*) FROM page "
+                "JOIN subprocesses s ON s.project_id = page.id GROUP BY s.status, s.end_date", params):
+            sp_status[status] += n
+            ends[status, end] += n
+        people.update(dict(self.conn.execute(
+            page + "SELECT a.person, count(*) FROM page "
+            "JOIN assignments a ON a.project_id = page.id GROUP BY a.person", params)))
+        return p_status, sp_status, people, ends
+
+    def _matching(self, sql, values, start, stop):
+        """Indexes from start to stop of the projects whose row ids sql
+        selects, for values in place of {marks}, MATCH_CHUNK at a time."""
+        values = list(values)
+        if not values:
+            return set()
+        indexes = self._indexes(start, stop)
+        found = set()
+        for lo in range(0, len(values), MATCH_CHUNK):
+            chunk = values[lo:lo + MATCH_CHUNK]
+            query = sql.format(marks=", ".join("?" * len(chunk)))
+            for (pid,) in self.conn.execute(query, chunk * sql.count("{marks}")):
+                if pid in indexes:
+                    found.add(indexes[pid])
+        return found
+
+    def assigning(self, names, start=0, stop=None):
+        """Indexes of the projects from start to stop that assign anyone in
+        names, at project or sub-process level."""
+        return self._matching("SELECT DISTINCT project_id FROM assignments WHERE person IN ({marks})",
+                              names, start, len(self) if stop is None else stop)
+
+    def named(self, names, start=0, stop=None):
+        """Indexes of the projects from start to stop called any of names."""
+        return self._matching("SELECT id FROM projects WHERE completed = 1 AND name IN ({marks})",
+                              names, start, len(self) if stop is None else stop)
+
+    def with_ids(self, ids, start=0, stop=None):
+        """Indexes of the projects from start to stop whose own id, or one of
+        whose sub-processes' ids, is in ids."""
+        return self._matching("SELECT id FROM projects WHERE uid IN ({marks}) "
+                              "UNION SELECT project_id FROM subprocesses WHERE uid IN ({marks})",
+                              ids, start, len(self) if stop is None else stop)
+
+    def assigned_people(self, start=0, stop=None):
+        """Everyone assigned anywhere in projects start to stop."""
+        if stop is None:
+            stop = len(self)
+        sql, params = self._page(start, stop)
+        return {person for (person,) in self.conn.execute(
+            f"WITH page AS ({sql}) SELECT DISTINCT a.person FROM page "
+            "JOIN assignments a ON a.project_id = page.id", params)}
+
+
+class SQLiteBackend:
+    """Keeps a database file in step with a PortfolioStore.
+
+    Project order is kept as a REAL sort key per list, so inserting or moving
+    one project writes one row. Sub-processes and assignments are short
+    per-owner lists and use plain integer positions.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        for table in ("projects", "subprocesses"):
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if "uid" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+        self.store = None
+        self._row_ids = {}    # id(record) -> row id
+        self._sort_keys = {}  # id(project) -> position
+        self._in_batch = False
+
+    def close(self):
+        self.detach()
+        self.conn.close()
+
+    # ---------------- Store wiring ----------------
+    def attach(self, store):
+        self.store = store
+        store.subscribe(self.on_store_changed)
+
+    def detach(self):
+        if self.store is not None:
+            self.store.unsubscribe(self.on_store_changed)
+            self.store = None
+
+    # ---------------- Loading ----------------
+    def load(self):
+        """Read (personnel, projects, archive) from the database: projects are
+        the active ones in list order, archive an Archive of the completed
+        ones."""
+        self._row_ids.clear()
+        self._sort_keys.clear()
+        self._fill_uids()
+        personnel = {name for (name,) in _rows(self.conn, "SELECT name FROM personnel")}
+        personnel.update(name for (name,) in _rows(self.conn, "SELECT DISTINCT person FROM assignments"))
+        projects = _build_projects(self.conn, PROJECT_ROWS + LIST_ORDER, (0,),
+                                   self._row_ids, self._sort_keys)
+        return personnel, projects, Archive(_CompletedReader(self), 0)
+
+    def _fill_uids(self):
+        # Records from before ids existed get them now, so pages read later
+        # build them with the same ids every time
+        with self.conn:
+            for table in ("projects", "subprocesses"):
+                missing = [row for (row,) in self.conn.execute(f"SELECT id FROM {table} WHERE uid IS NULL")]
+                self.conn.executemany(f"UPDATE {table} SET uid = ? WHERE id = ?",
+                                      ((new_id(), row) for row in missing))
+
+    def save_all(self, store):
+        """Replace the database contents with the whole store in one transaction."""
+        with self.conn:
+            self._write_all(store)
+
+    def _write_all(self, store):
+        self._clear()
+        self.conn.executemany("INSERT INTO personnel (name) VALUES (?)",
+                              ((name,) for name in store.personnel))
+        for completed in (False, True):
+            for position, project in enumerate(store.project_list(completed)):
+                self._insert_project(project, completed, float(position))
+
+    def _clear(self):
+        self._row_ids.clear()
+        self._sort_keys.clear()
+        for table in ("assignments", "subprocesses", "projects", "personnel"):
+            self.conn.execute(f"DELETE FROM {table}")
+
+    # ---------------- Row writers ----------------
+    def _insert_project(self, project, completed, position):
+        cur = self.conn.execute(
+            "INSERT INTO projects (uid, name, status, start_date, end_date, completed, position) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (project["id"], project["name"], project["status"], project["start_date"],
+             project["end_date"], int(completed), position))
+        pid = cur.lastrowid
+        self._row_ids[id(project)] = pid
+        self._sort_keys[id(project)] = position
+        self._insert_assignments(pid, None, project["personnel"])
+        for sp_position, sp in enumerate(project["subprocesses"]):
+            self._insert_subprocess(pid, sp, sp_position)
+
+    def _insert_subprocess(self, pid, sp, position):
+        cur = self.conn.execute(
+            "INSERT INTO subprocesses (project_id, uid, name, status, start_date, end_date, position) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pid, sp["id"], sp["name"], sp["status"], sp["start_date"], sp["end_date"], position))
+        self._row_ids[id(sp)] = cur.lastrowid
+        self._insert_assignments(pid, cur.lastrowid, sp["personnel"])
+
+    def _insert_assignments(self, pid, spid, assignments):
+        self.conn.executemany(
+            "INSERT INTO assignments (project_id, subprocess_id, person, role, position) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((pid, spid, person, role, i) for i, (person, role) in enumerate(assignments)))
+
+    def _forget_project(self, project):
+        self._row_ids.pop(id(project), None)
+        self._sort_keys.pop(id(project), None)
+        for sp in project["subprocesses"]:
+            self._row_ids.pop(id(sp), None)
+
+    def _sort_key_at(self, completed, index):
+        """Pick a position for the project now at items[index], between its neighbours."""
+        items = self.store.project_list(completed)
+        before = self._sort_keys[id(items[index - 1])] if index > 0 else None
+        after = self._sort_keys[id(items[index + 1])] if index + 1 < len(items) else None
+        if before is None and after is None:
+            return 0.0
+        if after is None:
+            return before + 1.0
+        if before is None:
+            return after - 1.0
+        key = (before + after) / 2
+        if before < key < after:
+            return key
+        # Ran out of float precision between neighbours: renumber the list
+        self._renumber(completed, skip=index)
+        return self._sort_key_at(completed, index)
+
+    def _renumber(self, completed, skip):
+        items = self.store.project_list(completed)
+        updates = []
+        for i, project in enumerate(items):
+            if i != skip:
+                self._sort_keys[id(project)] = float(i)
+                updates.append((float(i), self._row_ids[id(project)]))
+        self.conn.executemany("UPDATE projects SET position = ? WHERE id = ?", updates)
+
+    def _owner_ids(self, project, sp):
+        pid = self._row_ids[id(project)]
+        return pid, (self._row_ids[id(sp)] if sp is not None else None)
+
+    def _shift(self, table, where, params, index, delta):
+        self.conn.execute(
+            f"UPDATE {table} SET position = position + ? WHERE {where} AND position >= ?",
+            (delta, *params, index))
+
+    # ---------------- Store notifications ----------------
+    def on_store_changed(self, event, details):
+        if event == "batch_started":
+            self._in_batch = True
+            return
+        if event == "batch_finished":
+            self._in_batch = False
+            self.conn.commit()
+            return
+        handler = getattr(self, "_on_" + event, None)
+        if handler is None:
+            return
+        if self._in_batch:
+            # The transaction sqlite3 opened at the first write stays open
+            # until the batch finishes
+            handler(**details)
+        else:
+            with self.conn:
+                handler(**details)
+
+    def _on_reset(self, previous):
+        self._write_all(self.store)
+
+    def _on_project_added(self, project, completed, index):
+        # Insert with a placeholder position, then slot it between its neighbours
+        self._insert_project(project, completed, 0.0)
+        self._set_position(project, completed, index)
+
+    def _set_position(self, project, completed, index):
+        key = self._sort_key_at(completed, index)
+        self._sort_keys[id(project)] = key
+        self.conn.execute("UPDATE projects SET completed = ?, position = ? WHERE id = ?",
+                          (int(completed), key, self._row_ids[id(project)]))
+
+    def _on_project_updated(self, project, old, completed, index, old_completed, old_index):
+        self.conn.execute(
+            "UPDATE projects SET status = ?, start_date = ?, end_date = ? WHERE id = ?",
+            (project["status"], project["start_date"], project["end_date"], self._row_ids[id(project)]))
+        if completed != old_completed:
+            self._set_position(project, completed, index)
+
+    def _on_project_removed(self, project, completed, index):
+        self.conn.execute("DELETE FROM projects WHERE id = ?", (self._row_ids[id(project)],))
+        self._forget_project(project)
+
+    def _on_project_moved(self, project, completed, old_index, index):
+        self._set_position(project, completed, index)
+
+    def _on_subprocess_added(self, project, subprocess, index):
+        pid = self._row_ids[id(project)]
+        self._shift("subprocesses", "project_id = ?", (pid,), index, 1)
+        self._insert_subprocess(pid, subprocess, index)
+
+    def _on_subprocess_updated(self, project, subprocess, old):
+        self.conn.execute(
+            "UPDATE subprocesses SET name = ?, status = ?, start_date = ?, end_date = ? WHERE id = ?",
+            (subprocess["name"], subprocess["status"], subprocess["start_date"], subprocess["end_date"],
+             self._row_ids[id(subprocess)]))
+
+    def _on_subprocess_removed(self, project, subprocess, index):
+        pid = self._row_ids[id(project)]
+        self.conn.execute("DELETE FROM subprocesses WHERE id = ?", (self._row_ids.pop(id(subprocess)),))
+        self._shift("subprocesses", "project_id = ?", (pid,), index, -1)
+
+    def _assignment_owner_clause(self, project, subprocess):
+        pid, spid = self._owner_ids(project, subprocess)
+        if spid is None:
+            return "project_id = ? AND subprocess_id IS NULL", (pid,)
+        return "subprocess_id = ?", (spid,)
+
+    def _on_assignment_added(self, project, subprocess, index, assignment):
+        where, params = self._assignment_owner_clause(project, subprocess)
+        self._shift("assignments", where, params, index, 1)
+        pid, spid = self._owner_ids(project, subprocess)
+        self.conn.execute(
+            "INSERT INTO assignments (project_id, subprocess_id, person, role, position) "
+            "VALUES (?, ?, ?, ?, ?)", (pid, spid, assignment[0], assignment[1], index))
+
+    def _on_assignment_updated(self, project, subprocess, index, assignment, old):
+        where, params = self._assignment_owner_clause(project, subprocess)
+        self.conn.execute(f"UPDATE assignments SET person = ?, role = ? WHERE {where} AND position = ?",
+                          (assignment[0], assignment[1], *params, index))
+
+    def _on_assignment_removed(self, project, subprocess, index, assignment):
+        where, params = self._assignment_owner_clause(project, subprocess)
+        self.conn.execute(f"DELETE FROM assignments WHERE {where} AND position = ?", (*params, index))
+        self._shift("assignments", where, params, index, -1)
+
+    def _on_person_added(self, name):
+        self.conn.execute("INSERT OR IGNORE INTO personnel (name) VALUES (?)", (name,))
+
+    def _on_person_renamed(self, old_name, name):
+        # Assignment rows were already rewritten by their own notifications
+        self.conn.execute("UPDATE personnel SET name = ? WHERE name = ?", (name, old_name))
+
+    def _on_person_removed(self, name):
+        self.conn.execute("DELETE FROM personnel WHERE name = ?", (name,))
+
+
+def open_database(filename, store):
+    """Load a database into store and keep it in sync from then on."""
+    backend = SQLiteBackend(filename)
+    personnel, projects, archive = backend.load()
+    store.load(personnel, projects, archive)
+    backend.attach(store)
+    return backend
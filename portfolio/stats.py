@@ -0,0 +1,193 @@
+"""Portfolio statistics kept up to date one change at a time.
+
+PortfolioStats listens to the store and adjusts its counters for each
+notification, so reading any figure never walks the portfolio: counts per
+status, assignments per person (and who has the most), sub-process completion
+per project and overall, and how many projects and sub-processes are overdue.
+
+Archived projects not loaded yet are counted from the snapshot's columns
+(store.archive_tally()), so the figures cover the whole portfolio without
+building them. When they are loaded they only gain their per-record entries;
+their counts are already in.
+"""
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date
+
+from .dates import date_ordinal
+from .store import CLOSED_STATUSES
+
+
+class PortfolioStats:
+    def __init__(self, store):
+        self.store = store
+        store.subscribe(self.on_store_changed)
+        self.rebuild()
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    def rebuild(self):
+        self.project_status = Counter()     # status -> projects
+        self.subprocess_status = Counter()  # status -> sub-processes
+        self.assignments = Counter()        # person -> assignments, project and sub-process level
+        self._people_with = {}              # assignment count -> set of people with that count
+        self._most = 0                      # highest count in assignments
+        self._completion = {}               # id(project) -> [completed sub-processes, sub-processes]
+        self._due = {}                      # id(record) -> end ordinal, for open records with an end date
+        self._due_dates = []                # sorted values of _due
+        for project in self.store.loaded_projects():
+            self._add_project(project)
+        tally = self.store.archive_tally()
+        if tally is not None:
+            self._add_tally(*tally)
+
+    # ---------------- Queries ----------------
+    def completion(self, project):
+        """(completed sub-processes, sub-processes) for one project."""
+        return tuple(self._completion.get(id(project), (0, 0)))
+
+    def overall_completion(self):
+        return (self.subprocess_status["Completed"],
+                sum(self.subprocess_status.values()))
+
+    def overdue_count(self, today=None):
+        """Open projects and sub-processes whose end date is before today."""
+        return bisect_left(self._due_dates, (today or date.today()).toordinal())
+
+    def most_assigned(self):
+        """(people with the most assignments, how many each has)."""
+        if not self._most:
+            return [], 0
+        return sorted(self._people_with[self._most]), self._most
+
+    # ---------------- Counters ----------------
+    def _count_person(self, person, delta):
+        # delta is +1 or -1, or a positive count on rebuild. Bucketing people
+        # by count keeps most_assigned() current without a scan: after a
+        # removal the top count can only drop by one.
+        old = self.assignments[person]
+        new = old + delta
+        if old:
+            bucket = self._people_with[old]
+            bucket.discard(person)
+            if not bucket:
+                del self._people_with[old]
+                if old == self._most and delta < 0:
+                    self._most = new
+        if new:
+            self.assignments[person] = new
+            self._people_with.setdefault(new, set()).add(person)
+            self._most = max(self._most, new)
+        else:
+            del self.assignments[person]
+
+    def _count_owner(self, owner, delta):
+        for person, _ in owner["personnel"]:
+            self._count_person(person, delta)
+
+    def _untrack_due(self, record):
+        old = self._due.pop(id(record), None)
+        if old is not None:
+            del self._due_dates[bisect_left(self._due_dates, old)]
+
+    def _track_due(self, record):
+        self._untrack_due(record)
+        if record["status"] in CLOSED_STATUSES:
+            return
+        end = date_ordinal(record["end_date"])
+        if end is not None:
+            self._due[id(record)] = end
+            insort(self._due_dates, end)
+
+    def _add_subprocess(self, project, sp):
+        self.subprocess_status[sp["status"]] += 1
+        completion = self._completion[id(project)]
+        completion[1] += 1
+        if sp["status"] == "Completed":
+            completion[0] += 1
+        self._count_owner(sp, 1)
+        self._track_due(sp)
+
+    def _remove_subprocess(self, project, sp):
+        self.subprocess_status[sp["status"]] -= 1
+        completion = self._completion[id(project)]
+        completion[1] -= 1
+        if sp["status"] == "Completed":
+            completion[0] -= 1
+        self._count_owner(sp, -1)
+        self._untrack_due(sp)
+
+    def _add_project(self, project):
+        self.project_status[project["status"]] += 1
+        self._completion[id(project)] = [0, 0]
+        self._count_owner(project, 1)
+        self._track_due(project)
+        for sp in project["subprocesses"]:
+            self._add_subprocess(project, sp)
+
+    def _remove_project(self, project):
+        for sp in project["subprocesses"]:
+            self._remove_subprocess(project, sp)
+        self.project_status[project["status"]] -= 1
+        self._count_owner(project, -1)
+        self._untrack_due(project)
+        del self._completion[id(project)]
+
+    def _add_tally(self, projects, subprocesses, people, ends):
+        self.project_status.update(projects)
+        self.subprocess_status.update(subprocesses)
+        for person, count in people.items():
+            self._count_person(person, count)
+        for (status, end_date), count in ends.items():
+            end = date_ordinal(end_date)
+            if status not in CLOSED_STATUSES and end is not None:
+                self._due_dates.extend([end] * count)
+        self._due_dates.sort()
+
+    def _adopt_project(self, project):
+        # A loaded archived project: counted by _add_tally already
+        sps = project["subprocesses"]
+        self._completion[id(project)] = [sum(sp["status"] == "Completed" for sp in sps), len(sps)]
+        for record in [project] + sps:
+            end = date_ordinal(record["end_date"])
+            if record["status"] not in CLOSED_STATUSES and end is not None:
+                self._due[id(record)] = end
+
+    # ---------------- Store notifications ----------------
+    def on_store_changed(self, event, details):
+        if event == "reset":
+            self.rebuild()
+        elif event == "archive_loaded":
+            for project in details["projects"]:
+                self._adopt_project(project)
+        elif event == "project_added":
+            self._add_project(details["project"])
+        elif event == "project_removed":
+            self._remove_project(details["project"])
+        elif event == "project_updated":
+            project, old = details["project"], details["old"]
+            if "status" in old:
+                self.project_status[old["status"]] -= 1
+                self.project_status[project["status"]] += 1
+            self._track_due(project)
+        elif event == "subprocess_added":
+            self._add_subprocess(details["project"], details["subprocess"])
+        elif event == "subprocess_removed":
+            self._remove_subprocess(details["project"], details["subprocess"])
+        elif event == "subprocess_updated":
+            sp, old = details["subprocess"], details["old"]
+            if "status" in old:
+                self.subprocess_status[old["status"]] -= 1
+                self.subprocess_status[sp["status"]] += 1
+                completion = self._completion[id(details["project"])]
+                completion[0] += (sp["status"] == "Completed") - (old["status"] == "Completed")
+            self._track_due(sp)
+        elif event == "assignment_added":
+            self._count_person(details["assignment"][0], 1)
+        elif event == "assignment_removed":
+            self._count_person(details["assignment"][0], -1)
+        elif event == "assignment_updated":
+            if details["old"][0] != details["assignment"][0]:
+                self._count_person(details["old"][0], -1)
+                self._count_person(details["assignment"][0], 1)
@@ -0,0 +1,587 @@
+"""Headless portfolio model: projects, sub-processes, assignments and personnel.
+
+Everything the Tk front end shows lives here. All mutations go through
+PortfolioStore methods so that listeners (the GUI, indexes, persistence)
+hear about every change without walking the whole portfolio.
+"""
+import secrets
+from contextlib import contextmanager
+
+from .archive import Archive
+from .dates import normalize_date
+
+STATUS_OPTIONS = ["Not Started", "Completed", "In Progress", "Aborted", "Paused"]
+# Never overdue, whatever the end date
+CLOSED_STATUSES = ("Completed", "Aborted")
+# How portfolio.merge treats an incoming project whose name is taken; here so
+# the command line can list them without importing the process pool
+MERGE_POLICIES = ("merge", "replace", "keep", "rename")
+
+
+def new_id():
+    """A random id for a project or sub-process, unique for all practical purposes."""
+    return secrets.token_hex(8)
+
+
+def new_project(name, status="Not Started", start_date="", end_date="", id=None):
+    return {
+        "name": name,
+        "status": status,
+        "start_date": start_date,
+        "end_date": end_date,
+        "personnel": [],
+        "subprocesses": [],
+        "id": id or new_id()
+    }
+
+
+def new_subprocess(name, status="Not Started", start_date="", end_date="", id=None):
+    return {
+        "name": name,
+        "status": status,
+        "start_date": start_date,
+        "end_date": end_date,
+        "personnel": [],
+        "id": id or new_id()
+    }
+
+
+def _check_status(status):
+    if status not in STATUS_OPTIONS:
+        raise ValueError(f"Invalid status: {status!r}")
+
+
+def _date(text):
+    # Dates are stored as YYYY-MM-DD where they can be read. Text that cannot
+    # is kept as it is, as on import, so that restoring an old value (undo,
+    # journal replay) always gives back exactly what was there; the dialogs
+    # are where unreadable dates are refused.
+    return normalize_date(text, strict=False)
+
+
+def _changed_fields(record, fields):
+    """Apply the non-None fields that differ from record; return their old values."""
+    old = {}
+    for key, value in fields:
+        if value is None:
+            continue
+        if key in ("start_date", "end_date"):
+            value = _date(value)
+        if record[key] != value:
+            old[key] = record[key]
+            record[key] = value
+    return old
+
+
+def _index_of(items, item):
+    # Identity search: project dicts compare by value, so list.index() is both
+    # slow and wrong for look-alike records.
+    if isinstance(items, Archive):
+        return items.find(item)
+    for i, candidate in enumerate(items):
+        if candidate is item:
+            return i
+    raise ValueError(f"{item.get('name')!r} is not in this portfolio")
+
+
+class PortfolioStore:
+    """Projects split into active and completed lists, plus the global personnel set.
+
+    Listeners registered with subscribe() are called as listener(event, details)
+    after every mutation, where details is a dict describing what changed.
+    Changes made as one step (renaming a person touches all their
+    assignments) are bracketed by "batch_started" and "batch_finished".
+
+    A reverse index maps each person to the projects and sub-processes that
+    assign them, so renames and deletions only visit those nodes.
+
+    Every project and sub-process has an "id" that stays with it through
+    edits, saves and exports. Hash indexes find records by id and projects by
+    name. A record arriving with an id already in use gets a new one.
+
+    completed_projects may be an Archive whose projects are built as they are
+    read (see archive.py). Each batch of them built is indexed and announced
+    as "archive_loaded"; listeners that keep per-project state start from
+    loaded_projects() and add those.
+    """
+
+    def __init__(self):
+        self.personnel = set()
+        self.projects = []            # Active (non-completed) projects
+        self.completed_projects = []  # Completed projects
+        self._listeners = []
+        self._batch_depth = 0
+        # person -> {owner key: (project, subprocess-or-None)}
+        self._assigned = {}
+        self._by_id = {}       # project id -> project
+        self._sp_by_id = {}    # sub-process id -> (project, sub-process)
+        self._by_name = {}     # project name -> [projects], in the order indexed
+
+    # ---------------- Notifications ----------------
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event, **details):
+        for listener in list(self._listeners):
+            listener(event, details)
+
+    @contextmanager
+    def batch(self, label):
+        """Group the changes made inside the with block into one step."""
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._notify("batch_started", label=label)
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._notify("batch_finished", label=label)
+
+    # ---------------- Queries ----------------
+    def iter_projects(self, load=True):
+        """Every project, active first. With load=False, archived projects not
+        loaded yet are built for this pass only, for callers that just read."""
+        yield from self.projects
+        if not load and isinstance(self.completed_projects, Archive):
+            yield from self.completed_projects.scan()
+        else:
+            yield from self.completed_projects
+
+    def loaded_projects(self):
+        """The projects held in memory: all of them, unless some are archived."""
+        if isinstance(self.completed_projects, Archive):
+            return self.projects + self.completed_projects.loaded()
+        return self.projects + self.completed_projects
+
+    def load_archive(self):
+        if isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_all()
+
+    def archive_tally(self):
+        """Archive.tally() for the archived projects not loaded yet, or None."""
+        if isinstance(self.completed_projects, Archive):
+            return self.completed_projects.tally()
+        return None
+
+    def _load_assigning(self, names):
+        # Build the archived projects that a change to these people touches
+        if isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_assigning(names)
+
+    def project_by_id(self, pid):
+        """The project with id pid, or None."""
+        project = self._by_id.get(pid)
+        if project is None and isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_ids({pid})
+            project = self._by_id.get(pid)
+        return project
+
+    def subprocess_by_id(self, sid):
+        """(project, sub-process) for the sub-process with id sid, or None."""
+        found = self._sp_by_id.get(sid)
+        if found is None and isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_ids({sid})
+            found = self._sp_by_id.get(sid)
+        return found
+
+    def projects_by_id(self, ids):
+        """{id: project} for the projects with any of ids."""
+        ids = set(ids)
+        if isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_ids(ids - self._by_id.keys())
+        return {pid: self._by_id[pid] for pid in ids if pid in self._by_id}
+
+    def find_projects(self, names):
+        """{name: project} for the projects called any of names; the oldest
+        where a name is repeated."""
+        names = set(names)
+        if isinstance(self.completed_projects, Archive):
+            self.completed_projects.load_named(names)
+        return {name: self._by_name[name][0] for name in names if name in self._by_name}
+
+    def __len__(self):
+        return len(self.projects) + len(self.completed_projects)
+
+    def locate(self, project):
+        """Return (completed, index) for a project held by this store."""
+        if project["status"] == "Completed":
+            return True, _index_of(self.completed_projects, project)
+        return False, _index_of(self.projects, project)
+
+    def project_list(self, completed):
+        return self.completed_projects if completed else self.projects
+
+    def assignments_of(self, person):
+        """Return [(project, subprocess-or-None, role)] for everything person is assigned to."""
+        self._load_assigning({person})
+        found = []
+        for project, sp in self._assigned.get(person, {}).values():
+            owner = sp if sp is not None else project
+            for p, r in owner["personnel"]:
+                if p == person:
+                    found.append((project, sp, r))
+        return found
+
+    # ---------------- Reverse personnel index ----------------
+    @staticmethod
+    def _owner_key(project, sp):
+        return id(sp) if sp is not None else id(project)
+
+    def _index_assignment(self, person, project, sp):
+        self._assigned.setdefault(person, {})[self._owner_key(project, sp)] = (project, sp)
+
+    def _unindex_assignment(self, person, project, sp):
+        owner = sp if sp is not None else project
+        if any(p == person for p, _ in owner["personnel"]):
+            return  # Still assigned there under another role
+        owners = self._assigned.get(person)
+        if owners is not None:
+            owners.pop(self._owner_key(project, sp), None)
+            if not owners:
+                del self._assigned[person]
+
+    def _index_owner(self, project, sp):
+        owner = sp if sp is not None else project
+        for person, _ in owner["personnel"]:
+            self._index_assignment(person, project, sp)
+
+    def _unindex_owner(self, project, sp):
+        key = self._owner_key(project, sp)
+        owner = sp if sp is not None else project
+        for person, _ in owner["personnel"]:
+            owners = self._assigned.get(person)
+            if owners is not None:
+                owners.pop(key, None)
+                if not owners:
+                    del self._assigned[person]
+
+    # ---------------- Id and name indexes ----------------
+    def _index_project(self, project):
+        if project["id"] in self._by_id:
+            project["id"] = new_id()
+        self._by_id[project["id"]] = project
+        self._by_name.setdefault(project["name"], []).append(project)
+        self._index_owner(project, None)
+        for sp in project["subprocesses"]:
+            self._index_subprocess(project, sp)
+
+    def _unindex_project(self, project):
+        self._by_id.pop(project["id"], None)
+        named = self._by_name.get(project["name"], [])
+        for i, other in enumerate(named):
+            if other is project:
+                del named[i]
+                break
+        if not named:
+            self._by_name.pop(project["name"], None)
+        self._unindex_owner(project, None)
+        for sp in project["subprocesses"]:
+            self._unindex_subprocess(project, sp)
+
+    def _index_subprocess(self, project, sp):
+        if sp["id"] in self._sp_by_id:
+            sp["id"] = new_id()
+        self._sp_by_id[sp["id"]] = (project, sp)
+        self._index_owner(project, sp)
+
+    def _unindex_subprocess(self, project, sp):
+        self._sp_by_id.pop(sp["id"], None)
+        self._unindex_owner(project, sp)
+
+    # ---------------- Bulk load ----------------
+    def load(self, personnel, projects, archive=None):
+        """Replace the whole portfolio, e.g. after an import.
+
+        archive, an Archive, becomes the completed list; projects then only
+        need to hold the active ones.
+        """
+        # The old records are handed to listeners as they are, not copied;
+        # archived ones never loaded are built for the occasion
+        previous = (self.personnel, list(self.iter_projects(load=False)))
+        if isinstance(self.completed_projects, Archive):
+            self.completed_projects.close()
+        self.personnel = set(personnel)
+        self.projects = []
+        self.completed_projects = []
+        if archive is not None:
+            archive.on_load = self._archive_loaded
+            self.completed_projects = archive
+        self._assigned = {}
+        self._by_id = {}
+        self._sp_by_id = {}
+        self._by_name = {}
+        for p in projects:
+            self.project_list(p["status"] == "Completed").append(p)
+            self._index_project(p)
+        self._notify("reset", previous=previous)
+
+    def _archive_loaded(self, projects):
+        for project in projects:
+            self._index_project(project)
+        self._notify("archive_loaded", projects=projects)
+
+    # ---------------- Projects ----------------
+    def add_project(self, name, status="Not Started", start_date="", end_date=""):
+        _check_status(status)
+        project = new_project(name, status, _date(start_date), _date(end_date))
+        self.insert_project(project)
+        return project
+
+    def insert_project(self, project, index=None):
+        completed = project["status"] == "Completed"
+        target = self.project_list(completed)
+        if index is None:
+            index = len(target)
+        target.insert(index, project)
+        self._index_project(project)
+        self._notify("project_added", project=project, completed=completed, index=index)
+        return project
+
+    def update_project(self, project, status=None, start_date=None, end_date=None):
+        """Change project fields; a status change across "Completed" moves the
+        project between the active and completed lists (appended at the end)."""
+        if status is not None:
+            _check_status(status)
+        self._update_project(project, *self.locate(project), status, start_date, end_date)
+
+    def _update_project(self, project, was_completed, old_index, status, start_date, end_date):
+        old = _changed_fields(project, (("status", status), ("start_date", start_date),
+                                        ("end_date", end_date)))
+        if not old:
+            return
+        completed = project["status"] == "Completed"
+        index = old_index
+        if completed != was_completed:
+            self.project_list(was_completed).pop(old_index)
+            target = self.project_list(completed)
+            index = len(target)
+            target.append(project)
+        self._notify("project_updated", project=project, old=old,
+                     completed=completed, index=index,
+                     old_completed=was_completed, old_index=old_index)
+
+    def revert_project(self, project, status):
+        if status == "Completed":
+            raise ValueError("Cannot revert a project to 'Completed'")
+        self.update_project(project, status=status)
+
+    def delete_project(self, project):
+        self._delete_project(project, *self.locate(project))
+
+    def _delete_project(self, project, completed, index):
+        self.project_list(completed).pop(index)
+        self._unindex_project(project)
+        self._notify("project_removed", project=project, completed=completed, index=index)
+
+    # ---------------- Many projects at once ----------------
+    # Each is one batch, so one undo step and one refresh for listeners that
+    # wait for "batch_finished". The projects are located in one pass over
+    # each list rather than one search apiece.
+    def positions(self, projects, completed):
+        """{id(project): index} for those of projects in the completed or
+        active list, in one pass that loads nothing from the archive."""
+        items = self.project_list(completed)
+        if isinstance(items, Archive):
+            return items.positions(projects)
+        wanted = {id(p) for p in projects}
+        return {id(p): i for i, p in enumerate(items) if id(p) in wanted}
+
+    def _located(self, projects):
+        """[(project, completed, index)] in list order, indexes counting
+        every project of the list, with the same project given once."""
+        unique = {id(p): p for p in projects}
+        found = []
+        for completed in (False, True):
+            positions = self.positions(unique.values(), completed)
+            found.extend((unique[key], completed, index)
+                         for index, key in sorted((i, key) for key, i in positions.items()))
+        if len(found) != len(unique):
+            raise ValueError("Some of the projects are not in this portfolio")
+        return found
+
+    def update_projects(self, projects, status=None, start_date=None, end_date=None,
+                        label="Edit Projects"):
+        """update_project() for each of projects, in list order."""
+        if status is not None:
+            _check_status(status)
+        with self.batch(label):
+            # Projects leaving a list shift the later ones in it down
+            left = {False: 0, True: 0}
+            for project, completed, index in self._located(projects):
+                self._update_project(project, completed, index - left[completed],
+                                     status, start_date, end_date)
+                if (project["status"] == "Completed") != completed:
+                    left[completed] += 1
+
+    def revert_projects(self, projects, status):
+        if status == "Completed":
+            raise ValueError("Cannot revert a project to 'Completed'")
+        self.update_projects(projects, status=status, label="Revert Projects")
+
+    def delete_projects(self, projects):
+        with self.batch("Delete Projects"):
+            left = {False: 0, True: 0}
+            for project, completed, index in self._located(projects):
+                self._delete_project(project, completed, index - left[completed])
+                left[completed] += 1
+
+    def move_project(self, project, new_index):
+        """Reorder a project within its own list."""
+        completed, old_index = self.locate(project)
+        items = self.project_list(completed)
+        new_index = max(0, min(new_index, len(items) - 1))
+        if new_index == old_index:
+            return
+        items.pop(old_index)
+        items.insert(new_index, project)
+        self._notify("project_moved", project=project, completed=completed,
+                     old_index=old_index, index=new_index)
+
+    # ---------------- Sub-processes ----------------
+    def add_subprocess(self, project, name, status="Not Started", start_date="", end_date=""):
+        _check_status(status)
+        sp = new_subprocess(name, status, _date(start_date), _date(end_date))
+        self.insert_subprocess(project, sp)
+        return sp
+
+    def insert_subprocess(self, project, sp, index=None):
+        if index is None:
+            index = len(project["subprocesses"])
+        project["subprocesses"].insert(index, sp)
+        self._index_subprocess(project, sp)
+        self._notify("subprocess_added", project=project, subprocess=sp, index=index)
+        return sp
+
+    def update_subprocess(self, project, sp, name=None, status=None, start_date=None, end_date=None):
+        if status is not None:
+            _check_status(status)
+        old = _changed_fields(sp, (("name", name), ("status", status),
+                                   ("start_date", start_date), ("end_date", end_date)))
+        if old:
+            self._notify("subprocess_updated", project=project, subprocess=sp, old=old)
+
+    def remove_subprocess(self, project, sp):
+        index = _index_of(project["subprocesses"], sp)
+        project["subprocesses"].pop(index)
+        self._unindex_subprocess(project, sp)
+        self._notify("subprocess_removed", project=project, subprocess=sp, index=index)
+
+    # ---------------- Assignments ----------------
+    # Assignments are (person, role) tuples on a project, or on one of its
+    # sub-processes when subprocess is given.
+    def add_assignment(self, project, person, role, subprocess=None, index=None):
+        owner = subprocess if subprocess is not None else project
+        if index is None:
+            index = len(owner["personnel"])
+        owner["personnel"].insert(index, (person, role))
+        self._index_assignment(person, project, subprocess)
+        self._notify("assignment_added", project=project, subprocess=subprocess,
+                     index=index, assignment=(person, role))
+
+    def update_assignment(self, project, index, person, role, subprocess=None):
+        owner = subprocess if subprocess is not None else project
+        old = owner["personnel"][index]
+        if old == (person, role):
+            return
+        owner["personnel"][index] = (person, role)
+        if old[0] != person:
+            self._unindex_assignment(old[0], project, subprocess)
+            self._index_assignment(person, project, subprocess)
+        self._notify("assignment_updated", project=project, subprocess=subprocess,
+                     index=index, assignment=(person, role), old=old)
+
+    def remove_assignment(self, project, index, subprocess=None):
+        owner = subprocess if subprocess is not None else project
+        old = owner["personnel"].pop(index)
+        self._unindex_assignment(old[0], project, subprocess)
+        self._notify("assignment_removed", project=project, subprocess=subprocess,
+                     index=index, assignment=old)
+
+    def assign_person(self, projects, person, role):
+        """Assign person to each of projects with role, or give them role
+        where they are assigned already."""
+        with self.batch("Assign Person"):
+            for project in projects:
+                for i, (p, r) in enumerate(project["personnel"]):
+                    if p == person:
+                        self.update_assignment(project, i, person, role)
+                        break
+                else:
+                    self.add_assignment(project, person, role)
+
+    def unassign_person(self, projects, person):
+        """Take person off each of projects (not their sub-processes)."""
+        with self.batch("Unassign Person"):
+            for project in projects:
+                for i in range(len(project["personnel"]) - 1, -1, -1):
+                    if project["personnel"][i][0] == person:
+                        self.remove_assignment(project, i)
+
+    def iter_assignment_owners(self):
+        """Yield (project, subprocess-or-None) for every node that can hold assignments."""
+        for project in self.iter_projects():
+            yield project, None
+            for sp in project["subprocesses"]:
+                yield project, sp
+
+    # ---------------- Personnel ----------------
+    def add_person(self, name):
+        if name in self.personnel:
+            raise ValueError("A person with this name already exists.")
+        self.personnel.add(name)
+        self._notify("person_added", name=name)
+
+    def rename_person(self, old_name, new_name, reassign=True):
+        """Rename a person in the global set and, unless reassign is False,
+        in every assignment."""
+        if new_name == old_name:
+            return
+        if new_name in self.personnel:
+            raise ValueError("A person with this name already exists.")
+        if reassign:
+            self._load_assigning({old_name})
+        with self.batch("Rename Person"):
+            self.personnel.remove(old_name)
+            self.personnel.add(new_name)
+            if reassign:
+                self._reassign_everywhere(old_name, new_name)
+            self._notify("person_renamed", old_name=old_name, name=new_name)
+
+    def remove_person(self, name, unassign=True):
+        """Remove a person from the global set and, unless unassign is False,
+        from every assignment."""
+        self.personnel.remove(name)
+        if unassign:
+            self._load_assigning({name})
+        with self.batch("Remove Person"):
+            if unassign:
+                self._unassign_everywhere(name)
+            self._notify("person_removed", name=name)
+
+    def _reassign_everywhere(self, old_name, new_name):
+        # Only the nodes that actually assign old_name are visited
+        for project, sp in list(self._assigned.get(old_name, {}).values()):
+            owner = sp if sp is not None else project
+            for i, (p, r) in enumerate(owner["personnel"]):
+                if p == old_name:
+                    self.update_assignment(project, i, new_name, r, subprocess=sp)
+
+    def _unassign_everywhere(self, name):
+        for project, sp in list(self._assigned.get(name, {}).values()):
+            owner = sp if sp is not None else project
+            for i in range(len(owner["personnel"]) - 1, -1, -1):
+                if owner["personnel"][i][0] == name:
+                    self.remove_assignment(project, i, subprocess=sp)
+
+    def cleanup_deleted_personnel(self):
+        """Drop assignments that reference people no longer in the global set."""
+        if isinstance(self.completed_projects, Archive):
+            self._load_assigning(self.completed_projects.assigned_people() - self.personnel)
+        with self.batch("Clean Up Personnel"):
+            for name in [n for n in self._assigned if n not in self.personnel]:
+                self._unassign_everywhere(name)
@@ -0,0 +1,134 @@
+"""Export rows streamed to and from files, in the format their name asks for.
+
+    projects.csv        CSV
+    projects.jsonl      JSON Lines: each row as a JSON array of strings
+    projects.csv.gz     gzip-compressed; likewise .jsonl.gz
+    projects.csv.xz     xz-compressed; likewise .jsonl.xz
+
+Every format carries the same rows (see csvio.py), so whatever writes rows
+through writerow() or reads them from an iterator works with all of them.
+Compressed files are packed and unpacked a block at a time as the rows go
+through, never held whole. Names with any other extension are CSV.
+
+register_format() adds a format: a writer class wrapping a text file with
+writerow(row), and a function yielding the rows of a text file.
+"""
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+
+GZIP_LEVEL = 6  # gzip's own default; 9 is much slower for little gain
+XZ_PRESET = 6   # xz's default: the smallest files here, at a few MB/s
+
+
+def _gzip(raw, mode):
+    # No name or time in the header, so the same portfolio always
+    # compresses to the same bytes (and the same file_id() in delta.py)
+    return gzip.GzipFile(filename="", fileobj=raw, mode=mode, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _xz(raw, mode):
+    if mode == "wb":
+        return lzma.LZMAFile(raw, mode, preset=XZ_PRESET)
+    return lzma.LZMAFile(raw, mode)
+
+
+COMPRESSIONS = {".gz": _gzip, ".xz": _xz}
+# Raised, besides OSError, by a compressed file that is cut short or damaged
+DECOMPRESS_ERRORS = (EOFError, lzma.LZMAError)
+
+
+def iter_rows(f):
+    """Yield non-empty CSV rows from an open text file, one at a time."""
+    for row in csv.reader(f):
+        if row:
+            yield row
+
+
+class JsonLinesWriter:
+    def __init__(self, f):
+        self._write = f.write
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def writerow(self, row):
+        self._write(self._encode(row) + "\n")
+
+
+def iter_json_rows(f):
+    """Yield the rows of a JSON Lines file, skipping blank lines."""
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {line_num}: not valid JSON") from None
+        if not isinstance(row, list) or not row:
+            raise ValueError(f"Line {line_num}: expected a JSON array")
+        yield [value if isinstance(value, str) else str(value) for value in row]
+
+
+FORMATS = {".csv": (csv.writer, iter_rows), ".jsonl": (JsonLinesWriter, iter_json_rows)}
+
+
+def register_format(extension, writer, reader):
+    FORMATS[extension.lower()] = (writer, reader)
+
+
+def split_name(filename):
+    """(format extension, compression extension or None) of a file name."""
+    root, ext = os.path.splitext(filename.lower())
+    compression = None
+    if ext in COMPRESSIONS:
+        compression = ext
+        ext = os.path.splitext(root)[1]
+    return ext, compression
+
+
+class RowStream:
+    """Rows to or from a binary file, by the format and compression name
+    asks for. tell() is the position in the file itself, e.g. for progress
+    against its size."""
+
+    def __init__(self, raw, mode, name):
+        ext, compression = split_name(name)
+        self._writer, self._reader = FORMATS.get(ext, FORMATS[".csv"])
+        self.raw = raw
+        binary = raw if compression is None else COMPRESSIONS[compression](raw, mode + "b")
+        self.text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+    def writer(self):
+        return self._writer(self.text)
+
+    def rows(self):
+        return self._reader(self.text)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def close(self):
+        # Closing the text file flushes the compressor, which leaves raw open
+        try:
+            self.text.close()
+        finally:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_rows(filename, mode="r", name=None):
+    """RowStream on filename for mode "r" or "w". The format follows name if
+    given (e.g. the target of a temporary file), else filename."""
+    raw = open(filename, mode + "b")
+    try:
+        return RowStream(raw, mode, name or filename)
+    except BaseException:
+        raw.close()
+        raise
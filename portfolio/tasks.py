@@ -0,0 +1,67 @@
+"""Run long portfolio operations on a worker thread.
+
+The worker never touches the GUI. It posts messages on a queue that the Tk
+side drains from the main loop with after() polling:
+
+    ("progress", done, total)
+    ("done", result)
+    ("error", exception)
+    ("cancelled",)
+"""
+import queue
+import threading
+
+# How many rows/projects to process between progress reports and cancel checks
+PROGRESS_EVERY = 2000
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled()
+
+
+class BackgroundTask:
+    """Call func(*args, progress=..., cancel=...) on a daemon thread."""
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def _progress(self, done, total):
+        self.messages.put(("progress", done, total))
+
+    def _run(self):
+        try:
+            result = self.func(*self.args, progress=self._progress, cancel=self.cancel_event)
+        except OperationCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", e))
+        else:
+            self.messages.put(("done", result))
+
+    def poll(self):
+        """Return every message posted since the last poll, without blocking."""
+        pending = []
+        while True:
+            try:
+                pending.append(self.messages.get_nowait())
+            except queue.Empty:
+                return pending
@@ -0,0 +1,130 @@
+"""Row layout and level-of-detail aggregates for the timeline (Gantt) view.
+
+Every project gets a row, followed by one row per sub-process, active projects
+first. Dates come from a ScheduleIndex, so nothing is re-parsed here.
+
+When zoomed out, rows are drawn in strips of 2**level rows. A strip shows the
+union of its rows' date ranges: a list of disjoint (start, end, status, count)
+pieces, where status is None if the merged bars had different statuses and
+count is how many bars were merged. Strips are cached per level, so after the
+first view at a zoom level only strips whose rows changed are rebuilt.
+"""
+from operator import itemgetter
+
+_START = itemgetter(0)
+
+
+def merge_pieces(pieces):
+    """Coalesce start-sorted (start, end, status, count) pieces that overlap or touch."""
+    merged = []
+    for s, e, status, count in pieces:
+        if merged and s <= merged[-1][1] + 1:
+            ps, pe, pstatus, pcount = merged[-1]
+            merged[-1] = (ps, max(pe, e), pstatus if pstatus == status else None, pcount + count)
+        else:
+            merged.append((s, e, status, count))
+    return merged
+
+
+def _first_ending_at_or_after(pieces, day):
+    # Pieces are disjoint and start-sorted, so their ends are sorted too
+    lo, hi = 0, len(pieces)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if pieces[mid][1] < day:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class TimelineLayout:
+    def __init__(self, store, schedule):
+        self.store = store
+        self.schedule = schedule
+        self._rows = None     # [(project, subprocess-or-None)], built on demand
+        self._row_of = None   # id(record) -> row
+        self._levels = {}     # level -> {strip: pieces}
+        store.subscribe(self.on_store_changed)
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    # ---------------- Rows ----------------
+    @property
+    def rows(self):
+        if self._rows is None:
+            rows = []
+            for project in self.store.iter_projects():
+                rows.append((project, None))
+                rows.extend((project, sp) for sp in project["subprocesses"])
+            self._rows = rows
+            self._row_of = None
+        return self._rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_of(self, record):
+        if self._row_of is None:
+            self._row_of = {id(sp if sp is not None else project): i
+                            for i, (project, sp) in enumerate(self.rows)}
+        return self._row_of.get(id(record))
+
+    def invalidate(self):
+        self._rows = None
+        self._row_of = None
+        self._levels = {}
+
+    def invalidate_record(self, record):
+        if self._rows is None:
+            return
+        row = self.row_of(record)
+        if row is None:
+            return
+        for level, strips in self._levels.items():
+            strips.pop(row >> level, None)
+
+    def on_store_changed(self, event, details):
+        if event == "project_updated":
+            if details["completed"] != details["old_completed"]:
+                self.invalidate()
+            else:
+                self.invalidate_record(details["project"])
+        elif event == "subprocess_updated":
+            self.invalidate_record(details["subprocess"])
+        elif event in ("reset", "archive_loaded", "project_added", "project_removed",
+                       "project_moved", "subprocess_added", "subprocess_removed"):
+            self.invalidate()
+
+    # ---------------- Strips ----------------
+    def pieces(self, level, strip):
+        """Merged pieces for rows strip * 2**level up to (strip + 1) * 2**level."""
+        strips = self._levels.setdefault(level, {})
+        found = strips.get(strip)
+        if found is None:
+            interval = self.schedule.interval
+            found = []
+            for project, sp in self.rows[strip << level:(strip + 1) << level]:
+                record = sp if sp is not None else project
+                dates = interval(record)
+                if dates is not None:
+                    found.append((dates[0], dates[1], record["status"], 1))
+            if level:
+                found = merge_pieces(sorted(found, key=_START))
+            strips[strip] = found
+        return found
+
+    def visible(self, level, first_strip, last_strip, start, end):
+        """Yield (strip, pieces) for strips first_strip..last_strip, keeping only
+        pieces that intersect [start, end]."""
+        last_strip = min(last_strip, (len(self.rows) - 1) >> level)
+        for strip in range(max(first_strip, 0), last_strip + 1):
+            pieces = self.pieces(level, strip)
+            i = _first_ending_at_or_after(pieces, start)
+            shown = []
+            while i < len(pieces) and pieces[i][0] <= end:
+                shown.append(pieces[i])
+                i += 1
+            if shown:
+                yield strip, shown
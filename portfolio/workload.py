@@ -0,0 +1,279 @@
+"""Personnel workload: who is booked on what, day by day.
+
+Each person assigned to a dated sub-process carries one unit of load on every
+day from its start to its end date. compute_workload() turns those assignments
+into a person x day load matrix and reports, per person, peak concurrency,
+utilization (average load over capacity) and the windows of days where load
+exceeds capacity. Unless asked for another horizon, the matrix covers the
+assignments' days but never more than MAX_HORIZON_DAYS around today, so a
+mistyped or placeholder date (2204, 9999-12-31) cannot make it huge.
+
+With NumPy installed the whole matrix is built and analysed in a handful of
+array operations: load is the running sum of a +1/-1 difference matrix filled
+with bincount. Without NumPy the same numbers come from plain Python lists,
+which is fine for small portfolios.
+"""
+from datetime import date
+from itertools import chain
+
+from .schedule import OPEN_END, record_interval
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency; see _compute_python
+    np = None
+
+IGNORED_STATUSES = ("Aborted",)
+MAX_HORIZON_DAYS = 731  # Longest default horizon: two years
+PAST_DAYS = 365         # How far before today a capped horizon starts, if it can
+
+
+def booking(sp):
+    """(people, start, end) for a sub-process, or None if it books nobody.
+
+    people has each name once, even if listed under two roles; start and end
+    are inclusive day ordinals, end possibly OPEN_END.
+    """
+    if not sp["personnel"] or sp["status"] in IGNORED_STATUSES:
+        return None
+    interval = record_interval(sp)
+    if interval is None:
+        return None
+    return tuple(dict.fromkeys(p for p, _ in sp["personnel"])), interval[0], interval[1]
+
+
+def bookings_of(store):
+    """{id(sp): booking} for every sub-process that books someone."""
+    found = {}
+    for project in store.iter_projects():
+        for sp in project["subprocesses"]:
+            b = booking(sp)
+            if b is not None:
+                found[id(sp)] = b
+    return found
+
+
+def to_columns(personnel, bookings):
+    """Return (people, person, start, end): the sorted names of everyone known,
+    then one entry per booked person per sub-process, where person is an index
+    into people."""
+    values = list(bookings.values())
+    booked = [b[0] for b in values]
+    people = sorted(set(personnel).union(chain.from_iterable(booked)))
+    index = {name: i for i, name in enumerate(people)}
+    person = list(map(index.__getitem__, chain.from_iterable(booked)))
+    start = [s for names, s, _ in values for _ in names]
+    end = [e for names, _, e in values for _ in names]
+    return people, person, start, end
+
+
+def collect_assignments(store):
+    return to_columns(store.personnel, bookings_of(store))
+
+
+def default_horizon(start, end, today=None):
+    """(first, last) day covering every assignment; open-ended ones count to
+    their start. A span longer than MAX_HORIZON_DAYS is cut down to that many
+    days, from PAST_DAYS before today where the assignments allow."""
+    if not start:
+        return None
+    first = min(start)
+    last = max(max(start), max((e for e in end if e != OPEN_END), default=0))
+    if last - first >= MAX_HORIZON_DAYS:
+        today = (today or date.today()).toordinal()
+        first = max(first, min(today - PAST_DAYS, last - MAX_HORIZON_DAYS + 1))
+        last = first + MAX_HORIZON_DAYS - 1
+    return first, last
+
+
+class WorkloadReport:
+    """Per-person results, as lists aligned with people.
+
+    load is the people x days matrix (a NumPy array, or a list of lists
+    without NumPy); day j is first_day + j. windows maps each over-allocated
+    person to [(first day, last day, peak load)], days as ordinals.
+    """
+
+    def __init__(self, people, first_day, days, load, capacity, peak, assigned_days,
+                 over_days, windows):
+        self.people = people
+        self.first_day = first_day
+        self.days = days
+        self.load = load
+        self.capacity = capacity
+        self.peak = peak
+        self.assigned_days = assigned_days
+        self.over_days = over_days
+        self.windows = windows
+
+    @property
+    def utilization(self):
+        if not self.days:
+            return [0.0] * len(self.people)
+        return [assigned / (cap * self.days) for assigned, cap in zip(self.assigned_days, self.capacity)]
+
+    def rows(self):
+        """[(person, peak, utilization, over-allocated days, windows)], most overbooked first."""
+        rows = list(zip(self.people, self.peak, self.utilization, self.over_days,
+                        (self.windows.get(p, []) for p in self.people)))
+        rows.sort(key=lambda r: (-r[3], -r[1], r[0]))
+        return rows
+
+
+def compute_workload(store, horizon=None, capacity=1, use_numpy=True, today=None):
+    """Build the WorkloadReport for store.
+
+    horizon is an inclusive (first, last) pair of day ordinals and defaults to
+    default_horizon() of the assignments, around today (a date). capacity is the number of concurrent
+    assignments a person can carry: one number for everybody, or a dict of
+    person -> number with 1 for anyone not listed.
+    """
+    return _compute(collect_assignments(store), horizon, capacity, use_numpy, today)
+
+
+def _compute(columns, horizon, capacity, use_numpy, today=None):
+    people, person, start, end = columns
+    if horizon is None:
+        horizon = default_horizon(start, end, today)
+    if isinstance(capacity, dict):
+        caps = [max(1, capacity.get(p, 1)) for p in people]
+    else:
+        caps = [max(1, capacity)] * len(people)
+    if horizon is None or horizon[1] < horizon[0]:
+        zeros = [0] * len(people)
+        return WorkloadReport(people, None, 0, [], caps, zeros, zeros, zeros, {})
+    compute = _compute_numpy if use_numpy and np is not None else _compute_python
+    return compute(people, person, start, end, horizon, caps)
+
+
+def _compute_numpy(people, person, start, end, horizon, caps):
+    first, last = horizon
+    days = last - first + 1
+    n = len(people)
+    person = np.asarray(person, dtype=np.int64)
+    # Clip to the horizon and drop what falls outside it
+    s = np.maximum(np.asarray(start, dtype=np.int64), first) - first
+    e = np.minimum(np.asarray(end, dtype=np.int64), last) - first
+    keep = s <= e
+    person, s, e = person[keep], s[keep], e[keep]
+
+    # +1 on the first day, -1 the day after the last; a running sum gives the load
+    width = days + 1
+    size = n * width
+    diff = (np.bincount(person * width + s, minlength=size)
+            - np.bincount(person * width + e + 1, minlength=size))
+    load = np.cumsum(diff.reshape(n, width)[:, :days], axis=1, dtype=np.int32)
+
+    cap = np.asarray(caps, dtype=np.int32)
+    peak = load.max(axis=1)
+    assigned_days = load.sum(axis=1, dtype=np.int64)
+    # Only people whose peak exceeds capacity have anything more to find
+    busy = np.nonzero(peak > cap)[0]
+    over = load[busy] > cap[busy, None]
+    over_days = np.zeros(n, dtype=np.int64)
+    over_days[busy] = over.sum(axis=1)
+
+    # Window edges are where the over-capacity mask flips, with a False column
+    # padded on either side so that every window has both
+    padded = np.zeros((len(busy), days + 2), dtype=np.int8)
+    padded[:, 1:-1] = over
+    edges = np.diff(padded, axis=1)
+    rows, opens = np.nonzero(edges == 1)
+    _, closes = np.nonzero(edges == -1)  # Exclusive; row-major order pairs them up
+    windows = {}
+    if len(rows):
+        rows = busy[rows]
+        flat = np.append(load.ravel(), 0)
+        bounds = np.empty(2 * len(rows), dtype=np.int64)
+        bounds[0::2] = rows * days + opens
+        bounds[1::2] = rows * days + closes
+        peaks = np.maximum.reduceat(flat, bounds)[0::2]
+        for r, o, c, p in zip(rows.tolist(), opens.tolist(), closes.tolist(), peaks.tolist()):
+            windows.setdefault(people[r], []).append((first + o, first + c - 1, p))
+
+    return WorkloadReport(people, first, days, load, caps, peak.tolist(), assigned_days.tolist(),
+                          over_days.tolist(), windows)
+
+
+def _compute_python(people, person, start, end, horizon, caps):
+    first, last = horizon
+    days = last - first + 1
+    diff = [[0] * (days + 1) for _ in people]
+    for p, s, e in zip(person, start, end):
+        s, e = max(s, first) - first, min(e, last) - first
+        if s <= e:
+            diff[p][s] += 1
+            diff[p][e + 1] -= 1
+
+    load, peak, assigned_days, over_days, windows = [], [], [], [], {}
+    for name, row, cap in zip(people, diff, caps):
+        running, loads = 0, []
+        for d in row[:days]:
+            running += d
+            loads.append(running)
+        load.append(loads)
+        peak.append(max(loads, default=0))
+        assigned_days.append(sum(loads))
+        over_days.append(sum(1 for x in loads if x > cap))
+        opened = None
+        for day, x in enumerate(loads + [0]):
+            if x > cap and opened is None:
+                opened = day
+            elif x <= cap and opened is not None:
+                windows.setdefault(name, []).append((first + opened, first + day - 1, max(loads[opened:day])))
+                opened = None
+
+    return WorkloadReport(people, first, days, load, caps, peak, assigned_days, over_days, windows)
+
+
+class WorkloadEngine:
+    """compute_workload() for one store.
+
+    Each sub-process's booking is kept up to date from store notifications,
+    so after an edit only that sub-process is looked at again before the next
+    report.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._bookings = None  # id(sp) -> booking, built on first report
+        self._columns = None
+        store.subscribe(self.on_store_changed)
+
+    def close(self):
+        self.store.unsubscribe(self.on_store_changed)
+
+    def _rebook(self, sp):
+        b = booking(sp)
+        if b is None:
+            self._bookings.pop(id(sp), None)
+        else:
+            self._bookings[id(sp)] = b
+
+    def on_store_changed(self, event, details):
+        # Project fields and order do not affect sub-process bookings
+        if event in ("project_moved", "project_updated"):
+            return
+        self._columns = None
+        if self._bookings is None:
+            return
+        if event == "reset":
+            self._bookings = None
+        elif event == "project_added":
+            for sp in details["project"]["subprocesses"]:
+                self._rebook(sp)
+        elif event == "project_removed":
+            for sp in details["project"]["subprocesses"]:
+                self._bookings.pop(id(sp), None)
+        elif event == "subprocess_removed":
+            self._bookings.pop(id(details["subprocess"]), None)
+        elif details.get("subprocess") is not None:
+            # Sub-process edits and sub-process assignment changes
+            self._rebook(details["subprocess"])
+
+    def report(self, horizon=None, capacity=1, use_numpy=True, today=None):
+        if self._bookings is None:
+            self._bookings = bookings_of(self.store)
+        if self._columns is None:
+            self._columns = to_columns(self.store.personnel, self._bookings)
+        return _compute(self._columns, horizon, capacity, use_numpy, today)
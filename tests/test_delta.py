@@ -0,0 +1,97 @@
+import os
+import random
+import tempfile
+import unittest
+
+from portfolio import STATUS_OPTIONS, PortfolioStore
+from portfolio.delta import (ChangeTracker, DeltaFile, apply_delta, export_base, export_delta, file_id,
+                             read_base)
+
+
+class ChangeFileRoundTrip(unittest.TestCase):
+    """A change file brings a copy of the base export to the sender's state."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.start()
+
+    def start(self):
+        self.store = PortfolioStore()
+        self.store.load(["Ann", "Bob"], [])
+        self.tracker = ChangeTracker(self.store)
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def export_base(self):
+        base = self.path("base.csv")
+        self.tracker.clear(export_base(self.store, base))
+        return base
+
+    def round_trip(self, base):
+        """The receiver's copy of the base after the changes are applied."""
+        delta = self.path("changes.csv")
+        delta_id = export_delta(self.store, self.tracker, delta)
+        personnel, projects, base_id = read_base(base)
+        receiver = PortfolioStore()
+        receiver.load(personnel, projects)
+        with DeltaFile(delta) as changes:
+            self.assertEqual(changes.base, base_id)
+            apply_delta(receiver, changes.rows())
+        self.assertEqual(changes.id, delta_id)
+        return receiver
+
+    def assertSameOrder(self, receiver):
+        for completed in (False, True):
+            self.assertEqual([p["id"] for p in receiver.project_list(completed)],
+                             [p["id"] for p in self.store.project_list(completed)])
+
+    def test_completed_and_reverted_keeps_order(self):
+        a, _, _ = (self.store.add_project(name) for name in "ABC")
+        base = self.export_base()
+        self.store.update_project(a, status="Completed")
+        self.store.update_project(a, status="In Progress")
+        self.assertSameOrder(self.round_trip(base))
+
+    def test_compressed_change_file_id(self):
+        self.store.add_project("A")
+        base = self.export_base()
+        for name in ("changes.csv.gz", "changes.jsonl.xz"):
+            self.store.add_project(name)
+            delta = self.path(name)
+            export_delta(self.store, self.tracker, delta)
+            with DeltaFile(delta) as changes:
+                rows = list(changes.rows())
+            self.assertEqual(changes.id, file_id(delta))
+            self.assertEqual(rows[0][:2], ["PROJECT", name])
+
+    def test_random_edits_converge(self):
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                self.start()
+                self.random_edits(random.Random(seed))
+
+    def random_edits(self, rng):
+        for name in "ABCDEFGH":
+            self.store.add_project(name, rng.choice(STATUS_OPTIONS))
+        base = self.export_base()
+        for step in range(60):
+            projects = list(self.store.iter_projects())
+            project = rng.choice(projects)
+            op = rng.randrange(4)
+            if op == 0:
+                self.store.update_project(project, status=rng.choice(STATUS_OPTIONS))
+            elif op == 1:
+                self.store.add_project(f"N{step}", rng.choice(STATUS_OPTIONS))
+            elif op == 2 and len(projects) > 2:
+                self.store.delete_project(project)
+            else:
+                completed, _ = self.store.locate(project)
+                count = len(self.store.project_list(completed))
+                self.store.move_project(project, rng.randrange(count))
+        self.assertSameOrder(self.round_trip(base))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import date
+
+from portfolio import PortfolioStore
+from portfolio.workload import MAX_HORIZON_DAYS, compute_workload, np
+
+TODAY = date(2025, 6, 1)
+
+
+class OutlierDates(unittest.TestCase):
+    """A far-off end date must not stretch the load matrix over centuries."""
+
+    def setUp(self):
+        self.store = PortfolioStore()
+        self.store.load(["Ann", "Bob"], [])
+        project = self.store.add_project("P")
+        for name, end in (("Typo", "2204-06-30"), ("Someday", "9999-12-31")):
+            self.store.add_subprocess(project, name, "In Progress", "2025-01-01", end)
+            self.store.add_assignment(project, "Ann", "Dev", project["subprocesses"][-1])
+        self.store.add_subprocess(project, "Review", "In Progress", "2025-06-01", "2025-06-10")
+        self.store.add_assignment(project, "Bob", "QA", project["subprocesses"][-1])
+
+    def check(self, use_numpy):
+        report = compute_workload(self.store, use_numpy=use_numpy, today=TODAY)
+        self.assertEqual(report.days, MAX_HORIZON_DAYS)
+        self.assertEqual(report.first_day, date(2025, 1, 1).toordinal())
+        rows = {person: (peak, over_days) for person, peak, _, over_days, _ in report.rows()}
+        self.assertEqual(rows["Ann"], (2, MAX_HORIZON_DAYS))
+        self.assertEqual(rows["Bob"], (1, 0))
+        self.assertEqual(report.assigned_days[report.people.index("Bob")], 10)
+
+    def test_python(self):
+        self.check(use_numpy=False)
+
+    @unittest.skipIf(np is None, "NumPy not installed")
+    def test_numpy(self):
+        self.check(use_numpy=True)
+
+    def test_horizon_follows_today(self):
+        report = compute_workload(self.store, use_numpy=False, today=date(2100, 1, 1))
+        self.assertEqual(report.first_day, date(2100, 1, 1).toordinal() - 365)
+        self.assertEqual(report.days, MAX_HORIZON_DAYS)
+
+
+if __name__ == "__main__":
+    unittest.main()